@@ -0,0 +1,148 @@
+# background_writer.py
+
+"""
+Runs disk writes on a dedicated background thread.
+
+Callers snapshot what they want written on their own thread and
+`submit` a job; the writer thread performs the I/O in submission order,
+so slow disks never stall the REPL between a user's input and the
+persona's reply.
+
+- Coalescing: a job submitted with a `merge` function is folded into a
+  still-queued job for the same key (e.g. two journal appends become one
+  write and one fsync; two trait saves keep only the latest).
+- Back-pressure: at most `max_pending` jobs are queued; `submit` blocks
+  until the writer catches up.
+- Flushing: `flush` waits for every queued job, and `close` flushes and
+  stops the thread. Pending writes are also flushed at interpreter exit,
+  including after a KeyboardInterrupt.
+"""
+
+import atexit
+import threading
+import traceback
+from collections import deque
+
+import metrics
+
+DEFAULT_MAX_PENDING = 64
+
+
+class _Job:
+    __slots__ = ("key", "fn", "payload")
+
+    def __init__(self, key, fn, payload):
+        self.key = key
+        self.fn = fn
+        self.payload = payload
+
+
+class BackgroundWriter:
+    """
+    Single-threaded, ordered queue of write jobs.
+
+    Args:
+        max_pending (int): Maximum queued jobs before `submit` blocks.
+        name (str): Name of the writer thread.
+    """
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING, name="io-writer"):
+        self.max_pending = max_pending
+        self._queue = deque()
+        self._queued = {}  # key -> its most recent job still in the queue
+        self._active = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, key, fn, payload, merge=None):
+        """
+        Queue `fn(payload)` to run on the writer thread.
+
+        Args:
+            key: Identifies the write target (e.g. a file path).
+            fn (callable): Performs the write.
+            payload: Data to write, snapshotted by the caller.
+            merge (callable): Optional `merge(queued_payload, payload)`
+                returning a combined payload, or None if the two cannot be
+                combined. Only used when a job for `key` is still queued.
+
+        Once the writer is closed, jobs run synchronously on the caller's
+        thread.
+        """
+        with self._cond:
+            if not self._closed:
+                job = self._queued.get(key) if merge is not None else None
+                if job is not None:
+                    merged = merge(job.payload, payload)
+                    if merged is not None:
+                        job.payload = merged
+                        metrics.incr("io.coalesced")
+                        return
+                if len(self._queue) >= self.max_pending:
+                    metrics.incr("io.backpressure")
+                    while len(self._queue) >= self.max_pending and not self._closed:
+                        self._cond.wait()
+                if not self._closed:
+                    job = _Job(key, fn, payload)
+                    self._queue.append(job)
+                    self._queued[key] = job
+                    self._cond.notify_all()
+                    return
+        self._execute(_Job(key, fn, payload))
+
+    def _execute(self, job):
+        try:
+            with metrics.timer("io.write"):
+                job.fn(job.payload)
+        except Exception as e:
+            metrics.incr("io.error")
+            print(f"\n[!] Background write failed for {job.key!r}: {e}")
+            traceback.print_exc()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                if self._queued.get(job.key) is job:
+                    del self._queued[job.key]
+                self._active += 1
+                self._cond.notify_all()
+            try:
+                self._execute(job)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    @property
+    def pending(self):
+        """Number of queued or running jobs."""
+        with self._cond:
+            return len(self._queue) + self._active
+
+    def flush(self, timeout=None):
+        """
+        Wait until every submitted job has run.
+
+        Returns:
+            bool: False if `timeout` (seconds) expired first.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._active, timeout)
+
+    def close(self):
+        """Run all queued jobs and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
@@ -0,0 +1,206 @@
+# batch_runner.py
+
+"""
+Runs personas non-interactively over a file of inputs.
+
+Every (persona, input) pair is rendered with `build_prompt` and sent to
+the configured backend from a bounded thread pool, at batch priority so
+interactive sessions sharing the scheduler go first. Results are streamed
+to a JSONL file as they complete, one object per call:
+
+    {"persona": "scientist", "input_id": "7", "input": "...",
+     "response": "...", "latency_ms": 812.4, "ok": true}
+
+Rows already present in the output with "ok": true are skipped, so an
+interrupted run can be resumed by running the same command again.
+
+Input files are JSONL: either {"id": ..., "input": "..."} objects or
+bare JSON strings. Lines without an id are numbered from 1.
+
+Run with:
+    python batch_runner.py inputs.jsonl results.jsonl --personas scientist,friendly
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config_loader import get_registry
+from prompt_builder import build_prompt
+from response_handler import BATCH, DEFAULT_CONCURRENCY, complete, get_backend
+
+
+def read_inputs(path):
+    """
+    Yield (input_id, text) pairs from a JSONL inputs file.
+
+    Raises:
+        ValueError: If a line is not valid JSON or has no input text.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}.") from e
+            if isinstance(row, str):
+                yield str(line_number), row
+            elif isinstance(row, dict) and isinstance(row.get("input"), str):
+                yield str(row.get("id", line_number)), row["input"]
+            else:
+                raise ValueError(f"Line {line_number} must be a string or an object with an 'input' string.")
+
+
+def completed_keys(path):
+    """Return the (persona, input_id) pairs already completed in an output file."""
+    done = set()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # e.g. a line truncated by an interrupted run
+                if isinstance(row, dict) and row.get("ok"):
+                    done.add((row.get("persona"), str(row.get("input_id"))))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def resolve_personas(names=None):
+    """
+    Load persona configs for the given names (all personas if None).
+
+    Returns:
+        dict: persona key -> persona dict with a display name set.
+
+    Raises:
+        ValueError: If a requested persona does not exist.
+    """
+    registry = get_registry()
+    keys = [name.strip().lower() for name in names if name.strip()] if names else registry.names()
+    personas = {}
+    for key in keys:
+        persona = registry.get(key)
+        if persona is None:
+            raise ValueError(f"Persona '{key}' not found.")
+        persona["name"] = key.title()
+        personas[key] = persona
+    return personas
+
+
+def run_one(backend, persona_key, persona, input_id, text):
+    """Render and send one prompt, returning the result row."""
+    row = {"persona": persona_key, "input_id": input_id, "input": text}
+    start = time.perf_counter()
+    try:
+        row["response"] = complete(build_prompt(persona, text), persona_key, BATCH, backend)
+        row["ok"] = True
+    except Exception as e:
+        row["error"] = str(e)
+        row["ok"] = False
+    row["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return row
+
+
+def run_batch(inputs_path, output_path, persona_names=None, concurrency=DEFAULT_CONCURRENCY,
+              backend=None, on_result=None):
+    """
+    Run every persona over every input, appending results to `output_path`.
+
+    At most `concurrency` calls are in flight and at most twice that many
+    tasks are queued, so memory stays flat however large the inputs are.
+
+    Args:
+        inputs_path (str): JSONL file of inputs.
+        output_path (str): JSONL file to append results to.
+        persona_names (list): Persona names to run; all personas if None.
+        concurrency (int): Maximum concurrent backend calls.
+        backend (ResponseBackend): Backend to use; the shared one if None.
+        on_result (callable): Optional callback invoked with each result row.
+
+    Returns:
+        dict: Counts of "completed", "failed" and "skipped" rows.
+    """
+    backend = backend or get_backend()
+    personas = resolve_personas(persona_names)
+    done = completed_keys(output_path)
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+    write_lock = threading.Lock()
+
+    def jobs():
+        for input_id, text in read_inputs(inputs_path):
+            for key, persona in personas.items():
+                if (key, input_id) in done:
+                    counts["skipped"] += 1
+                    continue
+                yield key, persona, input_id, text
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+
+        def record(future):
+            row = future.result()
+            with write_lock:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+            counts["completed" if row["ok"] else "failed"] += 1
+            if on_result:
+                on_result(row)
+
+        pending = set()
+        for job in jobs():
+            if len(pending) >= 2 * concurrency:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future)
+            pending.add(pool.submit(run_one, backend, *job))
+        for future in wait(pending).done:
+            record(future)
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run personas over a JSONL file of inputs.")
+    parser.add_argument("inputs", help="JSONL file of inputs")
+    parser.add_argument("output", help="JSONL file to append results to (resumable)")
+    parser.add_argument("--personas", help="Comma-separated persona names (default: all)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum concurrent model calls")
+    args = parser.parse_args(argv)
+
+    names = args.personas.split(",") if args.personas else None
+    started = time.perf_counter()
+
+    finished = 0
+
+    def progress(row):
+        nonlocal finished
+        finished += 1
+        if finished % 100 == 0:
+            print(f"\r📊 {finished} calls finished", end="", flush=True)
+
+    try:
+        counts = run_batch(args.inputs, args.output, names, args.concurrency, on_result=progress)
+    except Exception as e:
+        print(f"❌ Batch run failed: {e}")
+        return 1
+
+    elapsed = time.perf_counter() - started
+    finished = counts["completed"] + counts["failed"]
+    rate = finished / elapsed if elapsed else 0.0
+    print(f"\n✅ {counts['completed']} completed, {counts['failed']} failed, "
+          f"{counts['skipped']} skipped in {elapsed:.1f}s ({rate:.1f} calls/s).")
+    return 0 if counts["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
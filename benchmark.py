@@ -0,0 +1,339 @@
+# benchmark.py
+
+"""
+Benchmarks for the per-turn hot path.
+
+Measures persona lookup, build_prompt, Memory.add, Memory.get_context,
+Memory.get_window, session journaling, resuming a stored memory,
+retrieval of relevant turns, parse_log_file and a full stubbed turn
+against synthetic data (histories of 10^2-10^6 turns, configs with
+10-10^4 personas, logs of varying size). For every case it reports
+throughput, p50/p99 latency and peak traced memory.
+
+Only the offline StubBackend is used, and all data is generated with a
+fixed seed in a temporary directory, so runs are reproducible.
+
+Run with:
+    python benchmark.py                                # quick scale
+    python benchmark.py --scale full --save-baseline baseline.json
+    python benchmark.py --baseline baseline.json       # flag regressions
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from config_loader import PersonaTraits, get_registry
+from conversation_store import ConversationStore
+from log_importer import parse_log_file
+from memory import Memory
+from prompt_builder import TemplateRegistry, build_prompt
+from response_handler import StubBackend
+from retrieval import MemoryRetriever
+from session_saver import FSYNC_EXIT, SessionJournal
+
+SCALES = {
+    "quick": {"turns": [100, 1000, 10000], "personas": [10, 100], "log_entries": [1000, 10000]},
+    "full": {
+        "turns": [100, 1000, 10000, 100000, 1000000],
+        "personas": [10, 100, 1000, 10000],
+        "log_entries": [1000, 10000, 100000],
+    },
+}
+
+DEFAULT_TOLERANCE = 0.25  # Allowed relative slowdown before flagging a regression
+MAX_SAMPLES = 2000  # Repeated-op cases run at most this many iterations
+WORDS = ("science story friend happy short the a of persona memory prompt "
+         "template turn reply question answer context window summary").split()
+
+
+def random_text(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def make_memory(rng, turns):
+    memory = Memory()
+    for i in range(turns):
+        memory.add("You" if i % 2 == 0 else "Bench", random_text(rng))
+    return memory
+
+
+# ==== Cases ====
+# Each case factory takes (rng, workdir, size) and returns (op, iterations),
+# where op() performs one measured operation.
+
+def case_persona_lookup(rng, workdir, size):
+    # What PersonaManager does per load: registry lookup, version hash, traits overlay
+    path = os.path.join(workdir, f"personas_{size}.json")
+    config = {
+        f"persona{i}": {
+            "name": f"Persona{i}",
+            "description": random_text(rng),
+            "template": "default.txt",
+            "tone": rng.choice(WORDS),
+        }
+        for i in range(size)
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    names = [f"persona{rng.randrange(size)}" for _ in range(MAX_SAMPLES)]
+    it = iter(names)
+    registry = get_registry(path)
+
+    def op():
+        traits, version = registry.get_versioned(next(it))
+        return PersonaTraits(traits, version)
+    return op, len(names)
+
+
+def case_build_prompt(rng, workdir, size):
+    template_dir = os.path.join(workdir, "templates")
+    os.makedirs(template_dir, exist_ok=True)
+    with open(os.path.join(template_dir, "default.txt"), "w", encoding="utf-8") as f:
+        f.write("You are {{ name }}, who speaks in a {{ tone }} manner.\n"
+                "{{ description }}\nSummary: {{ summary }}\nRecent:\n{{ history }}\n"
+                "The user says: '{{ user_input }}'")
+    registry = TemplateRegistry(template_dir)
+    persona = {"name": "Bench", "description": "A benchmark persona.", "template": "default.txt", "tone": "dry"}
+    memory = make_memory(rng, size)
+    history = memory.get_window(1024)
+    inputs = [random_text(rng) for _ in range(MAX_SAMPLES)]
+    it = iter(inputs)
+    return lambda: build_prompt(persona, next(it), history=history, registry=registry), len(inputs)
+
+
+def case_memory_add(rng, workdir, size):
+    memory = Memory()
+    messages = [random_text(rng) for _ in range(min(size, 1000))]
+    counter = iter(range(size))
+    return lambda: memory.add("You", messages[next(counter) % len(messages)]), size
+
+
+def case_get_context(rng, workdir, size):
+    memory = make_memory(rng, size)
+    memory.get_context()
+    message = random_text(rng)
+
+    def op():
+        memory.add("You", message)
+        return memory.get_context()
+    return op, min(MAX_SAMPLES, 200)
+
+
+def case_get_window(rng, workdir, size):
+    memory = make_memory(rng, size)
+    return lambda: memory.get_window(1024), MAX_SAMPLES
+
+
+def case_journal(rng, workdir, size):
+    memory = make_memory(rng, size)
+    journal = SessionJournal(f"bench{size}", fsync_policy=FSYNC_EXIT, directory=workdir)
+    journal.sync(memory)
+    message = random_text(rng)
+
+    def op():
+        memory.add("You", message)
+        memory.add("Bench", message)
+        journal.sync(memory)
+    return op, MAX_SAMPLES
+
+
+def case_resume(rng, workdir, size):
+    # measure() builds each case twice with the same seed, so the file name must not come from rng
+    fd, path = tempfile.mkstemp(prefix=f"store_{size}_", suffix=".db", dir=workdir)
+    os.close(fd)
+    store = ConversationStore(path)
+    store.append("bench", [(i, "You" if i % 2 == 0 else "Bench", random_text(rng), float(i))
+                           for i in range(size)])
+    return lambda: Memory(store, "bench"), 20
+
+
+def case_retrieval(rng, workdir, size):
+    retriever = MemoryRetriever(make_memory(rng, size))
+    retriever.sync()
+    queries = [random_text(rng, 6) for _ in range(min(MAX_SAMPLES, 200))]
+    it = iter(queries)
+    return lambda: retriever.search(next(it)), len(queries)
+
+
+def case_parse_log(rng, workdir, size):
+    path = os.path.join(workdir, f"log_{size}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"speaker": "You" if i % 2 == 0 else "Bench", "message": random_text(rng)}
+                   for i in range(size)], f)
+    return lambda: parse_log_file(path), 3
+
+
+def case_turn(rng, workdir, size):
+    template_dir = os.path.join(workdir, "turn_templates")
+    os.makedirs(template_dir, exist_ok=True)
+    with open(os.path.join(template_dir, "default.txt"), "w", encoding="utf-8") as f:
+        f.write("You are {{ name }}.\n{{ history }}\nThe user says: '{{ user_input }}'")
+    registry = TemplateRegistry(template_dir)
+    persona = {"name": "Bench", "template": "default.txt"}
+    backend = StubBackend()
+    memory = make_memory(rng, size)
+    journal = SessionJournal(f"turn{size}", fsync_policy=FSYNC_EXIT, directory=workdir)
+    journal.sync(memory)
+    inputs = [random_text(rng) for _ in range(MAX_SAMPLES)]
+    it = iter(inputs)
+
+    def op():
+        user_input = next(it)
+        prompt = build_prompt(persona, user_input, history=memory.get_window(1024), registry=registry)
+        response = backend.complete(prompt)
+        memory.add("You", user_input)
+        memory.add(persona["name"], response)
+        journal.sync(memory)
+    return op, len(inputs)
+
+
+CASES = {
+    "persona_lookup": (case_persona_lookup, "personas"),
+    "build_prompt": (case_build_prompt, "turns"),
+    "memory_add": (case_memory_add, "turns"),
+    "get_context": (case_get_context, "turns"),
+    "get_window": (case_get_window, "turns"),
+    "journal_sync": (case_journal, "turns"),
+    "memory_resume": (case_resume, "turns"),
+    "retrieval": (case_retrieval, "turns"),
+    "parse_log_file": (case_parse_log, "log_entries"),
+    "turn": (case_turn, "turns"),
+}
+
+
+# ==== Runner ====
+
+def measure(factory, size, workdir, seed):
+    """
+    Run one case twice: once for latency, once under tracemalloc for peak memory.
+
+    Returns:
+        dict: ops, throughput (ops/s), p50_us, p99_us and peak_kb.
+    """
+    op, iterations = factory(random.Random(seed), workdir, size)
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        start = clock()
+        op()
+        samples.append(clock() - start)
+    samples.sort()
+    total_s = sum(samples) / 1e9
+
+    tracemalloc.start()
+    op, iterations = factory(random.Random(seed), workdir, size)
+    tracemalloc.reset_peak()
+    for _ in range(iterations):
+        op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops": iterations,
+        "throughput": iterations / total_s if total_s else 0.0,
+        "p50_us": percentile(samples, 0.50) / 1000,
+        "p99_us": percentile(samples, 0.99) / 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def run(scale="quick", stages=None, seed=0, on_result=None):
+    """
+    Run every selected case at every size of the given scale.
+
+    Returns:
+        dict: "<stage>[<size>]" -> result dict.
+    """
+    sizes = SCALES[scale]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="persona-bench-") as workdir:
+        for stage, (factory, dimension) in CASES.items():
+            if stages and stage not in stages:
+                continue
+            for size in sizes[dimension]:
+                name = f"{stage}[{size}]"
+                results[name] = measure(factory, size, workdir, seed)
+                if on_result:
+                    on_result(name, results[name])
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results against a baseline.
+
+    A case regresses when its p50 latency grows, or its throughput drops,
+    by more than `tolerance` (a fraction).
+
+    Returns:
+        list: (case, metric, baseline value, current value) tuples.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p50_us"] and current["p50_us"] > base["p50_us"] * (1 + tolerance):
+            regressions.append((name, "p50_us", base["p50_us"], current["p50_us"]))
+        if base["throughput"] and current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append((name, "throughput", base["throughput"], current["throughput"]))
+    return regressions
+
+
+def print_row(name, result):
+    print(f"{name:<28} {result['throughput']:>14,.0f} {result['p50_us']:>12.1f} "
+          f"{result['p99_us']:>12.1f} {result['peak_kb']:>12,.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the per-turn hot path.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    parser.add_argument("--stages", help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a baseline JSON file")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Store these results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative slowdown allowed before flagging a regression")
+    args = parser.parse_args(argv)
+
+    stages = set(args.stages.split(",")) if args.stages else None
+    if stages and not stages <= set(CASES):
+        parser.error(f"Unknown stage(s): {', '.join(sorted(stages - set(CASES)))}")
+
+    print(f"{'case':<28} {'ops/s':>14} {'p50 (us)':>12} {'p99 (us)':>12} {'peak (KiB)':>12}")
+    results = run(args.scale, stages, args.seed, on_result=print_row)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to '{path}'")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for name, metric, before, after in regressions:
+                print(f"  - {name} {metric}: {before:,.1f} → {after:,.1f}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against '{args.baseline}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,199 @@ config_loader.py
 
 Handles loading of persona configurations from JSON.
 Includes logic for fallbacks and error handling.
+
+The config is parsed once into a `PersonaRegistry`, which keeps a
+case-insensitive index of personas and only re-parses the file when its
+modification time or size changes.
+
+`PersonaTraits` wraps a loaded persona as an immutable base plus an
+overlay of edits, so edits never copy the persona, reverting drops the
+overlay and diffs only look at edited keys.
+
+Writes go through `save_persona`, which updates a single persona under an
+exclusive file lock, replaces the file atomically, and rejects the save
+if the persona changed since the caller loaded it (compared by version
+stamp, a hash of the persona's stored traits).
 """
 
+import hashlib
 import json
+import os
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from types import MappingProxyType
+
+DEFAULT_CONFIG_PATH = "persona_config.json"
+
+
+class ConfigConflictError(Exception):
+    """Raised when a persona was changed by someone else since it was loaded."""
+
+
+def persona_version(traits):
+    """
+    Return the version stamp of a persona's stored traits.
+
+    Args:
+        traits (dict | None): The traits as stored, or None if absent.
+
+    Returns:
+        str: A short content hash; "" for a persona that does not exist.
+    """
+    if traits is None:
+        return ""
+    payload = json.dumps(traits, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+_REMOVED = object()  # Overlay marker for a trait deleted from the base
+
+
+class PersonaTraits(MutableMapping):
+    """
+    A persona's traits: a read-only base with a copy-on-write overlay.
+
+    Reads check the overlay first, then the base. Writes and deletions
+    only touch the overlay, so the base stays the state the persona was
+    loaded (or last saved) at.
+
+    Args:
+        base (dict): The traits as loaded.
+        version (str): Version stamp of the stored persona.
+    """
+
+    __slots__ = ("base", "overlay", "version")
+
+    def __init__(self, base, version=""):
+        self.base = MappingProxyType(dict(base))
+        self.overlay = {}
+        self.version = version
+
+    def __getitem__(self, key):
+        if key in self.overlay:
+            value = self.overlay[key]
+            if value is _REMOVED:
+                raise KeyError(key)
+            return value
+        return self.base[key]
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.overlay[key] = _REMOVED
+
+    def __iter__(self):
+        overlay = self.overlay
+        for key in self.base:
+            if overlay.get(key) is not _REMOVED:
+                yield key
+        for key, value in overlay.items():
+            if key not in self.base and value is not _REMOVED:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"PersonaTraits({dict(self)!r}, edited={sorted(self.overlay)!r})"
+
+    @property
+    def edited(self):
+        """True if the overlay holds any edits."""
+        return bool(self.overlay)
+
+    def revert(self):
+        """Drop every edit, returning to the base traits."""
+        self.overlay = {}
+
+    def rebase(self, base, version):
+        """
+        Replace the base (e.g. after a save or reload) and drop overlay
+        entries the new base already matches.
+        """
+        self.base = MappingProxyType(dict(base))
+        self.version = version
+        for key, value in list(self.overlay.items()):
+            if value is _REMOVED:
+                matched = key not in self.base
+            else:
+                matched = key in self.base and self.base[key] == value
+            if matched:
+                self.overlay.pop(key, None)
+
+    def diff(self):
+        """
+        Compare the traits with the base, looking only at overlay keys.
+
+        Returns:
+            tuple: (added, removed, modified) dicts; modified maps a key
+            to its (base, current) values.
+        """
+        added, removed, modified = {}, {}, {}
+        for key, value in self.overlay.items():
+            if key not in self.base:
+                if value is not _REMOVED:
+                    added[key] = value
+            elif value is _REMOVED:
+                removed[key] = self.base[key]
+            elif value != self.base[key]:
+                modified[key] = (self.base[key], value)
+        return added, removed, modified
+
+
+@contextmanager
+def _locked(path):
+    """Hold an exclusive lock on `path`.lock for the duration of the block."""
+    with open(f"{path}.lock", "a+") as lock_file:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_atomic(path, config):
+    """Write `config` to a temp file next to `path`, fsync it, and rename it over `path`."""
+    import tempfile
 
-def load_config(path="persona_config.json"):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
     """
     Load the full persona configuration from a JSON file.
 
@@ -20,7 +208,126 @@ def load_config(path="persona_config.json"):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def load_persona(persona_name="default", config_path="persona_config.json"):
+
+class PersonaRegistry:
+    """
+    Cached, case-insensitive view of a persona config file.
+
+    Every accessor stats the file first and re-parses it only when its
+    modification time or size has changed since the last parse.
+
+    The registry is shared between threads (e.g. server sessions), so a
+    re-parse happens under a lock and accessors read the config and its
+    index from the same parse.
+    """
+
+    def __init__(self, path=DEFAULT_CONFIG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._config = {}
+        self._index = {}
+        self.generation = 0  # Incremented every time the file is (re-)parsed
+
+    def refresh(self):
+        """
+        Re-parse the config file if it changed on disk.
+
+        Returns:
+            bool: True if the file was (re-)parsed.
+
+        Raises:
+            FileNotFoundError: If the config file does not exist.
+            json.JSONDecodeError: If the config file is not valid JSON.
+        """
+        with self._lock:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp == self._stamp:
+                return False
+
+            config = load_config(self.path)
+            self._config = config
+            self._index = {key.lower(): key for key in config}
+            self._stamp = stamp
+            self.generation += 1
+            return True
+
+    def invalidate(self):
+        """Force the next access to re-parse the config file."""
+        with self._lock:
+            self._stamp = None
+
+    def _snapshot(self):
+        """Refresh, then return (config, index) from the same parse."""
+        self.refresh()
+        with self._lock:
+            return self._config, self._index
+
+    def names(self):
+        """Return the lowercased names of all personas."""
+        _, index = self._snapshot()
+        return list(index)
+
+    def descriptions(self):
+        """Return a mapping of persona key -> description."""
+        config, _ = self._snapshot()
+        return {key: value.get("description", "") for key, value in config.items()}
+
+    def get(self, persona_name):
+        """
+        Look up a persona by name, ignoring case.
+
+        Returns:
+            dict | None: A copy of the persona's traits, or None if missing.
+        """
+        config, index = self._snapshot()
+        key = index.get(persona_name.lower())
+        if key is None:
+            return None
+        return config[key].copy()
+
+    def get_versioned(self, persona_name):
+        """
+        Look up a persona and its version stamp from the same parse.
+
+        Returns:
+            tuple: (copy of the traits, version), or (None, "") if missing.
+        """
+        config, index = self._snapshot()
+        key = index.get(persona_name.lower())
+        if key is None:
+            return None, ""
+        traits = config[key]
+        return traits.copy(), persona_version(traits)
+
+    def version(self, persona_name):
+        """Return the version stamp of a persona as currently stored ("" if missing)."""
+        config, index = self._snapshot()
+        key = index.get(persona_name.lower())
+        return persona_version(config[key] if key is not None else None)
+
+    def __contains__(self, persona_name):
+        _, index = self._snapshot()
+        return persona_name.lower() in index
+
+    def __len__(self):
+        _, index = self._snapshot()
+        return len(index)
+
+
+_registries = {}
+
+
+def get_registry(config_path=DEFAULT_CONFIG_PATH):
+    """Return the shared PersonaRegistry for a config path."""
+    registry = _registries.get(config_path)
+    if registry is None:
+        registry = _registries[config_path] = PersonaRegistry(config_path)
+    return registry
+
+
+def load_persona(persona_name="default", config_path=DEFAULT_CONFIG_PATH):
     """
     Load a specific persona's traits and settings.
 
@@ -31,16 +338,53 @@ def load_persona(persona_name="default", config_path="persona_config.json"):
     Returns:
         dict: The loaded persona configuration.
     """
-    config = load_config(config_path)
-    normalized_config = {key.lower(): value for key, value in config.items()}
-    requested_name = persona_name.lower()
+    registry = get_registry(config_path)
+    persona = registry.get(persona_name)
 
-    if requested_name in normalized_config:
-        persona = normalized_config[requested_name].copy()
-        persona["name"] = requested_name.title()
+    if persona is not None:
+        persona["name"] = persona_name.lower().title()
         return persona
     else:
         print(f"[!] Persona '{persona_name}' not found. Falling back to 'default'.")
-        fallback = normalized_config.get("default", {}).copy()
+        fallback = registry.get("default") or {}
         fallback["name"] = "Default"
         return fallback
+
+
+def save_persona(persona_name, traits, expected_version=None, config_path=DEFAULT_CONFIG_PATH):
+    """
+    Store one persona's traits, leaving every other persona untouched.
+
+    The config is re-read under an exclusive lock, so edits made to other
+    personas by concurrent processes are preserved, and the new file is
+    swapped in with an atomic rename, so readers never see a partial file.
+
+    Args:
+        persona_name (str): Persona to store (matched ignoring case).
+        traits (dict): The persona's full set of traits.
+        expected_version (str): Version stamp the caller loaded; the save
+            is rejected if the stored persona no longer matches it. Use ""
+            when creating a new persona and None to skip the check.
+        config_path (str): The path to the persona configuration file.
+
+    Returns:
+        str: The persona's new version stamp.
+
+    Raises:
+        ConfigConflictError: If the persona changed since `expected_version`.
+    """
+    with _locked(config_path):
+        try:
+            config = load_config(config_path)
+        except FileNotFoundError:
+            config = {}
+        key = next((name for name in config if name.lower() == persona_name.lower()), persona_name.lower())
+        current = persona_version(config.get(key))
+        if expected_version is not None and current != expected_version:
+            raise ConfigConflictError(
+                f"Persona '{key}' was changed by another process since it was loaded."
+            )
+        config[key] = traits
+        _write_atomic(config_path, config)
+    get_registry(config_path).invalidate()
+    return persona_version(traits)
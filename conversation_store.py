@@ -0,0 +1,248 @@
+# conversation_store.py
+
+"""
+Persists per-persona conversation history in a single SQLite file.
+
+Every turn added to a store-backed `Memory` is written here as it
+happens, together with the persona's rolling summary. On restart a
+Memory reopens its history by loading only the most recent window of
+turns; older turns stay on disk and are paged in on demand for
+/history, search and summarization.
+
+The database runs in WAL mode with `synchronous=NORMAL`, so each append
+is a cheap sequential log write, and reads go through SQLite's mmap I/O.
+
+Messages are also indexed in an FTS5 trigram table, so searching the
+on-disk history is an index lookup rather than a scan of every stored
+turn. Text is case-folded with Python's `str.lower` (registered as the
+SQL function `py_lower`) wherever the index cannot be used, so matches
+agree with the resident in-memory index for non-ASCII text too.
+
+A store is single-writer: opening one takes an exclusive lock on
+`<path>.lock` for as long as it is open, so a second process (e.g. a
+batch job running next to the interactive CLI) is refused rather than
+interleaving its turns with ours.
+"""
+
+import sqlite3
+import threading
+
+DEFAULT_STORE_PATH = "conversations.db"
+MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database file to memory-map
+TRIGRAM = 3  # Shortest term the trigram index can look up
+
+
+class StoreConflictError(Exception):
+    """Raised when the store is locked by another process, or an entry index was already written."""
+
+
+def _lock_exclusive(path):
+    """Take a non-blocking exclusive lock on `path`; returns the open lock file, or None if held elsewhere."""
+    lock_file = open(path, "a+")
+    try:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class ConversationStore:
+    """
+    SQLite-backed conversation history, keyed by persona.
+
+    Entries are addressed by (persona key, index), where index is the
+    entry's position in that persona's conversation, starting at 0.
+    An append that would overwrite an existing index is rejected rather
+    than replacing it.
+
+    Args:
+        path (str): Database file; created if missing. ":memory:" opens a
+            private in-memory store.
+        mmap_size (int): Bytes of the file SQLite may memory-map for reads.
+
+    Raises:
+        StoreConflictError: If another process has the store open.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, mmap_size=MMAP_SIZE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._lock_file = None
+        if path != ":memory:":
+            self._lock_file = _lock_exclusive(f"{path}.lock")
+            if self._lock_file is None:
+                raise StoreConflictError(f"'{path}' is already open in another process.")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.create_function("py_lower", 1, str.lower, deterministic=True)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "persona TEXT NOT NULL, idx INTEGER NOT NULL, speaker TEXT NOT NULL, "
+            "message TEXT NOT NULL, timestamp REAL NOT NULL, "
+            "PRIMARY KEY (persona, idx)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "persona TEXT PRIMARY KEY, summary TEXT NOT NULL, summarized INTEGER NOT NULL)"
+        )
+        self._fts = self._create_index()
+        self._db.commit()
+
+    def _create_index(self):
+        """
+        Create the trigram index over messages, filling it from any existing entries.
+
+        Returns:
+            bool: False if this SQLite build lacks FTS5 trigram support.
+        """
+        if self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'").fetchone():
+            return True
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE entries_fts USING fts5("
+                "message, persona UNINDEXED, idx UNINDEXED, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        self._db.execute("INSERT INTO entries_fts (message, persona, idx) SELECT message, persona, idx FROM entries")
+        return True
+
+    def append(self, persona, rows):
+        """
+        Append entries to a persona's history in one transaction.
+
+        Args:
+            persona (str): Persona key.
+            rows (list): (index, speaker, message, timestamp) tuples.
+
+        Raises:
+            StoreConflictError: If any index is already stored; nothing is written.
+        """
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT INTO entries (persona, idx, speaker, message, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(persona, *row) for row in rows],
+                )
+            except sqlite3.IntegrityError as e:
+                self._db.rollback()
+                raise StoreConflictError(
+                    f"History of '{persona}' was already written at index {rows[0][0]} or later."
+                ) from e
+            if self._fts:
+                self._db.executemany(
+                    "INSERT INTO entries_fts (message, persona, idx) VALUES (?, ?, ?)",
+                    [(message, persona, index) for index, _, message, _ in rows],
+                )
+            self._db.commit()
+
+    def count(self, persona):
+        """Return the number of entries stored for a persona."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX(idx) FROM entries WHERE persona = ?", (persona,)
+            ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def fetch(self, persona, start, stop):
+        """
+        Return entries in [start, stop) as (speaker, message, timestamp) tuples.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT speaker, message, timestamp FROM entries "
+                "WHERE persona = ? AND idx >= ? AND idx < ? ORDER BY idx",
+                (persona, start, stop),
+            ).fetchall()
+
+    def match(self, persona, terms, stop):
+        """
+        Return entries before `stop` whose message contains any of `terms`.
+
+        This is a substring prefilter (terms should be lowercase); callers
+        tokenize the returned messages to decide exact matches. It uses the
+        trigram index unless a term is shorter than a trigram.
+
+        Returns:
+            list: (index, speaker, message) tuples in index order.
+        """
+        if not terms:
+            return []
+        with self._lock:
+            if self._fts and all(len(term) >= TRIGRAM for term in terms):
+                query = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                return self._db.execute(
+                    "SELECT e.idx, e.speaker, e.message FROM entries_fts f "
+                    "JOIN entries e ON e.persona = f.persona AND e.idx = f.idx "
+                    "WHERE entries_fts MATCH ? AND f.persona = ? AND f.idx < ? ORDER BY e.idx",
+                    (query, persona, stop),
+                ).fetchall()
+            clause = " OR ".join("instr(py_lower(message), ?) > 0" for _ in terms)
+            return self._db.execute(
+                f"SELECT idx, speaker, message FROM entries "
+                f"WHERE persona = ? AND idx < ? AND ({clause}) ORDER BY idx",
+                (persona, stop, *terms),
+            ).fetchall()
+
+    def speaker_entries(self, persona, name, stop, partial=False):
+        """Return indices before `stop` whose speaker equals (or contains) `name`, ignoring case."""
+        condition = "instr(py_lower(speaker), ?) > 0" if partial else "py_lower(speaker) = ?"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT idx FROM entries WHERE persona = ? AND idx < ? AND {condition}",
+                (persona, stop, name.lower()),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_summary(self, persona):
+        """
+        Return a persona's rolling summary.
+
+        Returns:
+            tuple: (summary, number of entries it covers); ("", 0) if none.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, summarized FROM summaries WHERE persona = ?", (persona,)
+            ).fetchone()
+        return row if row is not None else ("", 0)
+
+    def save_summary(self, persona, summary, summarized):
+        """Store a persona's rolling summary."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (persona, summary, summarized) VALUES (?, ?, ?)",
+                (persona, summary, summarized),
+            )
+            self._db.commit()
+
+    def reset(self, persona):
+        """Delete a persona's history and summary."""
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE persona = ?", (persona,))
+            if self._fts:
+                self._db.execute("DELETE FROM entries_fts WHERE persona = ?", (persona,))
+            self._db.execute("DELETE FROM summaries WHERE persona = ?", (persona,))
+            self._db.commit()
+
+    def close(self):
+        """Checkpoint the WAL and close the database."""
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._db.close()
+                self._db = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
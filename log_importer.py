@@ -1,11 +1,176 @@
 """
 log_importer.py
 
-Parses and validates a JSON log file containing a list of conversation entries.
+Parses and validates conversation log files.
 Each entry must include a 'speaker' and a 'message'.
+
+Two formats are accepted and read incrementally, so very large logs are
+never held in memory as a whole:
+- a JSON array of entries: [{"speaker": ..., "message": ...}, ...]
+- JSON Lines: one entry object per line
 """
 
+import codecs
 import json
+import os
+
+CHUNK_SIZE = 1 << 16
+MAX_ENTRY_SIZE = 1 << 26  # Give up on a single array element larger than this
+DEFAULT_BATCH_SIZE = 1000
+
+_WHITESPACE = " \t\r\n"
+
+
+def _validate(entry, number, line):
+    if not isinstance(entry, dict):
+        raise ValueError(f"Entry {number} (line {line}) is not a dictionary.")
+    if "speaker" not in entry or "message" not in entry:
+        raise ValueError(f"Entry {number} (line {line}) must contain 'speaker' and 'message'.")
+    return {"speaker": str(entry["speaker"]), "message": str(entry["message"])}
+
+
+class _Progress:
+    """Tracks how many bytes of the underlying file have been read."""
+
+    def __init__(self, path):
+        self.total = os.path.getsize(path)
+        self.read = 0
+
+
+def _iter_json_array(f, progress, chunk_size):
+    """Yield (entry, line) pairs from a JSON array, decoding one element at a time."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    line = 1
+    eof = False
+
+    def more():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        progress.read += len(chunk)
+        if not chunk:
+            eof = True
+            buf = buf[pos:] + text_decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos, line
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                if buf[pos] == "\n":
+                    line += 1
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            more()
+
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Log file must contain a list of entries.")
+    pos += 1
+
+    number = 0
+    while True:
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError(f"Unterminated list of entries (line {line}).")
+        if buf[pos] == "]":
+            pos += 1
+            skip_whitespace()
+            if pos < len(buf):
+                raise ValueError(f"Unexpected data after the list of entries (line {line}).")
+            return
+        if number:
+            if buf[pos] != ",":
+                raise ValueError(f"Expecting ',' after entry {number} (line {line}).")
+            pos += 1
+            skip_whitespace()
+        number += 1
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError as e:
+                if eof or len(buf) - pos > MAX_ENTRY_SIZE:
+                    error_line = line + buf.count("\n", pos, e.pos)
+                    raise ValueError(f"Invalid JSON in entry {number} (line {error_line}): {e.msg}.") from e
+                more()
+
+        start_line = line
+        line += buf.count("\n", pos, end)
+        pos = end
+        yield value, start_line
+
+
+def _iter_json_lines(f, progress):
+    """Yield (entry, line) pairs from a JSON Lines file."""
+    number = 0
+    for line_number, raw in enumerate(f, start=1):
+        progress.read += len(raw)
+        text = raw.decode("utf-8-sig" if line_number == 1 else "utf-8").strip()
+        if not text:
+            continue
+        number += 1
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in entry {number} (line {line_number}): {e.msg}.") from e
+        yield value, line_number
+
+
+def _detect_format(f):
+    """Return 'array' or 'lines' based on the first non-whitespace byte."""
+    head = f.read(CHUNK_SIZE).lstrip(codecs.BOM_UTF8).lstrip()
+    f.seek(0)
+    return "array" if head.startswith(b"[") else "lines"
+
+
+def iter_log_entries(path, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Lazily parse and validate a conversation log file.
+
+    Args:
+        path (str): Path to the log file (JSON array or JSON Lines).
+        chunk_size (int): Bytes to read at a time for JSON arrays.
+        progress (_Progress): Optional byte-progress tracker.
+
+    Yields:
+        dict: Validated { "speaker": ..., "message": ... } entries.
+
+    Raises:
+        Exception: If file is not found, invalid JSON, or improperly
+            formatted. Messages include the entry and line number.
+    """
+    try:
+        progress = progress or _Progress(path)
+        with open(path, "rb") as f:
+            if _detect_format(f) == "array":
+                values = _iter_json_array(f, progress, chunk_size)
+            else:
+                values = _iter_json_lines(f, progress)
+            for number, (value, line) in enumerate(values, start=1):
+                # Session journals interleave summary records with turns.
+                if isinstance(value, dict) and value.get("type") == "summary":
+                    continue
+                yield _validate(value, number, line)
+
+    except FileNotFoundError as e:
+        raise Exception(f"❌ File '{path}' not found.") from e
+
+    except UnicodeDecodeError as e:
+        raise Exception(f"❌ File '{path}' is not valid UTF-8 JSON.") from e
+
+    except ValueError as ve:
+        raise Exception(f"❌ Invalid log format: {ve}") from ve
+
+    except Exception as e:
+        raise Exception(f"❌ Unexpected error while importing log: {e}") from e
+
 
 def parse_log_file(path):
     """
@@ -20,34 +185,48 @@ def parse_log_file(path):
     Raises:
         Exception: If file is not found, invalid JSON, or improperly formatted.
     """
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+    return list(iter_log_entries(path))
 
-        if not isinstance(data, list):
-            raise ValueError("Log file must contain a list of entries.")
 
-        validated = []
-        for i, entry in enumerate(data):
-            if not isinstance(entry, dict):
-                raise ValueError(f"Entry {i+1} is not a dictionary.")
-            if "speaker" not in entry or "message" not in entry:
-                raise ValueError("Each log entry must contain 'speaker' and 'message'.")
-            validated.append({
-                "speaker": str(entry["speaker"]),
-                "message": str(entry["message"])
-            })
+def import_log(path, memory, batch_size=DEFAULT_BATCH_SIZE, on_progress=None):
+    """
+    Stream a log file into memory in batches.
 
-        return validated
+    Args:
+        path (str): Path to the log file.
+        memory (Memory): Memory to add the entries to.
+        batch_size (int): Number of entries passed to `memory.add_many` at once.
+        on_progress (callable): Optional callback invoked after each batch
+            as on_progress(entries_imported, bytes_read, total_bytes).
 
+    Returns:
+        int: Number of entries imported.
+
+    Raises:
+        Exception: As `iter_log_entries`. Entries from batches completed
+            before the error remain in memory; the message says how many.
+    """
+    try:
+        progress = _Progress(path)
     except FileNotFoundError as e:
         raise Exception(f"❌ File '{path}' not found.") from e
 
-    except json.JSONDecodeError as e:
-        raise Exception(f"❌ File '{path}' is not valid JSON.") from e
-
-    except ValueError as ve:
-        raise Exception(f"❌ Invalid log format: {ve}") from ve
-
+    imported = 0
+    batch = []
+    try:
+        for entry in iter_log_entries(path, progress=progress):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                imported += memory.add_many(batch)
+                batch = []
+                if on_progress:
+                    on_progress(imported, progress.read, progress.total)
+        if batch:
+            imported += memory.add_many(batch)
+            if on_progress:
+                on_progress(imported, progress.read, progress.total)
     except Exception as e:
-        raise Exception(f"❌ Unexpected error while importing log: {e}") from e
+        if imported:
+            raise Exception(f"{e} ({imported} entries were imported before the error.)") from e
+        raise
+    return imported
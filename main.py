@@ -1,288 +1,677 @@
+import io
 import json
+import sys
+import time
 import traceback
-from prompt_builder import build_prompt
-from memory import Memory
-from session_saver import save_session
-from response_handler import get_response
-from config_loader import load_persona
-from log_importer import parse_log_file
+from contextlib import redirect_stderr, redirect_stdout
+import metrics
+from prompt_builder import build_prompt, template_placeholders
+from memory import Memory, SUMMARY_THRESHOLD
+from session_saver import SessionJournal, FSYNC_BATCH
+from background_writer import BackgroundWriter
+from config_loader import get_registry, save_persona, ConfigConflictError, PersonaTraits
+
+# response_handler (networking, asyncio) and log_importer are imported where
+# they are first needed to keep CLI startup fast.
 
 AUTOSAVE = False
 AUTOSAVE_SUMMARY = False  # ✅ New toggle flag
-
-
-def list_personas():
-    try:
-        with open("persona_config.json", "r") as f:
-            config = json.load(f)
-        return {k: v["description"] for k, v in config.items()}
-    except Exception as e:
-        print(f"❌ Failed to list personas: {e}")
+STREAM_RESPONSES = True  # Print replies token by token as they arrive
+FSYNC_POLICY = FSYNC_BATCH  # "always", "batch" or "exit"
+CONTEXT_TOKEN_BUDGET = 1024  # Max tokens of recent history passed to templates
+ROLLING_SUMMARY = True  # Keep a running summary of older turns for prompts
+RETRIEVAL_TOP_K = 3  # Older turns relevant to the input passed as {{relevant}}; 0 disables
+BACKGROUND_IO = True  # Write journals, summaries and trait saves on a background thread
+CONVERSATION_STORE_PATH = "conversations.db"  # None keeps memories in RAM only
+METRICS_DUMP_PATH = None  # e.g. "metrics.json" to dump /stats periodically
+METRICS_DUMP_INTERVAL = 60.0  # seconds
+METRICS_DUMP_FORMAT = "json"  # "json" or "prometheus"
+
+# Failures reported while the current command runs; read by --script replays
+failures = []
+
+
+def report_failure(message, show_traceback=None):
+    """
+    Print why a command failed and record it in `failures`.
+
+    The traceback is printed by default when called while handling an
+    exception.
+    """
+    print(message)
+    if show_traceback is None:
+        show_traceback = sys.exc_info()[0] is not None
+    if show_traceback:
         traceback.print_exc()
-        return {}
+    failures.append(message.strip())
 
 
-def load_all_personas_raw():
+def list_personas():
     try:
-        with open("persona_config.json", "r") as f:
-            return json.load(f)
+        return get_registry().descriptions()
     except Exception as e:
-        print(f"❌ Failed to load raw persona config: {e}")
-        traceback.print_exc()
+        report_failure(f"❌ Failed to list personas: {e}")
         return {}
 
 
 class PersonaManager:
-    def __init__(self, initial_persona_name="default"):
+    def __init__(self, initial_persona_name="default", store=None, writer=None):
+        self.store = store
+        self.writer = writer  # BackgroundWriter for disk writes; None writes inline
         self.personas = {}
         self.memories = {}
+        self.journals = {}
+        self.retrievers = {}
+        self.summaries = {}  # persona key -> (memory, future) of a background summary fold
+        self._summary_pool = None
         self.current_key = initial_persona_name.lower()
-        self.current_persona = self.load(self.current_key)
+        self._generation = None  # Registry generation the cached personas were built from
+        self._preloaded = False
+
+    @property
+    def current_persona(self):
+        """The active persona's PersonaTraits, loaded from the config on first access."""
+        persona = self.personas.get(self.current_key)
+        if persona is None:
+            persona = self.load(self.current_key)
+        return persona
+
+    def _read_persona(self, persona_name):
+        """Build PersonaTraits for a persona from the registry (default's traits if missing)."""
+        registry = get_registry()
+        traits, version = registry.get_versioned(persona_name)
+        if traits is None:
+            print(f"[!] Persona '{persona_name}' not found. Falling back to 'default'.")
+            traits = registry.get("default") or {}
+            traits["name"] = "Default"
+        else:
+            traits["name"] = persona_name.title()
+        return PersonaTraits(traits, version)
 
     def load(self, persona_name):
+        """Load a persona from the config (discarding unsaved edits) and make it current."""
         try:
             persona_name = persona_name.lower()
-            persona = load_persona(persona_name)
+            persona = self._read_persona(persona_name)
             if persona_name not in self.memories:
-                self.memories[persona_name] = Memory()
+                self.memories[persona_name] = self.open_memory(persona_name)
             self.personas[persona_name] = persona
             self.current_key = persona_name
             return persona
         except Exception as e:
-            print(f"❌ Failed to load persona '{persona_name}': {e}")
-            traceback.print_exc()
-            return {"name": "Unknown", "description": "Failed to load persona", "template": "default.txt"}
+            report_failure(f"❌ Failed to load persona '{persona_name}': {e}")
+            return PersonaTraits({"name": "Unknown", "description": "Failed to load persona",
+                                  "template": "default.txt"})
+
+    def preload(self):
+        """Build every persona in the config from a single parse."""
+        registry = get_registry()
+        for name in registry.names():
+            if name not in self.personas:
+                traits, version = registry.get_versioned(name)
+                traits["name"] = name.title()
+                self.personas[name] = PersonaTraits(traits, version)
+        self._generation = registry.generation
+        self._preloaded = True
+
+    def refresh_personas(self):
+        """
+        Pick up config changes made on disk since the personas were built.
+
+        Costs one stat unless the file changed. Personas with unsaved
+        edits keep their base, so saving them still detects the conflict.
+        """
+        registry = get_registry()
+        registry.refresh()
+        if registry.generation == self._generation:
+            return
+        for name, persona in self.personas.items():
+            traits, version = registry.get_versioned(name)
+            if traits is not None and version != persona.version and not persona.edited:
+                traits["name"] = name.title()
+                persona.rebase(traits, version)
+        self._generation = registry.generation
+
+    @property
+    def journal(self):
+        return self.journal_for(self.current_key)
+
+    def journal_for(self, key):
+        """Return a persona's session journal, opening it on first use."""
+        journal = self.journals.get(key)
+        if journal is None:
+            persona = self.personas.get(key)
+            name = persona["name"] if persona is not None else key.title()
+            journal = self.journals[key] = SessionJournal(name, fsync_policy=FSYNC_POLICY)
+        return journal
+
+    def write(self, key, fn, payload, merge=None):
+        """Run a disk write through the background writer, or inline without one."""
+        if self.writer is not None:
+            self.writer.submit(key, fn, payload, merge)
+        else:
+            fn(payload)
+
+    def save(self, wait=False, notice=None):
+        """
+        Append the current persona's unsaved turns to its session journal.
+
+        The new turns are snapshotted here and written in the background;
+        with `wait`, block until they are on disk and report the file.
+        `notice` is printed by the write itself once it has succeeded.
+        """
+        try:
+            journal = self.journal
+            write = journal.write_batch
+            if notice:
+                def write_and_notify(batch):
+                    journal.write_batch(batch)
+                    print(notice)
+                write = write_and_notify
+            self.write(journal, write, journal.collect(self.memory), journal.merge_batches)
+            if wait:
+                if self.writer is not None:
+                    self.writer.flush()
+                if journal.path:
+                    print(f"\n✅ Session saved to '{journal.path}'")
+        except Exception as e:
+            report_failure(f"\n❌ Failed to save session: {e}")
+
+    def close(self):
+        """Save the current session, wait for pending writes and close every open journal."""
+        self.apply_summaries(wait=True)
+        if self._summary_pool is not None:
+            self._summary_pool.shutdown()
+        self.save(wait=True)
+        for journal in self.journals.values():
+            try:
+                journal.close()
+            except Exception as e:
+                report_failure(f"❌ Failed to close session journal: {e}")
 
     def switch(self, persona_name):
+        """Switch to a persona; preloaded personas and their edits are kept, so this is a lookup."""
         try:
-            save_session(self.current_persona["name"], self.memory)
-            self.current_persona = self.load(persona_name)
+            self.save()
+            if not self._preloaded:
+                self.preload()
+            else:
+                self.refresh_personas()
+            persona_name = persona_name.lower()
+            if persona_name in self.personas:
+                self.current_key = persona_name
+            else:
+                self.load(persona_name)
             print(f"\n🔄 Persona switched to: {self.current_persona['name']}\n")
         except Exception as e:
-            print(f"❌ Failed to switch persona: {e}")
-            traceback.print_exc()
+            report_failure(f"❌ Failed to switch persona: {e}")
 
     def edit_trait(self, trait, value):
         if trait in self.current_persona:
             self.current_persona[trait] = value
             print(f"✏️ Trait '{trait}' updated to: {value}\n")
         else:
-            print(f"❌ Trait '{trait}' not found in current persona.\n")
+            report_failure(f"❌ Trait '{trait}' not found in current persona.\n")
 
     def revert_traits(self):
-        try:
-            updated = load_persona(self.current_key)
-            self.current_persona = updated
-            self.personas[self.current_key] = updated
-            print(f"🔁 Reverted traits for '{self.current_key}' to saved state.\n")
-        except Exception as e:
-            print(f"❌ Failed to revert traits: {e}")
-            traceback.print_exc()
+        """Drop unsaved edits and reload the persona as currently stored on disk."""
+        persona = self.current_persona
+        persona.revert()
+        traits, version = get_registry().get_versioned(self.current_key)
+        if traits is not None:
+            traits["name"] = self.current_key.title()
+            persona.rebase(traits, version)
+        print(f"🔁 Reverted traits for '{self.current_key}' to saved state.\n")
+
+    def save_traits(self, force=False):
+        """
+        Write the current persona's traits to the config file.
+
+        The save is refused if another process changed this persona since
+        it was loaded, unless `force` is set. The write goes through the
+        writer so it stays ordered with other writes, but the user is
+        waiting on it, so this blocks until it is done.
+        """
+        key = self.current_key
+        persona = self.current_persona
+        name = persona["name"]
+
+        def save(traits):
+            # The expected version is read when the write runs, after any earlier queued save
+            try:
+                expected = None if force else persona.version
+                persona.rebase(traits, save_persona(key, traits, expected_version=expected))
+                print(f"💾 Traits saved for '{name}'.\n")
+            except ConfigConflictError as e:
+                report_failure(f"⚠️ {e}\n"
+                               "   Use /traits diff to compare, /traits revert to reload, "
+                               "or /traits save force to overwrite.\n", show_traceback=False)
+            except Exception as e:
+                report_failure(f"❌ Failed to save traits: {e}")
+
+        # A later save of the same persona supersedes one that is still queued
+        self.write(("traits", key), save, dict(persona), merge=lambda queued, latest: latest)
+        if self.writer is not None:
+            self.writer.flush()
+
+    @staticmethod
+    def _summarize(persona_key, previous, conversation):
+        """Ask the model to fold `conversation` into the `previous` summary."""
+        if previous:
+            prompt = (
+                "System: You are a helpful assistant summarizing a conversation.\n"
+                "Task: Update the running summary with the new part of the conversation, "
+                "keeping the major points and tone.\n"
+                f"Summary so far:\n{previous}\n"
+                f"New conversation:\n{conversation}"
+            )
+        else:
+            prompt = (
+                "System: You are a helpful assistant summarizing a conversation.\n"
+                "Task: Summarize the following conversation clearly, focusing on major points and tone.\n"
+                f"Conversation:\n{conversation}"
+            )
+        from response_handler import get_response, ERROR_RESPONSE, RATE_LIMIT_RESPONSE, SUMMARY
+        summary = get_response(prompt, persona=persona_key, priority=SUMMARY)
+        if summary in (ERROR_RESPONSE, RATE_LIMIT_RESPONSE):
+            raise RuntimeError("the model call for the summary failed")
+        return summary
+
+    def _journal_summary(self, key, memory):
+        journal = self.journal_for(key)
+        self.write(journal, journal.write_batch, journal.summary_batch(memory), journal.merge_batches)
+
+    def update_summary(self, force=False):
+        """
+        Fold un-summarized turns into the current memory's rolling summary
+        and journal the result, waiting for the model.
+
+        Returns:
+            bool: True if the summary changed.
+        """
+        self.apply_summaries(wait=True)
+        key = self.current_key
+        changed = self.memory.update_summary(
+            lambda previous, conversation: self._summarize(key, previous, conversation),
+            threshold=SUMMARY_THRESHOLD, force=force,
+        )
+        if changed:
+            self._journal_summary(key, self.memory)
+        return changed
+
+    def start_summary(self):
+        """
+        Start folding the current memory's un-summarized turns into its
+        rolling summary on a background thread, at SUMMARY priority.
+
+        Nothing is done if the persona's template has no {{summary}}, a
+        fold for this persona is already running, or the tail is below
+        `SUMMARY_THRESHOLD`. The result is applied by `apply_summaries`.
+
+        Returns:
+            bool: True if a fold was started.
+        """
+        self.apply_summaries()
+        key = self.current_key
+        memory = self.memory
+        if (key in self.summaries or memory.unsummarized < SUMMARY_THRESHOLD
+                or "summary" not in template_placeholders(self.current_persona)):
+            return False
+
+        def fold(previous, chunks):
+            summarized = None
+            for stop, text in chunks:
+                previous = self._summarize(key, previous, text)
+                summarized = stop
+            return previous, summarized
+
+        if self._summary_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._summary_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self.summaries[key] = (memory, self._summary_pool.submit(fold, memory.summary, memory.summary_chunks()))
+        return True
+
+    def apply_summaries(self, wait=False):
+        """
+        Apply finished background summaries to their memories and journal them.
+
+        Args:
+            wait (bool): Wait for running folds instead of skipping them.
+        """
+        for key, (memory, future) in list(self.summaries.items()):
+            if not (wait or future.done()):
+                continue
+            del self.summaries[key]
+            try:
+                summary, summarized = future.result()
+            except Exception as e:
+                print(f"[!] Failed to update rolling summary: {e}")
+                continue
+            # Skip memories reset while the fold was running
+            if self.memories.get(key) is memory and summarized is not None:
+                memory.set_summary(summary, summarized)
+                self._journal_summary(key, memory)
+
+    @property
+    def retriever(self):
+        """The current memory's MemoryRetriever, rebuilt if the memory was replaced."""
+        retriever = self.retrievers.get(self.current_key)
+        if retriever is None or retriever.memory is not self.memory:
+            from retrieval import MemoryRetriever
+            retriever = self.retrievers[self.current_key] = MemoryRetriever(self.memory)
+        return retriever
+
+    def prompt_context(self, user_input):
+        """
+        Gather the conversation context for a prompt.
+
+        Only the parts the persona's template has placeholders for are
+        computed; the others are left empty.
+
+        Returns:
+            dict: build_prompt keyword arguments: the recent history window,
+            the rolling summary, and older turns relevant to `user_input`.
+        """
+        used = template_placeholders(self.current_persona)
+        memory = self.memory
+        context = {"history": "", "summary": "", "relevant": ""}
+        # Retrieved turns come from before the history window, or from anywhere without one
+        window_start = len(memory)
+        if "history" in used:
+            window_start = memory.window_start(CONTEXT_TOKEN_BUDGET)
+            context["history"] = "\n".join(memory.lines(window_start))
+        if "summary" in used:
+            self.apply_summaries()
+            context["summary"] = memory.summary
+        if "relevant" in used and RETRIEVAL_TOP_K and window_start:
+            context["relevant"] = self.retriever.relevant(user_input, k=RETRIEVAL_TOP_K, stop=window_start)
+        return context
+
+    def open_memory(self, persona_name):
+        """Create a persona's Memory, resuming its stored history if there is a store."""
+        memory = Memory(self.store, persona_name)
+        if memory.resumed:
+            print(f"📂 Resumed {memory.resumed} stored turns for '{persona_name}'.")
+        return memory
+
+    def reset_memory(self):
+        """Start the current persona's conversation over, deleting any stored history."""
+        if self.store is not None:
+            self.store.reset(self.current_key)
+        self.memories[self.current_key] = Memory(self.store, self.current_key)
 
     @property
     def memory(self):
-        return self.memories[self.current_key]
+        memory = self.memories.get(self.current_key)
+        if memory is None:
+            memory = self.memories[self.current_key] = self.open_memory(self.current_key)
+        return memory
+
+
+def append_text(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def diff_traits(persona):
+    """Return (added, removed, modified) traits of a PersonaTraits versus its saved base."""
+    return persona.diff()
+
+
+def print_stats():
+    snapshot = metrics.metrics.snapshot()
+    print(f"\n⏱️ Turn Statistics (uptime {snapshot['uptime_s']:.0f}s):")
+    if snapshot["histograms"]:
+        print(f"  {'stage':<20} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'max ms':>9}")
+        for name, h in sorted(snapshot["histograms"].items()):
+            print(f"  {name:<20} {h['count']:>7} {h['p50_ms']:>9.2f} {h['p99_ms']:>9.2f} "
+                  f"{h['mean_ms']:>9.2f} {h['max_ms']:>9.2f}")
+    for name, value in sorted(snapshot["counters"].items()):
+        print(f"  {name}: {value}")
+    for name, value in sorted(snapshot["gauges"].items()):
+        print(f"  {name} (now): {value}")
+    if not (snapshot["histograms"] or snapshot["counters"]):
+        print("  ⚠️ No measurements yet.")
+    print()
+
+
+def print_import_progress(count, bytes_read, total_bytes):
+    percent = 100 * bytes_read / total_bytes if total_bytes else 100
+    print(f"\r📥 {count} entries imported ({percent:.0f}%)", end="", flush=True)
+
+
+def parse_search_args(text):
+    """
+    Parse `/search` arguments: terms plus optional --or, --speaker <name>
+    and --limit <n> flags.
+
+    Returns:
+        tuple: (query, mode, speaker, limit)
+    """
+    terms, mode, speaker, limit = [], "and", None, 10
+    parts = text.split()
+    i = 0
+    while i < len(parts):
+        part = parts[i]
+        if part == "--or":
+            mode = "or"
+        elif part == "--and":
+            mode = "and"
+        elif part == "--speaker" and i + 1 < len(parts):
+            i += 1
+            speaker = parts[i]
+        elif part == "--limit" and i + 1 < len(parts):
+            i += 1
+            limit = int(parts[i])
+        else:
+            terms.append(part)
+        i += 1
+    return " ".join(terms), mode, speaker, limit
 
 
-def diff_traits(saved, current):
-    added = {k: v for k, v in current.items() if k not in saved}
-    removed = {k: v for k, v in saved.items() if k not in current}
-    modified = {
-        k: (saved[k], current[k])
-        for k in saved if k in current and saved[k] != current[k]
-    }
-    return added, removed, modified
+def confirm_interactive(question):
+    """Ask a y/n question on the terminal."""
+    return input(question).strip().lower() == "y"
 
 
-def main():
-    manager = PersonaManager()
+def dispatch(manager, user_input, confirm=confirm_interactive):
+    """
+    Run one line of input: a /command or a message for the current persona.
 
-    while True:
-        try:
-            user_input = input(f"[{manager.current_persona['name']}] You: ").strip()
-        except KeyboardInterrupt:
-            print("\n👋 Exiting via keyboard interrupt. Saving session...")
-            save_session(manager.current_persona["name"], manager.memory)
-            break
+    Used by both the interactive prompt and `--script` replays.
 
-        if user_input.lower() in ["exit", "quit", "/exit", "/quit"]:
-            print("👋 Exiting. Saving session...")
-            save_session(manager.current_persona["name"], manager.memory)
-            break
+    Args:
+        manager (PersonaManager): The session state.
+        user_input (str): The stripped input line.
+        confirm (callable): Asks a y/n question and returns True for yes.
 
-        try:
-            # ==== Settings ====
-            if user_input.lower() == "/autosave_summary":
-                global AUTOSAVE_SUMMARY
-                AUTOSAVE_SUMMARY = not AUTOSAVE_SUMMARY
-                print(f"📝 Summary autosave {'enabled' if AUTOSAVE_SUMMARY else 'disabled'}.\n")
-
-            # ==== Persona Management ====
-            elif user_input.lower().startswith("/switch "):
-                manager.switch(user_input.split(" ", 1)[1].strip())
-
-            elif user_input.lower() == "/list":
-                print("\n📋 Available Personas:")
-                for key, desc in list_personas().items():
-                    print(f" - {key}: {desc}")
-                print()
+    Returns:
+        bool: False if the input ends the session.
+    """
+    global AUTOSAVE_SUMMARY
+    if user_input.lower() in ["exit", "quit", "/exit", "/quit"]:
+        print("👋 Exiting. Saving session...")
+        manager.close()
+        return False
 
-            elif user_input.lower().startswith("/traits edit "):
-                try:
-                    _, _, body = user_input.partition("edit ")
-                    trait, value = map(str.strip, body.split("=", 1))
-                    manager.edit_trait(trait.lower(), value)
-                except Exception as e:
-                    print(f"❌ Failed to edit trait: {e}")
-                    traceback.print_exc()
+    # ==== Settings ====
+    if user_input.lower() == "/autosave_summary":
+        AUTOSAVE_SUMMARY = not AUTOSAVE_SUMMARY
+        print(f"📝 Summary autosave {'enabled' if AUTOSAVE_SUMMARY else 'disabled'}.\n")
 
-            elif user_input.lower() == "/traits save":
-                try:
-                    data = load_all_personas_raw()
-                    data[manager.current_key] = manager.current_persona
-                    with open("persona_config.json", "w") as f:
-                        json.dump(data, f, indent=2)
-                    print(f"💾 Traits saved for '{manager.current_persona['name']}'.\n")
-                except Exception as e:
-                    print(f"❌ Failed to save traits: {e}")
-                    traceback.print_exc()
+    # ==== Persona Management ====
+    elif user_input.lower().startswith("/switch "):
+        manager.switch(user_input.split(" ", 1)[1].strip())
 
-            elif user_input.lower() == "/traits revert":
-                manager.revert_traits()
+    elif user_input.lower() == "/list":
+        print("\n📋 Available Personas:")
+        for key, desc in list_personas().items():
+            print(f" - {key}: {desc}")
+        print()
 
-            elif user_input.lower() == "/traits diff":
-                try:
-                    saved = load_persona(manager.current_key)
-                    current = manager.current_persona
-                    added, removed, modified = diff_traits(saved, current)
-
-                    print(f"\n🔍 Trait differences for '{manager.current_key}':\n")
-                    if added:
-                        print("➕ Added Traits:")
-                        for k, v in added.items():
-                            print(f"  - {k}: {v}")
-                    if removed:
-                        print("\n❌ Removed Traits:")
-                        for k, v in removed.items():
-                            print(f"  - {k}: {v}")
-                    if modified:
-                        print("\n🔧 Modified Traits:")
-                        for k, (old, new) in modified.items():
-                            print(f"  - {k}: {old} → {new}")
-                    if not (added or removed or modified):
-                        print("✅ No differences found. Traits are identical.\n")
-                    print()
-                except Exception as e:
-                    print(f"❌ Failed to diff traits: {e}")
-                    traceback.print_exc()
+    elif user_input.lower().startswith("/traits edit "):
+        try:
+            _, _, body = user_input.partition("edit ")
+            trait, value = map(str.strip, body.split("=", 1))
+            manager.edit_trait(trait.lower(), value)
+        except Exception as e:
+            report_failure(f"❌ Failed to edit trait: {e}")
 
-            elif user_input.lower().startswith("/traits"):
-                try:
-                    parts = user_input.strip().split(" ", 1)
-                    raw = load_all_personas_raw()
-                    name = parts[1].strip().lower() if len(parts) == 2 else manager.current_key
-                    if name in raw:
-                        print(f"\n🧬 Traits for '{name}':")
-                        for k, v in raw[name].items():
-                            print(f"{k.capitalize()}: {v}")
-                        print()
-                    else:
-                        print(f"❌ Persona '{name}' not found.\n")
-                except Exception as e:
-                    print(f"❌ Failed to load traits: {e}")
-                    traceback.print_exc()
+    elif user_input.lower() in ("/traits save", "/traits save force"):
+        manager.save_traits(force=user_input.lower().endswith("force"))
 
-            # ==== Memory ====
-            elif user_input.lower() == "/save":
-                save_session(manager.current_persona["name"], manager.memory)
-                print("✅ Session saved.\n")
-
-            elif user_input.lower() == "/reset":
-                manager.memories[manager.current_key] = Memory()
-                print(f"🧼 Memory reset for: {manager.current_persona['name']}\n")
-
-            elif user_input.lower() == "/history":
-                print(f"\n📜 Conversation History ({manager.current_persona['name']}):")
-                for entry in manager.memory.history:
-                    if isinstance(entry, dict) and "speaker" in entry and "message" in entry:
-                        print(f"{entry['speaker']}: {entry['message']}")
-                    else:
-                        print(f"⚠️ Skipping malformed entry: {entry}")
-                print()
+    elif user_input.lower() == "/traits revert":
+        manager.revert_traits()
 
-            elif user_input.lower().startswith("/history filter "):
-                keyword = user_input.split(" ", 2)[2].strip().lower()
-                matches = 0
-                print(f"\n📜 Filtered History for '{keyword}':")
-                for entry in manager.memory.history:
-                    if isinstance(entry, dict) and keyword in (entry["speaker"] + entry["message"]).lower():
-                        print(f"{entry['speaker']}: {entry['message']}")
-                        matches += 1
-                print(f"\n✅ {matches} entries matched.\n" if matches else f"❌ No entries found.\n")
-
-            elif user_input.lower() == "/history count":
-                valid = [e for e in manager.memory.history if isinstance(e, dict) and "speaker" in e and "message" in e]
-                print(f"🧮 Total valid conversation entries: {len(valid)}\n")
-
-            elif user_input.lower() == "/summary":
-                print("📡 Generating summary of conversation...")
-                context = manager.memory.get_context()
-                if not context.strip():
-                    print("⚠️ No messages to summarize.\n")
-                    continue
-                try:
-                    summary = get_response(
-                        f"System: You are a helpful assistant summarizing a conversation.\n"
-                        "Task: Summarize the following conversation clearly, focusing on major points and tone.\n"
-                        f"Conversation:\n{context}"
-                    )
-                    print("\n📌 Conversation Summary:\n" + summary + "\n")
-                    if AUTOSAVE_SUMMARY:
-                        file_name = f"{manager.current_persona['name']}_summary.txt"
-                        with open(file_name, "a", encoding="utf-8") as f:
-                            f.write(f"\n==== Summary ({manager.current_persona['name']}): ====\n{summary}\n")
-                        print(f"💾 Summary saved to '{file_name}'\n")
-                except Exception as e:
-                    print(f"❌ Failed to generate summary: {e}")
-                    traceback.print_exc()
+    elif user_input.lower() == "/traits diff":
+        try:
+            added, removed, modified = diff_traits(manager.current_persona)
+
+            print(f"\n🔍 Trait differences for '{manager.current_key}':\n")
+            if added:
+                print("➕ Added Traits:")
+                for k, v in added.items():
+                    print(f"  - {k}: {v}")
+            if removed:
+                print("\n❌ Removed Traits:")
+                for k, v in removed.items():
+                    print(f"  - {k}: {v}")
+            if modified:
+                print("\n🔧 Modified Traits:")
+                for k, (old, new) in modified.items():
+                    print(f"  - {k}: {old} → {new}")
+            if not (added or removed or modified):
+                print("✅ No differences found. Traits are identical.\n")
+            print()
+        except Exception as e:
+            report_failure(f"❌ Failed to diff traits: {e}")
 
-            elif user_input.lower() == "/context":
-                print("\n🧠 Conversation Context Overview:")
-                try:
-                    context = manager.memory.get_context_summary()
-                    print(context if context else "⚠️ No context available yet.")
-                except Exception as e:
-                    print(f"❌ Failed to get context summary: {e}")
-                    traceback.print_exc()
+    elif user_input.lower().startswith("/traits"):
+        try:
+            parts = user_input.strip().split(" ", 1)
+            name = parts[1].strip().lower() if len(parts) == 2 else manager.current_key
+            traits = get_registry().get(name)
+            if traits is not None:
+                print(f"\n🧬 Traits for '{name}':")
+                for k, v in traits.items():
+                    print(f"{k.capitalize()}: {v}")
                 print()
+            else:
+                report_failure(f"❌ Persona '{name}' not found.\n")
+        except Exception as e:
+            report_failure(f"❌ Failed to load traits: {e}")
+
+    # ==== Memory ====
+    elif user_input.lower() == "/save":
+        manager.save(wait=True)
+        print("✅ Session saved.\n")
+
+    elif user_input.lower() == "/reset":
+        manager.reset_memory()
+        print(f"🧼 Memory reset for: {manager.current_persona['name']}\n")
+
+    elif user_input.lower() == "/history":
+        print(f"\n📜 Conversation History ({manager.current_persona['name']}):")
+        for entry in manager.memory.history:
+            print(f"{entry.speaker}: {entry.message}")
+        print()
+
+    elif user_input.lower().startswith("/history filter "):
+        keyword = user_input.split(" ", 2)[2].strip().lower()
+        entries = manager.memory.filter(keyword)
+        print(f"\n📜 Filtered History for '{keyword}':")
+        for entry in entries:
+            print(f"{entry.speaker}: {entry.message}")
+        matches = len(entries)
+        print(f"\n✅ {matches} entries matched.\n" if matches else f"❌ No entries found.\n")
+
+    elif user_input.lower().startswith("/search "):
+        try:
+            query, mode, speaker, limit = parse_search_args(user_input.split(" ", 1)[1])
+            results = manager.memory.search(query, mode=mode, speaker=speaker, limit=limit)
+            print(f"\n🔎 Search results for '{query}' ({mode.upper()}):")
+            for index, score in results:
+                print(f"  #{index + 1} [{score:.2f}] {manager.memory.line(index)}")
+            print(f"\n✅ {len(results)} entries matched.\n" if results else "❌ No entries found.\n")
+        except Exception as e:
+            report_failure(f"❌ Failed to search history: {e}")
 
-            # ==== Config ====
-            elif user_input.lower() == "/reload":
-                try:
-                    manager.current_persona = manager.load(manager.current_key)
-                    print(f"🔄 Reloaded configuration for '{manager.current_key}'.\n")
-                except Exception as e:
-                    print(f"❌ Failed to reload config: {e}")
-                    traceback.print_exc()
+    elif user_input.lower() == "/history count":
+        print(f"🧮 Total valid conversation entries: {len(manager.memory)}\n")
 
-            elif user_input.lower().startswith("/importlog "):
-                try:
-                    path = user_input.split(" ", 1)[1].strip()
-                    confirm = input(f"📄 Importing log from '{path}'. Proceed? (y/n): ").strip().lower()
-                    if confirm != "y":
-                        print("❌ Import canceled.\n")
-                        continue
-                    entries = parse_log_file(path)
-                    count = sum(1 for e in entries if "speaker" in e and "message" in e)
-                    for e in entries:
-                        manager.memory.add(e["speaker"], e["message"])
-                    print(f"✅ Imported {count} log entries into memory.\n")
-                except Exception as e:
-                    print(f"❌ Failed to import log: {e}")
-                    traceback.print_exc()
+    elif user_input.lower() == "/summary":
+        print("📡 Generating summary of conversation...")
+        if not len(manager.memory):
+            print("⚠️ No messages to summarize.\n")
+            return True
+        try:
+            manager.update_summary(force=True)
+            summary = manager.memory.summary
+            print("\n📌 Conversation Summary:\n" + summary + "\n")
+            if AUTOSAVE_SUMMARY:
+                file_name = f"{manager.current_persona['name']}_summary.txt"
+                manager.write(
+                    file_name,
+                    lambda text, path=file_name: append_text(path, text),
+                    f"\n==== Summary ({manager.current_persona['name']}): ====\n{summary}\n",
+                    merge=lambda queued, text: queued + text,
+                )
+                print(f"💾 Summary saved to '{file_name}'\n")
+        except Exception as e:
+            report_failure(f"❌ Failed to generate summary: {e}")
 
-            elif user_input.lower() == "/help":
-                print("""
+    elif user_input.lower() == "/context":
+        print("\n🧠 Conversation Context Overview:")
+        try:
+            context = manager.memory.get_context_summary()
+            print(context if context else "⚠️ No context available yet.")
+        except Exception as e:
+            report_failure(f"❌ Failed to get context summary: {e}")
+        print()
+
+    # ==== Config ====
+    elif user_input.lower() == "/reload":
+        try:
+            manager.load(manager.current_key)
+            print(f"🔄 Reloaded configuration for '{manager.current_key}'.\n")
+        except Exception as e:
+            report_failure(f"❌ Failed to reload config: {e}")
+
+    elif user_input.lower() == "/stats":
+        print_stats()
+
+    elif user_input.lower() == "/stats reset":
+        metrics.metrics.reset()
+        print("🧹 Statistics reset.\n")
+
+    elif user_input.lower() == "/cache":
+        from response_handler import get_cache
+        stats = get_cache().stats()
+        print("\n🗃️ Response Cache:")
+        print(f"  Hits: {stats['hits']} (disk: {stats['disk_hits']})")
+        print(f"  Misses: {stats['misses']}")
+        print(f"  Hit rate: {stats['hit_rate']:.0%}")
+        print(f"  Entries: {stats['size']} (evicted: {stats['evictions']})\n")
+
+    elif user_input.lower() == "/cache clear":
+        from response_handler import get_cache
+        get_cache().clear()
+        print("🧹 Response cache cleared.\n")
+
+    elif user_input.lower().startswith("/importlog "):
+        try:
+            path = user_input.split(" ", 1)[1].strip()
+            if not confirm(f"📄 Importing log from '{path}'. Proceed? (y/n): "):
+                print("❌ Import canceled.\n")
+                return True
+            from log_importer import import_log
+            count = import_log(path, manager.memory, on_progress=print_import_progress)
+            print(f"\n✅ Imported {count} log entries into memory.\n")
+        except Exception as e:
+            report_failure(f"❌ Failed to import log: {e}")
+
+    elif user_input.lower() == "/help":
+        print("""
 📖 Help Menu – Available Commands
 
 💡 Basics:
@@ -291,11 +680,16 @@ def main():
   /save                    – Save current session
   /reload                  – Reload current persona's config
   /autosave_summary        – Toggle automatic saving of summaries
+  /stats                   – Show per-stage turn latency statistics
+  /stats reset             – Reset the statistics
+  /cache                   – Show response cache hit/miss statistics
+  /cache clear             – Clear the response cache
 
 🧠 Conversation Memory:
   /history                 – View full conversation history
   /history filter <term>   – Filter history by keyword
   /history count           – Count valid conversation entries
+  /search <terms>          – Ranked search (flags: --or, --speaker <name>, --limit <n>)
   /reset                   – Reset memory for current persona
   /summary                 – Summarize conversation using AI
   /context                 – Show recent conversation context
@@ -307,6 +701,7 @@ def main():
   /traits <name>           – View traits of specified persona
   /traits edit <k> = <v>   – Edit a trait in current persona
   /traits save             – Save current trait changes
+  /traits save force       – Save even if the persona changed on disk
   /traits revert           – Revert to saved traits
   /traits diff             – Show trait differences vs saved state
 
@@ -314,23 +709,262 @@ def main():
   /importlog <file_path>   – Import a conversation log file
 """)
 
-            # ==== Message Processing ====
-            else:
-                prompt = build_prompt(manager.current_persona, user_input)
-                response = get_response(prompt)
-                manager.memory.add("You", user_input)
-                manager.memory.add(manager.current_persona["name"], response)
+    # ==== Message Processing ====
+    else:
+        from response_handler import get_response, stream_response
+        turn_start = time.perf_counter()
+        prompt = build_prompt(manager.current_persona, user_input, **manager.prompt_context(user_input))
+        if STREAM_RESPONSES:
+            print(f"\n{manager.current_persona['name']}: ", end="", flush=True)
+            chunks = []
+            for chunk in stream_response(prompt, persona=manager.current_key):
+                print(chunk, end="", flush=True)
+                chunks.append(chunk)
+            print("\n")
+            response = "".join(chunks)
+        else:
+            response = get_response(prompt, persona=manager.current_key)
+            print(f"\n{manager.current_persona['name']}: {response}\n")
+
+        manager.memory.add("You", user_input)
+        manager.memory.add(manager.current_persona["name"], response)
+
+        if ROLLING_SUMMARY:
+            manager.start_summary()
+
+        if AUTOSAVE:
+            manager.save(notice="💾 Autosaved.\n")
+
+        metrics.observe("turn.total", (time.perf_counter() - turn_start) * 1000)
 
-                if AUTOSAVE:
-                    save_session(manager.current_persona["name"], manager.memory)
-                    print("💾 Autosaved.\n")
+    return True
 
-                print(f"\n{manager.current_persona['name']}: {response}\n")
 
+def repl(manager):
+    """Read commands from the terminal until the user exits."""
+    while True:
+        try:
+            user_input = input(f"[{manager.current_persona['name']}] You: ").strip()
+        except KeyboardInterrupt:
+            print("\n👋 Exiting via keyboard interrupt. Saving session...")
+            manager.close()
+            break
+
+        try:
+            if not dispatch(manager, user_input):
+                break
         except Exception as e:
             print(f"❌ Unexpected error: {e}")
             traceback.print_exc()
 
 
+def parse_script_line(line):
+    """
+    Parse one line of a `--script` file.
+
+    A line is a JSON object {"input": "...", "confirm": true}, a JSON
+    string, a session journal record (only the user's turns are
+    replayed) or, failing those, plain text.
+
+    Returns:
+        tuple: (input, confirm) where confirm is None unless the line
+        overrides the default answer; None for lines to skip.
+    """
+    text = line.strip()
+    if not text:
+        return None
+    if text[0] in "{\"":
+        try:
+            row = json.loads(text)
+        except json.JSONDecodeError:
+            row = text
+        if isinstance(row, dict):
+            if "input" in row:
+                return str(row["input"]).strip(), row.get("confirm")
+            if row.get("speaker") == "You" and "message" in row:
+                return str(row["message"]).strip(), None
+            return None  # persona replies, summaries and other journal records
+        if isinstance(row, str):
+            return row.strip(), None
+    return text, None
+
+
+def run_script(manager, source, results, assume_yes=False):
+    """
+    Replay commands from `source` through `dispatch`, without a terminal.
+
+    Each command's printed output (stdout and stderr) is captured and
+    written to `results` as one JSON object per line:
+
+        {"line": 3, "input": "/switch scientist", "persona": "scientist",
+         "ok": true, "ms": 1.42, "output": "..."}
+
+    A command fails ("ok": false, plus an "error") if it raises or a
+    handler reports a failure (see `report_failure`).
+
+    Replay stops at an exit command or the end of the input.
+
+    Args:
+        manager (PersonaManager): The session state.
+        source (file): Script lines.
+        results (file): Where result rows are written.
+        assume_yes (bool): Answer to confirmations a line does not override.
+
+    Returns:
+        tuple: (commands run, commands failed)
+    """
+    count = failed = 0
+    try:
+        for line_number, line in enumerate(source, start=1):
+            parsed = parse_script_line(line)
+            if parsed is None:
+                continue
+            user_input, answer = parsed
+            answer = assume_yes if answer is None else bool(answer)
+
+            def confirm(question, answer=answer):
+                print(question + ("y" if answer else "n"))
+                return answer
+
+            output = io.StringIO()
+            error = None
+            failures.clear()
+            start = time.perf_counter()
+            with redirect_stdout(output), redirect_stderr(output):
+                try:
+                    keep_going = dispatch(manager, user_input, confirm)
+                except Exception as e:
+                    keep_going = True
+                    error = f"{type(e).__name__}: {e}"
+                    traceback.print_exc()
+                if manager.writer is not None:
+                    # Background writes report here, so each row holds its own output
+                    manager.writer.flush()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if error is None and failures:
+                error = "\n".join(failures)
+            metrics.observe("command.total", elapsed_ms)
+
+            row = {"line": line_number, "input": user_input, "persona": manager.current_key,
+                   "ok": error is None, "ms": round(elapsed_ms, 3), "output": output.getvalue()}
+            if error is not None:
+                row["error"] = error
+                failed += 1
+            count += 1
+            results.write(json.dumps(row, ensure_ascii=False) + "\n")
+            if not keep_going:
+                return count, failed
+    except KeyboardInterrupt:
+        print("\n👋 Replay interrupted. Saving session...", file=sys.stderr)
+    with redirect_stdout(sys.stderr):  # keep `results` pure JSONL when it is stdout
+        manager.close()
+    return count, failed
+
+
+def main(script=None, results_path=None, assume_yes=False, persist=False):
+    """
+    Run the interactive prompt, or replay `script` ("-" for stdin).
+
+    Replays use a private in-memory conversation store unless `persist`
+    is set, so a script gives the same results however often it is run
+    and never mixes its turns into the saved history.
+
+    Returns:
+        int: Exit status; 2 if any scripted command failed.
+    """
+    store = None
+    if CONVERSATION_STORE_PATH:
+        from conversation_store import ConversationStore
+        try:
+            store = ConversationStore(CONVERSATION_STORE_PATH if script is None or persist else ":memory:")
+        except Exception as e:
+            print(f"[!] Conversation store unavailable, memories will not persist: {e}", file=sys.stderr)
+    writer = BackgroundWriter() if BACKGROUND_IO else None
+    manager = PersonaManager(store=store, writer=writer)
+    dumper = None
+    if METRICS_DUMP_PATH:
+        dumper = metrics.PeriodicDumper(METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL, METRICS_DUMP_FORMAT).start()
+
+    status = 0
+    if script is None:
+        repl(manager)
+    else:
+        source = sys.stdin if script == "-" else open(script, "r", encoding="utf-8")
+        results = sys.stdout if results_path in (None, "-") else open(results_path, "w", encoding="utf-8")
+        started = time.perf_counter()
+        try:
+            count, failed = run_script(manager, source, results, assume_yes)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if results is not sys.stdout:
+                results.close()
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0.0
+        print(f"✅ Replayed {count} commands ({failed} failed) in {elapsed:.2f}s ({rate:.1f} commands/s).",
+              file=sys.stderr)
+        status = 2 if failed else 0
+
+    if writer is not None:
+        writer.close()
+    if dumper:
+        dumper.stop()
+    if store is not None:
+        store.close()
+    return status
+
+
+def profile_startup():
+    """
+    Report where CLI startup time goes: a per-module import-time breakdown
+    (via `python -X importtime`) and the first-use cost of each lazy phase.
+    """
+    import subprocess
+
+    print("⏱️ Import time breakdown (cumulative, top 15):")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        rows.append((int(cumulative_us), int(self_us), name))
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:15]:
+        print(f"  {name.strip():<32} {cumulative_us / 1000:>8.2f} ms (self {self_us / 1000:.2f} ms)")
+
+    def phase(label, fn):
+        start = time.perf_counter()
+        fn()
+        print(f"  {label:<32} {(time.perf_counter() - start) * 1000:>8.2f} ms")
+
+    print("\n⏱️ First-use phases:")
+    from prompt_builder import template_registry
+    phase("persona config parse", lambda: get_registry().refresh())
+    phase("template preload", template_registry.preload)
+    phase("response_handler import", lambda: __import__("response_handler"))
+    phase("backend init", lambda: sys.modules["response_handler"].get_backend())
+    phase("log_importer import", lambda: __import__("log_importer"))
+    phase("initial persona load", lambda: PersonaManager().current_persona)
+
+
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Persona Architect command line.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import and first-use timings, then exit")
+    parser.add_argument("--script", metavar="FILE",
+                        help="Replay commands from FILE ('-' for stdin) instead of prompting")
+    parser.add_argument("--results", metavar="FILE",
+                        help="JSONL file for per-command --script results (default: stdout)")
+    parser.add_argument("--yes", action="store_true",
+                        help="Answer yes to confirmations during --script (default: no)")
+    parser.add_argument("--persist", action="store_true",
+                        help="Resume and save the conversation store during --script (default: in-memory)")
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup()
+    else:
+        sys.exit(main(args.script, args.results, args.yes, args.persist))
@@ -4,41 +4,600 @@
 Handles conversation history by storing user and persona messages.
 Used to simulate memory during multi-turn dialogues and to support
 session saving at the end of the interaction.
+
+Entries are kept in compact, array-backed storage: speaker names are
+interned to small integer IDs and message text lives in one contiguous
+UTF-8 buffer indexed by an offset array. Per-entry token estimates are
+tracked as messages are added, so a token-budgeted window of recent
+turns costs O(window) rather than O(history).
+
+An inverted index (token -> entry IDs) is maintained incrementally in
+`add`, so keyword searches only touch the entries that match.
+
+A rolling summary covers the oldest `summarized` entries. When the
+un-summarized tail grows past a threshold, only that tail is summarized
+(in token-bounded chunks) and folded into the running summary.
+
+A Memory can be backed by a `ConversationStore`. Turns are then
+persisted as they are added, only a recent window is kept in RAM, and
+older turns are paged in from disk when accessed.
 """
 
+import math
+import re
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import metrics
+
+# Rough average for English text with common tokenizers.
+CHARS_PER_TOKEN = 4
+
+MAX_SPEAKERS = 0xFFFF
+
+SUMMARY_THRESHOLD = 20      # Un-summarized entries that trigger a rolling update
+SUMMARY_CHUNK_TOKENS = 2000  # Max tokens of conversation sent per summary call
+
+RESUME_ENTRIES = 500  # Recent turns kept in RAM for store-backed memories
+PAGE_SIZE = 256         # Entries fetched per page when reading older turns
+MAX_CACHED_PAGES = 16   # Pages of older turns cached in RAM
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of model tokens in a piece of text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Approximate token count (at least 1 for non-empty text).
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def tokenize(text):
+    """
+    Split text into lowercased word tokens for indexing and search.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The tokens in order of appearance.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class Entry:
+    """
+    A single conversation entry.
+
+    Supports both attribute access (`entry.speaker`) and the mapping-style
+    access (`entry["speaker"]`) used by the original dict entries.
+    """
+
+    __slots__ = ("speaker", "message")
+
+    def __init__(self, speaker, message):
+        self.speaker = speaker
+        self.message = message
+
+    def __getitem__(self, key):
+        if key == "speaker":
+            return self.speaker
+        if key == "message":
+            return self.message
+        raise KeyError(key)
+
+    def __eq__(self, other):
+        if isinstance(other, Entry):
+            return self.speaker == other.speaker and self.message == other.message
+        if isinstance(other, dict):
+            return other == self.as_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Entry(speaker={self.speaker!r}, message={self.message!r})"
+
+    def as_dict(self):
+        """Return the entry as a { "speaker": ..., "message": ... } dict."""
+        return {"speaker": self.speaker, "message": self.message}
+
+
+class HistoryView(Sequence):
+    """Read-only sequence view over a Memory's entries."""
+
+    __slots__ = ("_memory",)
+
+    def __init__(self, memory):
+        self._memory = memory
+
+    def __len__(self):
+        return len(self._memory)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._memory.entry(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._memory.entry(index)
+
+    def __iter__(self):
+        entry = self._memory.entry
+        for i in range(len(self)):
+            yield entry(i)
+
+
 class Memory:
-    def __init__(self):
-        self.history = []
+    """
+    Conversation history for one persona.
+
+    Args:
+        store (ConversationStore): Optional on-disk store backing this
+            memory. Every added turn is persisted, and on creation only the
+            most recent `resume_entries` turns are loaded; older turns are
+            paged in from the store when accessed.
+        key (str): Persona key the history is stored under.
+        resume_entries (int): Turns kept resident when backed by a store.
+    """
+
+    def __init__(self, store=None, key=None, resume_entries=RESUME_ENTRIES):
+        self._store = store
+        self._key = key
+        self._resume_entries = resume_entries
+        self._base = 0
+        self._pages = OrderedDict()
+        self._reset_resident()
+        self._context = ""
+        self._context_size = 0
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.summary = ""
+        self.summarized = 0
+        self.resumed = 0
+
+        if store is not None:
+            total = store.count(key)
+            self._base = max(total - resume_entries, 0)
+            for speaker, message, timestamp in store.fetch(key, self._base, total):
+                self._add_resident(speaker, message, timestamp)
+            self.summary, self.summarized = store.load_summary(key)
+            self.summarized = min(self.summarized, total)
+            self.resumed = total
+
+    def _reset_resident(self):
+        self._speaker_names = []
+        self._speaker_ids = {}
+        self._speakers = array("H")
+        self._text = bytearray()
+        self._offsets = array("Q", [0])
+        self._tokens = array("I")
+        self._times = array("d")
+        self._postings = {}
+        self._speaker_entries = []
+
+    def _intern(self, speaker):
+        speaker_id = self._speaker_ids.get(speaker)
+        if speaker_id is None:
+            if len(self._speaker_names) >= MAX_SPEAKERS:
+                raise ValueError("Too many distinct speakers in memory.")
+            speaker_id = len(self._speaker_names)
+            self._speaker_names.append(speaker)
+            self._speaker_ids[speaker] = speaker_id
+            self._speaker_entries.append(array("I"))
+        return speaker_id
+
+    def _add_resident(self, speaker, message, timestamp):
+        """Append an entry to the in-memory arrays and index; returns its index."""
+        index = len(self)
+        speaker_id = self._intern(speaker)
+        self._speakers.append(speaker_id)
+        self._speaker_entries[speaker_id].append(index)
+        self._text += message.encode("utf-8")
+        self._offsets.append(len(self._text))
+        self._times.append(timestamp)
 
-    def add(self, speaker, message):
+        # Length of the rendered "speaker: message" line
+        length = len(speaker) + 2 + len(message)
+        tokens = (length + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        self._tokens.append(tokens)
+        self.total_chars += length
+        self.total_tokens += tokens
+
+        postings = self._postings
+        for token in set(tokenize(message)):
+            entries = postings.get(token)
+            if entries is None:
+                entries = postings[token] = array("I")
+            entries.append(index)
+        return index
+
+    def _evict(self):
         """
-        Add a message to memory as a dictionary:
-        { "speaker": ..., "message": ... }
+        Drop resident entries older than the resume window.
+
+        Only store-backed memories evict; the dropped turns remain
+        available from the store.
+        """
+        if self._store is None or len(self._speakers) < 2 * self._resume_entries:
+            return
+        total = len(self)
+        keep_from = total - self._resume_entries
+        kept = [(self.speaker(i), self.message(i), self.timestamp(i)) for i in range(keep_from, total)]
+        total_chars, total_tokens = self.total_chars, self.total_tokens
+        self._reset_resident()
+        self._pages.clear()
+        self._base = keep_from
+        for speaker, message, timestamp in kept:
+            self._add_resident(speaker, message, timestamp)
+        self.total_chars, self.total_tokens = total_chars, total_tokens
+
+    def add(self, speaker, message, timestamp=None):
+        """
+        Add a message to memory.
+
+        Args:
+            speaker (str): Who sent the message.
+            message (str): The message text.
+            timestamp (float): Optional UNIX time; defaults to now.
+
+        Raises:
+            ValueError: If speaker or message is not a string.
+            StoreConflictError: If the store already holds this index;
+                the memory is left unchanged.
         """
         if not isinstance(speaker, str) or not isinstance(message, str):
             raise ValueError("Speaker and message must be strings.")
-        self.history.append({"speaker": speaker, "message": message})
+
+        start = time.perf_counter()
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._store is not None:
+            # Persist first, so a rejected write leaves memory and store in step
+            self._intern(speaker)
+            self._store.append(self._key, [(len(self), speaker, message, timestamp)])
+        self._add_resident(speaker, message, timestamp)
+        if self._store is not None:
+            self._evict()
+        metrics.observe("memory.add", (time.perf_counter() - start) * 1000)
+
+    def add_many(self, entries):
+        """
+        Add several messages at once.
+
+        When backed by a store, the batch is persisted in one transaction
+        and only added to memory once that succeeds.
+
+        Args:
+            entries (iterable): Dicts with "speaker" and "message" keys.
+
+        Returns:
+            int: Number of entries added.
+        """
+        if self._store is None:
+            add = self.add
+            count = 0
+            for entry in entries:
+                add(entry["speaker"], entry["message"])
+                count += 1
+            return count
+
+        rows = []
+        index = len(self)
+        for entry in entries:
+            speaker, message = entry["speaker"], entry["message"]
+            if not isinstance(speaker, str) or not isinstance(message, str):
+                raise ValueError("Speaker and message must be strings.")
+            self._intern(speaker)
+            rows.append((index, speaker, message, time.time()))
+            index += 1
+        if rows:
+            self._store.append(self._key, rows)
+            for _, speaker, message, timestamp in rows:
+                self._add_resident(speaker, message, timestamp)
+            self._evict()
+        return len(rows)
+
+    @property
+    def history(self):
+        """Sequence of `Entry` records, oldest first."""
+        return HistoryView(self)
+
+    def __len__(self):
+        return self._base + len(self._speakers)
+
+    def _stored(self, index):
+        """Return (speaker, message, timestamp) for a non-resident entry, paging it in."""
+        page_number = index // PAGE_SIZE
+        page = self._pages.get(page_number)
+        if page is None:
+            start = page_number * PAGE_SIZE
+            page = self._store.fetch(self._key, start, min(start + PAGE_SIZE, self._base))
+            self._pages[page_number] = page
+            if len(self._pages) > MAX_CACHED_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_number)
+        return page[index % PAGE_SIZE]
+
+    def speaker(self, index):
+        """Return the speaker of entry `index`."""
+        if index < self._base:
+            return self._stored(index)[0]
+        return self._speaker_names[self._speakers[index - self._base]]
+
+    def message(self, index):
+        """Return the message text of entry `index`."""
+        if index < self._base:
+            return self._stored(index)[1]
+        index -= self._base
+        return self._text[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def timestamp(self, index):
+        """Return the UNIX time at which entry `index` was added."""
+        if index < self._base:
+            return self._stored(index)[2]
+        return self._times[index - self._base]
+
+    def tokens(self, index):
+        """Return the estimated token count of entry `index`'s rendered line."""
+        if index < self._base:
+            speaker, message, _ = self._stored(index)
+            return (len(speaker) + 2 + len(message) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        return self._tokens[index - self._base]
+
+    def entry(self, index):
+        """Return entry `index` as an `Entry` record."""
+        return Entry(self.speaker(index), self.message(index))
+
+    def line(self, index):
+        """Return entry `index` rendered as a 'speaker: message' line."""
+        return f"{self.speaker(index)}: {self.message(index)}"
+
+    def lines(self, start=0, stop=None):
+        """Return rendered lines for entries in [start, stop)."""
+        stop = len(self) if stop is None else stop
+        return [self.line(i) for i in range(start, stop)]
 
     def get_context(self):
         """
         Return the full conversation as a single string.
         """
-        return "\n".join(
-            f"{entry['speaker']}: {entry['message']}"
-            for entry in self.history
-            if isinstance(entry, dict) and "speaker" in entry and "message" in entry
-        )
+        if self._context_size != len(self):
+            new_lines = self.lines(self._context_size)
+            if self._context:
+                new_lines.insert(0, self._context)
+            self._context = "\n".join(new_lines)
+            self._context_size = len(self)
+        return self._context
+
+    def get_window(self, max_tokens):
+        """
+        Return the most recent turns that fit within a token budget.
+
+        Walks backwards from the newest entry and stops at the first one
+        that would exceed the budget, so the cost depends only on the
+        size of the window.
+
+        Args:
+            max_tokens (int): Maximum number of (estimated) tokens.
+
+        Returns:
+            str: The selected lines joined by newlines, oldest first.
+        """
+        return "\n".join(self.lines(self.window_start(max_tokens)))
+
+    def window_start(self, max_tokens):
+        """Return the index of the oldest entry in the `get_window(max_tokens)` window."""
+        budget = max_tokens
+        base = self._base
+        tokens = self._tokens
+        start = len(self)
+        while start > 0:
+            cost = tokens[start - 1 - base] if start > base else self.tokens(start - 1)
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 1
+        return start
+
+    def _speaker_matches(self, name, partial=False):
+        """Return IDs of resident speakers equal to (or containing) `name`, ignoring case."""
+        name = name.lower()
+        return [
+            speaker_id
+            for speaker_id, speaker in enumerate(self._speaker_names)
+            if (name in speaker.lower() if partial else name == speaker.lower())
+        ]
+
+    def _term_entries(self, term, partial=False):
+        """Return the set of resident entry IDs containing `term` (or a token containing it)."""
+        if not partial:
+            return set(self._postings.get(term, ()))
+        matched = set()
+        for token, entries in self._postings.items():
+            if term in token:
+                matched.update(entries)
+        return matched
+
+    def _match_stored(self, terms, term_entries, partial=False):
+        """
+        Add non-resident entries matching `terms` to `term_entries`.
+
+        Returns:
+            dict: Matched entry index -> speaker.
+        """
+        speakers = {}
+        for index, speaker, message in self._store.match(self._key, terms, self._base):
+            tokens = set(tokenize(message))
+            for term, entries in zip(terms, term_entries):
+                if any(term in token for token in tokens) if partial else term in tokens:
+                    entries.add(index)
+                    speakers[index] = speaker
+        return speakers
+
+    def search(self, query, mode="and", speaker=None, partial=False, limit=None):
+        """
+        Search the conversation using the inverted index.
+
+        Resident entries are looked up in the index; when backed by a
+        store, older entries are matched on disk.
+
+        Args:
+            query (str): Search terms, separated by whitespace.
+            mode (str): "and" to require every term, "or" to require any.
+            speaker (str): Optional speaker name to restrict results to.
+            partial (bool): Match terms against any token containing them.
+            limit (int): Optional maximum number of results.
+
+        Returns:
+            list: (entry index, score) pairs, best match first. Scores sum
+            the inverse document frequency of matched terms; ties go to
+            the most recent entry.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        if mode not in ("and", "or"):
+            raise ValueError("Search mode must be 'and' or 'or'.")
+
+        term_entries = [self._term_entries(term, partial) for term in terms]
+        stored_speakers = {}
+        if self._store is not None and self._base:
+            stored_speakers = self._match_stored(terms, term_entries, partial)
+        if mode == "and":
+            candidates = set.intersection(*sorted(term_entries, key=len))
+        else:
+            candidates = set().union(*term_entries)
+
+        if speaker is not None:
+            allowed = set()
+            for speaker_id in self._speaker_matches(speaker):
+                allowed.update(self._speaker_entries[speaker_id])
+            name = speaker.lower()
+            allowed.update(index for index, found in stored_speakers.items() if found.lower() == name)
+            candidates &= allowed
+
+        total = len(self)
+        weights = [math.log(1 + total / len(entries)) if entries else 0.0 for entries in term_entries]
+        results = []
+        for index in candidates:
+            score = sum(w for w, entries in zip(weights, term_entries) if index in entries)
+            results.append((index, score))
+        results.sort(key=lambda item: (item[1], item[0]), reverse=True)
+        return results[:limit] if limit is not None else results
+
+    def filter(self, keyword):
+        """
+        Return entries whose speaker followed by message contains `keyword`, ignoring case.
+
+        The inverted index (every term in the keyword must appear as part
+        of a token) and the per-speaker entry lists only narrow down the
+        candidates; each candidate is then confirmed with a plain
+        substring test, so "the sky" matches those words together and
+        in order. A keyword with no word characters (e.g. "?") takes its
+        candidates from a scan of the messages instead.
+
+        Returns:
+            list: Matching `Entry` records in chronological order.
+        """
+        needle = keyword.lower()
+        if tokenize(keyword):
+            candidates = {index for index, _ in self.search(keyword, partial=True)}
+        else:
+            candidates = self._substring_matches(needle.strip())
+        for speaker_id in self._speaker_matches(keyword.strip(), partial=True):
+            candidates.update(self._speaker_entries[speaker_id])
+        if self._store is not None and self._base:
+            candidates.update(self._store.speaker_entries(self._key, keyword.strip(), self._base, partial=True))
+        entries = (self.entry(index) for index in sorted(candidates))
+        return [entry for entry in entries if needle in (entry.speaker + entry.message).lower()]
+
+    def _substring_matches(self, needle):
+        """Return indices of entries whose message contains `needle` (lowercase), by scanning."""
+        if not needle:
+            return set()
+        indices = {index for index in range(self._base, len(self)) if needle in self.message(index).lower()}
+        if self._store is not None and self._base:
+            indices.update(index for index, _, _ in self._store.match(self._key, [needle], self._base))
+        return indices
+
+    @property
+    def unsummarized(self):
+        """Number of entries not yet folded into the rolling summary."""
+        return len(self) - self.summarized
+
+    def update_summary(self, summarize, threshold=SUMMARY_THRESHOLD,
+                       chunk_tokens=SUMMARY_CHUNK_TOKENS, force=False):
+        """
+        Fold the un-summarized tail of the conversation into the summary.
+
+        The tail is split into chunks of at most `chunk_tokens` tokens and
+        each chunk is passed to `summarize(previous_summary, chunk_text)`,
+        whose return value becomes the new running summary.
+
+        Args:
+            summarize (callable): Produces an updated summary.
+            threshold (int): Minimum tail length before summarizing.
+            chunk_tokens (int): Token budget per summarize call.
+            force (bool): Summarize any non-empty tail regardless of size.
+
+        Returns:
+            bool: True if the summary changed.
+        """
+        tail = self.unsummarized
+        if tail == 0 or (tail < threshold and not force):
+            return False
+
+        for stop, text in self.summary_chunks(chunk_tokens):
+            self.set_summary(summarize(self.summary, text), stop)
+        return True
+
+    def summary_chunks(self, chunk_tokens=SUMMARY_CHUNK_TOKENS):
+        """
+        Split the un-summarized tail into chunks of at most `chunk_tokens`.
+
+        The text is copied out, so the chunks can be summarized on another
+        thread while the conversation continues.
+
+        Returns:
+            list: (stop, text) pairs; `stop` is the entry count covered once
+            the chunk is folded in.
+        """
+        chunks = []
+        total = len(self)
+        start = self.summarized
+        while start < total:
+            stop = start
+            budget = chunk_tokens
+            while stop < total and (stop == start or self.tokens(stop) <= budget):
+                budget -= self.tokens(stop)
+                stop += 1
+            chunks.append((stop, "\n".join(self.lines(start, stop))))
+            start = stop
+        return chunks
+
+    def set_summary(self, summary, summarized):
+        """Replace the rolling summary, which now covers the first `summarized` entries."""
+        self.summary = summary
+        self.summarized = summarized
+        if self._store is not None:
+            self._store.save_summary(self._key, self.summary, self.summarized)
 
     def get_context_summary(self):
         """
         Return a short snippet of recent conversation (last 5 lines).
         """
-        return "\n".join(
-            f"{entry['speaker']}: {entry['message']}"
-            for entry in self.history[-5:]
-            if isinstance(entry, dict) and "speaker" in entry and "message" in entry
-        )
+        return "\n".join(self.lines(max(len(self) - 5, 0)))
 
     def clear(self):
-        """Clear the entire memory history."""
-        self.history = []
+        """Clear the entire memory history, including any stored copy."""
+        if self._store is not None:
+            self._store.reset(self._key)
+        self.__init__(self._store, self._key, self._resume_entries)
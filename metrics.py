@@ -0,0 +1,234 @@
+# metrics.py
+
+"""
+Lightweight in-process instrumentation.
+
+Provides counters, gauges and latency histograms keyed by name, a `timer`
+context manager built on the monotonic clock, and exporters for JSON and
+the Prometheus text format. A background thread can dump a snapshot to a
+file periodically.
+
+Stages instrumented across the app:
+- template.load, prompt.build (prompt_builder)
+- model.call, model.first_chunk, cache.hit / cache.miss (response_handler)
+- memory.add (memory)
+- retrieval.search (retrieval)
+- journal.sync (session_saver)
+- io.write, io.coalesced, io.backpressure, io.error (background_writer)
+- scheduler.wait.<priority>, scheduler.queued, scheduler.in_flight,
+  scheduler.dedup, scheduler.rate_limited (scheduler)
+- turn.total, command.total (main; the latter per --script command)
+
+Set `ENABLED = False` to turn every hook into a no-op.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = True
+
+# Histogram bucket upper bounds, in milliseconds.
+BUCKETS_MS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, float("inf"))
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value_ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value_ms
+        if value_ms < self.min:
+            self.min = value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def quantile(self, fraction):
+        """Approximate a quantile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(BUCKETS_MS, self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_ms": self.total,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "min_ms": self.min if self.count else 0.0,
+            "max_ms": self.max,
+            "p50_ms": self.quantile(0.50),
+            "p99_ms": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def incr(self, name, amount=1):
+        """Increase counter `name` by `amount`."""
+        if not ENABLED:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        """Set gauge `name` to its current `value` (e.g. a queue depth)."""
+        if not ENABLED:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value_ms):
+        """Record a latency sample (milliseconds) in histogram `name`."""
+        if not ENABLED:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value_ms)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the enclosed block into histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def reset(self):
+        """Drop every counter, gauge and histogram."""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """
+        Return the current values.
+
+        Returns:
+            dict: {"uptime_s", "counters", "gauges", "histograms"}
+        """
+        with self._lock:
+            return {
+                "uptime_s": time.time() - self.started,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.snapshot() for name, h in self.histograms.items()},
+            }
+
+    def to_prometheus(self, prefix="persona_architect"):
+        """Render the metrics in the Prometheus text exposition format."""
+        def metric_name(name):
+            return f"{prefix}_{name.replace('.', '_').replace('-', '_')}"
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                full = metric_name(name) + "_total"
+                lines.append(f"# TYPE {full} counter")
+                lines.append(f"{full} {value}")
+            for name, value in sorted(self.gauges.items()):
+                full = metric_name(name)
+                lines.append(f"# TYPE {full} gauge")
+                lines.append(f"{full} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                full = metric_name(name) + "_ms"
+                lines.append(f"# TYPE {full} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS_MS, histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{full}_bucket{{le="{le}"}} {cumulative}')
+                lines.append(f"{full}_sum {histogram.total}")
+                lines.append(f"{full}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, fmt="json"):
+        """
+        Write a snapshot to `path` atomically.
+
+        Args:
+            path (str): Destination file.
+            fmt (str): "json" or "prometheus".
+        """
+        if fmt == "prometheus":
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=2)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+metrics = Metrics()
+
+incr = metrics.incr
+gauge = metrics.gauge
+observe = metrics.observe
+timer = metrics.timer
+
+
+class PeriodicDumper:
+    """Background thread that dumps `metrics` to a file every `interval` seconds."""
+
+    def __init__(self, path, interval=60.0, fmt="json", registry=None):
+        self.path = path
+        self.interval = interval
+        self.fmt = fmt
+        self.registry = registry or metrics
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-dumper", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._dump()
+
+    def _dump(self):
+        try:
+            self.registry.dump(self.path, self.fmt)
+        except OSError as e:
+            print(f"[!] Failed to dump metrics to '{self.path}': {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and write a final snapshot."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._dump()
@@ -1,22 +1,284 @@
 # prompt_builder.py
 
-def build_prompt(persona, user_input):
+"""
+Builds prompts from persona templates.
+
+Templates are compiled once into a list of literal chunks and placeholder
+slots (e.g. {{input}}, {{history}}, {{tone}}, {{description}}) and cached
+by path and modification time, so each turn renders with a single join
+instead of re-reading the file from disk.
+
+Each template is also split into a static prefix (everything before the
+line holding the first per-turn placeholder, see `DYNAMIC_PLACEHOLDERS`)
+and a dynamic body. `build_prompt` returns a `Prompt`: the full text as
+a str, plus the prefix and body, so chat backends can send the prefix as
+a byte-identical system message on every turn and let providers reuse
+it.
+"""
+
+import os
+import re
+import time
+
+import metrics
+
+TEMPLATE_DIR = "templates"
+DEFAULT_TEMPLATE = "default.txt"
+
+# Matches {{name}} as well as {{ name }}
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Placeholders whose values change from turn to turn
+DYNAMIC_PLACEHOLDERS = frozenset({"input", "user_input", "history", "summary", "relevant"})
+
+MAX_CACHED_PREFIXES = 128  # Rendered prefixes kept per template
+
+
+def _compile(text):
+    segments = []
+    slots = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        if match.start() > position:
+            segments.append(text[position:match.start()])
+        slots.append((len(segments), match.group(1).lower()))
+        segments.append(match.group(0))
+        position = match.end()
+    if position < len(text):
+        segments.append(text[position:])
+    return segments, slots
+
+
+class Prompt(str):
+    """
+    A rendered prompt.
+
+    Behaves as the full prompt text, and also carries the static `prefix`
+    (identical on every turn for a given persona) and the per-turn `body`.
+    """
+
+    def __new__(cls, prefix, body):
+        prompt = super().__new__(cls, prefix + body)
+        prompt.prefix = prefix
+        prompt.body = body
+        return prompt
+
+    def messages(self, default_system=""):
+        """
+        Return the prompt as chat messages: the prefix as the system
+        message and the body as the user message.
+
+        Args:
+            default_system (str): System message to use when the template
+                has no static prefix.
+        """
+        system = self.prefix.strip() or default_system
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": self.body.strip()})
+        return messages
+
+
+class CompiledTemplate:
+    """
+    A template split into literal segments and placeholder slots.
+
+    `segments` holds the literal text and the original placeholder text in
+    order; `slots` maps segment positions to placeholder names. Rendering
+    copies the segment list, fills the slots and joins once.
+    """
+
+    __slots__ = ("segments", "slots", "split", "_prefixes")
+
+    def __init__(self, text):
+        split_at = len(text)
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.group(1).lower() in DYNAMIC_PLACEHOLDERS:
+                split_at = text.rfind("\n", 0, match.start()) + 1
+                break
+        self.segments, self.slots = _compile(text[:split_at])
+        # Segments before `split` form the static prefix
+        self.split = len(self.segments)
+        body_segments, body_slots = _compile(text[split_at:])
+        self.segments += body_segments
+        self.slots += [(index + self.split, name) for index, name in body_slots]
+        self._prefixes = {}
+
+    @property
+    def placeholders(self):
+        """Return the set of placeholder names used by this template."""
+        return {name for _, name in self.slots}
+
+    def render(self, values):
+        """
+        Render the template with the given placeholder values.
+
+        Args:
+            values (dict): Placeholder name -> value. Placeholders without
+                a value are left untouched.
+
+        Returns:
+            str: The rendered text.
+        """
+        parts = list(self.segments)
+        for index, name in self.slots:
+            value = values.get(name)
+            if value is not None:
+                parts[index] = value if isinstance(value, str) else str(value)
+        return "".join(parts)
+
+    def render_prompt(self, values):
+        """
+        Render the template as a `Prompt`.
+
+        The prefix is rendered once per distinct set of prefix values and
+        then reused, so every turn gets the same prefix string.
+        """
+        parts = list(self.segments)
+        for index, name in self.slots:
+            value = values.get(name)
+            if value is not None:
+                parts[index] = value if isinstance(value, str) else str(value)
+        key = tuple(parts[index] for index, _ in self.slots if index < self.split)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            if len(self._prefixes) >= MAX_CACHED_PREFIXES:
+                self._prefixes.clear()
+            prefix = self._prefixes[key] = "".join(parts[:self.split])
+        return Prompt(prefix, "".join(parts[self.split:]))
+
+
+class TemplateRegistry:
     """
-    Loads the template file defined in the persona and replaces {{input}} with user input.
-    Falls back to default.txt if the specified template is missing.
+    Loads and caches compiled templates keyed by path.
+
+    Each lookup only stats the file; it is re-read and re-compiled when
+    its modification time or size changes.
     """
-    template_file = persona.get("template", "default.txt")
 
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._cache = {}
+
+    def path_for(self, template_file):
+        return os.path.join(self.template_dir, template_file)
+
+    def get(self, template_file):
+        """
+        Return the compiled template for a file in the template directory.
+
+        Raises:
+            FileNotFoundError: If the template file does not exist.
+        """
+        path = self.path_for(template_file)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with metrics.timer("template.load"):
+            with open(path, "r", encoding="utf-8") as f:
+                compiled = CompiledTemplate(f.read())
+        self._cache[path] = (stamp, compiled)
+        return compiled
+
+    def preload(self):
+        """
+        Compile every template in the template directory.
+
+        Returns:
+            int: Number of templates compiled.
+        """
+        count = 0
+        try:
+            names = os.listdir(self.template_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if name.endswith(".txt"):
+                try:
+                    self.get(name)
+                    count += 1
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"[!] Failed to preload template '{name}': {e}")
+        return count
+
+    def clear(self):
+        """Drop all cached templates."""
+        self._cache.clear()
+
+
+template_registry = TemplateRegistry()
+
+
+def get_template(template_file, registry=None):
+    """
+    Return the compiled template for `template_file`, falling back to
+    default.txt and finally to an empty template.
+    """
+    registry = registry or template_registry
     try:
-        with open(f"templates/{template_file}", "r", encoding="utf-8") as f:
-            template = f.read()
+        return registry.get(template_file)
     except FileNotFoundError:
         print(f"[!] Template '{template_file}' not found. Falling back to default.")
+    try:
+        return registry.get(DEFAULT_TEMPLATE)
+    except FileNotFoundError:
+        print("[!] Fallback template 'default.txt' not found. Using empty template.")
+        return CompiledTemplate("")
+
+
+def template_placeholders(persona, registry=None):
+    """
+    Return the placeholder names used by the template a persona renders
+    with, resolving the default.txt fallback like `get_template` but
+    without printing warnings.
+
+    Lets callers skip gathering context that the template never shows.
+    """
+    registry = registry or template_registry
+    for template_file in (persona.get("template", DEFAULT_TEMPLATE), DEFAULT_TEMPLATE):
         try:
-            with open("templates/default.txt", "r", encoding="utf-8") as f:
-                template = f.read()
+            return registry.get(template_file).placeholders
         except FileNotFoundError:
-            print("[!] Fallback template 'default.txt' not found. Using empty template.")
-            template = ""
+            continue
+    return set()
+
+
+def build_prompt(persona, user_input, history="", summary="", relevant="", registry=None):
+    """
+    Render the persona's template for the given user input.
+
+    Persona traits (name, description, tone, ...) fill their matching
+    placeholders, {{input}} / {{user_input}} receive the user input,
+    {{history}} the recent conversation, {{summary}} the rolling
+    summary of older turns and {{relevant}} older turns retrieved for
+    this input. Falls back to default.txt if the specified template is
+    missing.
+
+    Args:
+        persona (dict): The active persona configuration.
+        user_input (str): The user's message.
+        history (str): Optional conversation context.
+        summary (str): Optional long-term conversation summary.
+        relevant (str): Optional older turns relevant to the input.
+        registry (TemplateRegistry): Optional registry to use instead of
+            the shared one.
+
+    Returns:
+        Prompt: The rendered prompt (a str carrying its static prefix
+        and per-turn body).
+    """
+    start = time.perf_counter()
+    template = get_template(persona.get("template", DEFAULT_TEMPLATE), registry)
 
-    return template.replace("{{input}}", user_input)
+    values = {key.lower(): value for key, value in persona.items()}
+    values["input"] = user_input
+    values["user_input"] = user_input
+    values["history"] = history
+    values["summary"] = summary
+    values["relevant"] = relevant
+    prompt = template.render_prompt(values)
+    metrics.observe("prompt.build", (time.perf_counter() - start) * 1000)
+    return prompt
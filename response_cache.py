@@ -0,0 +1,157 @@
+# response_cache.py
+
+"""
+Caches model responses so repeated prompts skip the model call.
+
+Entries are keyed on a hash of (persona, rendered prompt, model,
+temperature, max_tokens). The first tier is an in-memory LRU with a TTL;
+an optional SQLite file adds a second, persistent tier shared across
+runs. Hit/miss counters are kept for both tiers.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 3600.0  # seconds
+
+
+def make_key(persona, prompt, model, temperature, max_tokens):
+    """
+    Build a cache key for a model request.
+
+    Returns:
+        str: Hex SHA-256 digest of the request parameters.
+    """
+    payload = json.dumps(
+        [persona, prompt, model, temperature, max_tokens],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: in-memory LRU + TTL, optional SQLite on disk.
+
+    Args:
+        max_entries (int): Maximum entries kept in memory.
+        ttl (float): Seconds an entry stays valid; None disables expiry.
+        db_path (str): Optional SQLite file for the persistent tier.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if db_path:
+            import sqlite3
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+            )
+            self._db.commit()
+
+    def _expiry(self):
+        return time.time() + self.ttl if self.ttl is not None else None
+
+    def _store_memory(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Returns:
+            str | None: The cached response, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires = row
+                    if expires is None or expires > now:
+                        self._store_memory(key, value, expires)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a response under `key` in every tier."""
+        expires = self._expiry()
+        with self._lock:
+            self._store_memory(key, value, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                    (key, value, expires),
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Remove every cached response and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+            self.hits = self.misses = self.disk_hits = self.evictions = 0
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: hits, misses, disk_hits, evictions, size and hit_rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """Close the SQLite tier, if any."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
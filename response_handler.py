@@ -4,59 +4,636 @@
 Handles response generation for Persona Architect.
 
 Supports:
-- Stubbed offline responses for testing
-- OpenAI API responses for production use
+- Stubbed offline responses for testing, driven by per-persona keyword rules
+- OpenAI-compatible Chat Completions API responses for production use
+
+Responses come from a pluggable `ResponseBackend`. The backend is created
+once on first use and reused for every call; the HTTP backend keeps a pool
+of persistent connections, applies timeouts and retries transient errors
+with jittered exponential backoff. Every backend also offers an async
+variant. Batches go through `complete` at BATCH priority (see
+batch_runner.py), so they share the scheduler's limits.
+
+`stream_response` yields the reply in chunks as the backend produces them.
+Both it and `get_response` check a `ResponseCache` first, keyed on the persona,
+prompt and the backend's model parameters.
+
+Calls to remote backends go through a shared `Scheduler` (see
+scheduler.py): interactive turns are admitted ahead of summaries and
+batch jobs, within request/token rate limits and a concurrency cap, and
+identical in-flight requests are sent once. A provider 429 that survives
+the retries pauses the scheduler and is reported as `RATE_LIMIT_RESPONSE`.
+
+Networking and async modules (http.client, asyncio)
+are imported on first use so that importing this module stays cheap for
+short-lived CLI runs.
 
 Toggle `USE_OPENAI` to enable/disable API usage.
 """
 
+import json
+import random
+import re
+import threading
+import time
+from contextlib import nullcontext
+
+import metrics
+from memory import estimate_tokens
+from prompt_builder import Prompt
+from response_cache import ResponseCache, make_key
+from scheduler import (BATCH, DEFAULT_MAX_IN_FLIGHT, DEFAULT_REQUESTS_PER_SECOND,
+                       DEFAULT_TOKENS_PER_MINUTE, INTERACTIVE, SUMMARY, Scheduler)
+from stub_rules import DEFAULT_RULES_PATH, StubRules
+
 USE_OPENAI = False  # 🔁 Safe to keep off for development/testing
+STUB_RULES_PATH = DEFAULT_RULES_PATH  # Keyword rules for offline mode
+USE_CACHE = True
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 3600.0  # seconds
+CACHE_DB_PATH = None  # e.g. "response_cache.sqlite3" to persist across runs
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+MODEL = "gpt-3.5-turbo"
+TEMPERATURE = 0.7
+MAX_TOKENS = 250
+SYSTEM_PROMPT = "You are a helpful AI assistant."
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CONCURRENCY = 8
+
+USE_SCHEDULER = True  # Queue and rate-limit calls to remote backends
+REQUESTS_PER_SECOND = DEFAULT_REQUESTS_PER_SECOND
+TOKENS_PER_MINUTE = DEFAULT_TOKENS_PER_MINUTE
+MAX_IN_FLIGHT = DEFAULT_MAX_IN_FLIGHT
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+ERROR_RESPONSE = "⚠️ An error occurred while generating the response."
+RATE_LIMIT_RESPONSE = "⏳ The model provider is rate limiting requests (HTTP 429). Please try again shortly."
+
+
+class BackendError(Exception):
+    """Raised when a backend cannot produce a response."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimitError(BackendError):
+    """Raised when the provider keeps answering 429 after all retries."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message, 429)
+        self.retry_after = retry_after
+
+
+class ResponseBackend:
+    """
+    Base class for response backends.
+
+    Subclasses implement `complete`; the async API is built on top of it.
+    """
+
+    name = "base"
+    remote = False  # Whether calls go through the rate-limiting scheduler
+
+    def cache_params(self):
+        """Return the (model, temperature, max_tokens) that affect responses."""
+        return self.name, None, None
+
+    def complete(self, prompt, persona=None):
+        """
+        Generate a response for a single prompt.
+
+        Args:
+            prompt (str): The full prompt.
+            persona (str): Optional key of the persona the prompt is for.
+
+        Raises:
+            BackendError: If no response could be generated.
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt, persona=None):
+        """
+        Yield the response in chunks as they are generated.
+
+        The default implementation yields the full completion at once.
+        """
+        yield self.complete(prompt, persona)
+
+    async def acomplete(self, prompt, persona=None):
+        """Async variant of `complete`, run in a worker thread."""
+        import asyncio
+        return await asyncio.to_thread(self.complete, prompt, persona)
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class StubBackend(ResponseBackend):
+    """
+    Offline backend returning canned responses based on prompt keywords.
+
+    Rules come from `STUB_RULES_PATH` (see stub_rules.py) and can differ
+    per persona. The rules' digest is part of the cache parameters, so
+    editing the rules invalidates cached stub responses.
+    """
+
+    name = "stub"
+
+    def __init__(self, rules=None):
+        self.rules = rules or StubRules.load(STUB_RULES_PATH)
+
+    def cache_params(self):
+        return f"{self.name}:{self.rules.digest}", None, None
+
+    def complete(self, prompt, persona=None):
+        return self.rules.respond(prompt, persona)
+
+    def stream(self, prompt, persona=None):
+        """Yield the canned response word by word."""
+        yield from re.findall(r"\S+\s*", self.complete(prompt, persona))
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of persistent HTTP(S) connections to a single host.
+
+    Idle connections are reused across calls; at most `size` are kept.
+    """
+
+    def __init__(self, base_url, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        from urllib.parse import urlsplit
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme in '{base_url}'.")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        import http.client
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def open(self, method, path, body=None, headers=None):
+        """
+        Send a request and return (connection, response) with the body unread.
+
+        A reused connection that turns out to be stale is replaced once
+        transparently; other connection errors propagate. Pass the pair to
+        `finish` once the body has been consumed.
+        """
+        import http.client
+        conn, reused = self._acquire()
+        try:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                conn.close()
+                conn = self._new_connection()
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        return conn, response
+
+    def finish(self, conn, response):
+        """Return a connection to the pool, or close it if it cannot be reused."""
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, headers, body bytes)."""
+        conn, response = self.open(method, path, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self.finish(conn, response)
+        return response.status, response.headers, data
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class OpenAIBackend(ResponseBackend):
+    """
+    Backend for OpenAI-compatible Chat Completions endpoints.
+
+    Uses a long-lived connection pool, per-request timeouts and retries
+    with jittered exponential backoff on timeouts, connection errors,
+    429 and 5xx responses. `base_url` can point at any compatible server,
+    including a local stub server for testing.
+    """
+
+    name = "openai"
+    remote = True
+
+    def __init__(self, api_key=None, base_url=OPENAI_BASE_URL, model=MODEL,
+                 temperature=TEMPERATURE, max_tokens=MAX_TOKENS, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_base=0.5, backoff_max=8.0,
+                 pool_size=DEFAULT_POOL_SIZE):
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool = ConnectionPool(base_url, size=pool_size, timeout=timeout)
 
-def get_response(prompt):
+    def cache_params(self):
+        return self.model, self.temperature, self.max_tokens
+
+    def _headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _payload(self, prompt):
+        if isinstance(prompt, Prompt):
+            # Static persona prefix first, so it is byte-identical across turns
+            messages = prompt.messages(SYSTEM_PROMPT)
+        else:
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ]
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+
+    def _open(self, path, payload):
+        """
+        POST JSON with retries until a 200 response is received.
+
+        Returns:
+            tuple: (connection, response) with the body unread.
+        """
+        import http.client
+        body = json.dumps(payload).encode("utf-8")
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                conn, response = self.pool.open("POST", path, body, self._headers())
+                if response.status == 200:
+                    return conn, response
+                data = response.read()
+                self.pool.finish(conn, response)
+                message = f"HTTP {response.status}: {data[:200].decode('utf-8', 'replace')}"
+                if response.status not in RETRYABLE_STATUS:
+                    raise BackendError(message, response.status)
+                retry_after = response.headers.get("Retry-After")
+                if response.status == 429:
+                    try:
+                        error = RateLimitError(message, float(retry_after))
+                    except (TypeError, ValueError):
+                        error = RateLimitError(message)
+                else:
+                    error = BackendError(message, response.status)
+            except (OSError, http.client.HTTPException) as e:
+                error = BackendError(f"Connection error: {e}")
+
+            if attempt >= self.max_retries:
+                raise error
+            time.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    def _post(self, path, payload):
+        """POST JSON with retries and return the decoded response body."""
+        conn, response = self._open(path, payload)
+        try:
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self.pool.finish(conn, response)
+        return json.loads(data)
+
+    def complete(self, prompt, persona=None):
+        response = self._post("/chat/completions", self._payload(prompt))
+        try:
+            return response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise BackendError(f"Malformed response: {e}") from e
+
+    def stream(self, prompt, persona=None):
+        """Yield content deltas from a server-sent events completion stream."""
+        payload = self._payload(prompt)
+        payload["stream"] = True
+        conn, response = self._open("/chat/completions", payload)
+        try:
+            for raw in response:
+                line = raw.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    delta = json.loads(data)["choices"][0].get("delta", {})
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    raise BackendError(f"Malformed stream event: {e}") from e
+                if delta.get("content"):
+                    yield delta["content"]
+            # Drain anything left so the connection can be reused.
+            response.read()
+        except BaseException:
+            conn.close()
+            raise
+        self.pool.finish(conn, response)
+
+    def close(self):
+        self.pool.close()
+
+
+_backend = None
+_openai_backend = None
+_stub_backend = None
+_cache = None
+_scheduler = None
+_backend_lock = threading.Lock()
+
+
+def create_default_backend():
+    """Create the backend selected by `USE_OPENAI`."""
+    if not USE_OPENAI:
+        return StubBackend()
+    from config import OPENAI_API_KEY  # 🔐 Secure API key management
+    return OpenAIBackend(api_key=OPENAI_API_KEY)
+
+
+def get_backend():
+    """Return the shared backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_default_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Replace the shared backend (e.g. with a backend pointed at a stub server).
+
+    The previous backend is closed.
+    """
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    if previous is not None and previous is not backend:
+        previous.close()
+
+
+def get_cache():
+    """Return the shared response cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _backend_lock:
+            if _cache is None:
+                _cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_DB_PATH)
+    return _cache
+
+
+def get_scheduler():
+    """Return the shared scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _backend_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler(REQUESTS_PER_SECOND, TOKENS_PER_MINUTE, MAX_IN_FLIGHT)
+    return _scheduler
+
+
+def _scheduler_for(backend):
+    return get_scheduler() if USE_SCHEDULER and backend.remote else None
+
+
+def _cost(backend, prompt):
+    """Estimated tokens of a call: the prompt plus the completion limit."""
+    return estimate_tokens(prompt) + (getattr(backend, "max_tokens", 0) or 0)
+
+
+def complete(prompt, persona=None, priority=INTERACTIVE, backend=None, key=None):
     """
-    Returns a response using either the OpenAI API or a stubbed fallback.
+    Call `backend.complete`, through the scheduler for remote backends.
+
+    Args:
+        prompt (str): The full prompt.
+        persona (str): Optional persona key.
+        priority (str): INTERACTIVE, SUMMARY or BATCH.
+        backend (ResponseBackend): Backend to use; the shared one if None.
+        key (str): Deduplication key; derived from the request if None.
+
+    Raises:
+        BackendError: If no response could be generated.
+    """
+    backend = backend or get_backend()
+
+    def call():
+        with metrics.timer("model.call"):
+            return backend.complete(prompt, persona)
+
+    scheduler = _scheduler_for(backend)
+    if scheduler is None:
+        return call()
+    if key is None:
+        key = make_key(persona, prompt, *backend.cache_params())
+    try:
+        return scheduler.run(call, key, priority, _cost(backend, prompt))
+    except RateLimitError as e:
+        scheduler.backoff(e.retry_after)
+        raise
+
+
+def _get_openai_backend():
+    """Return the shared backend if it is an OpenAIBackend, else a dedicated one."""
+    global _openai_backend
+    backend = get_backend()
+    if isinstance(backend, OpenAIBackend):
+        return backend
+    with _backend_lock:
+        if _openai_backend is None:
+            from config import OPENAI_API_KEY
+            _openai_backend = OpenAIBackend(api_key=OPENAI_API_KEY)
+    return _openai_backend
+
+
+def get_response(prompt, persona=None, use_cache=True, priority=INTERACTIVE):
+    """
+    Returns a response from the configured backend.
+
+    Successful responses are cached (see `USE_CACHE`); errors are not.
 
     Args:
         prompt (str): The full prompt to send to the model.
+        persona (str): Optional persona key, part of the cache key.
+        use_cache (bool): Set to False to bypass the cache for this call.
+        priority (str): Scheduler priority: INTERACTIVE, SUMMARY or BATCH.
 
     Returns:
-        str: The generated response.
+        str: The generated response, `RATE_LIMIT_RESPONSE` if the provider
+        rate-limited the call or `ERROR_RESPONSE` on any other failure.
     """
     try:
-        return get_openai_response(prompt) if USE_OPENAI else get_stubbed_response(prompt)
+        backend = get_backend()
+        if not (USE_CACHE and use_cache):
+            return complete(prompt, persona, priority, backend)
+
+        cache = get_cache()
+        key = make_key(persona, prompt, *backend.cache_params())
+        response = cache.get(key)
+        if response is None:
+            metrics.incr("cache.miss")
+            response = complete(prompt, persona, priority, backend, key)
+            cache.put(key, response)
+        else:
+            metrics.incr("cache.hit")
+        return response
+    except RateLimitError as e:
+        metrics.incr("model.error")
+        print(f"[!] Rate limited in get_response(): {e}")
+        return RATE_LIMIT_RESPONSE
     except Exception as e:
+        metrics.incr("model.error")
         print(f"[!] Error in get_response(): {e}")
-        return "⚠️ An error occurred while generating the response."
+        return ERROR_RESPONSE
+
 
-def get_stubbed_response(prompt):
+def stream_response(prompt, persona=None, use_cache=True, priority=INTERACTIVE):
+    """
+    Yield a response in chunks as the backend generates it.
+
+    A cache hit is yielded as a single chunk; a fully streamed response is
+    stored in the cache once it completes. Errors are reported the same
+    way as in `get_response`. Streams hold a scheduler slot until they
+    finish but are never deduplicated.
+
+    Args:
+        prompt (str): The full prompt to send to the model.
+        persona (str): Optional persona key, part of the cache key.
+        use_cache (bool): Set to False to bypass the cache for this call.
+        priority (str): Scheduler priority: INTERACTIVE, SUMMARY or BATCH.
+
+    Yields:
+        str: Response chunks.
+    """
+    chunks = []
+    try:
+        backend = get_backend()
+        caching = USE_CACHE and use_cache
+        if caching:
+            cache = get_cache()
+            key = make_key(persona, prompt, *backend.cache_params())
+            response = cache.get(key)
+            if response is not None:
+                metrics.incr("cache.hit")
+                yield response
+                return
+            metrics.incr("cache.miss")
+
+        scheduler = _scheduler_for(backend)
+        slot = scheduler.slot(priority, _cost(backend, prompt)) if scheduler else nullcontext()
+        with slot:
+            start = time.perf_counter()
+            try:
+                for chunk in backend.stream(prompt, persona):
+                    if not chunks:
+                        metrics.observe("model.first_chunk", (time.perf_counter() - start) * 1000)
+                    chunks.append(chunk)
+                    yield chunk
+            except RateLimitError as e:
+                if scheduler:
+                    scheduler.backoff(e.retry_after)
+                raise
+            metrics.observe("model.call", (time.perf_counter() - start) * 1000)
+
+        if caching:
+            cache.put(key, "".join(chunks))
+    except RateLimitError as e:
+        metrics.incr("model.error")
+        print(f"[!] Rate limited in stream_response(): {e}")
+        yield ("\n" if chunks else "") + RATE_LIMIT_RESPONSE
+    except Exception as e:
+        metrics.incr("model.error")
+        print(f"[!] Error in stream_response(): {e}")
+        prefix = "\n" if chunks else ""
+        yield prefix + ERROR_RESPONSE
+
+
+def get_stubbed_response(prompt, persona=None):
     """
     Fallback stubbed response logic for offline testing or demos.
 
     Args:
         prompt (str): The full prompt string.
+        persona (str): Optional persona key selecting its rule set.
 
     Returns:
-        str: Hardcoded response based on prompt content.
+        str: Canned response based on prompt content.
     """
+    global _stub_backend
     try:
-        prompt_lower = prompt.lower()
-        if "science" in prompt_lower:
-            return "🔬 Based on scientific reasoning, we would need to test this with controlled variables."
-        elif "story" in prompt_lower or "once upon a time" in prompt_lower:
-            return "📖 Once upon a time, a curious mind asked a bold question, and a journey began..."
-        elif "minimal" in prompt_lower or "short" in prompt_lower:
-            return "✔️ Yes."
-        elif "friend" in prompt_lower or "happy" in prompt_lower:
-            return "😊 I'm here for you! What can I do to brighten your day?"
-        else:
-            return "🌿 Let’s take a moment to breathe. What would help you feel more at ease right now?"
+        if _stub_backend is None:
+            _stub_backend = StubBackend()
+        return _stub_backend.complete(prompt, persona)
     except Exception as e:
         print(f"[!] Error in get_stubbed_response(): {e}")
         return "⚠️ An error occurred in the offline response system."
 
+
 def get_openai_response(prompt):
     """
-    Sends the prompt to OpenAI's Chat API and returns the AI's response.
+    Sends the prompt to the Chat Completions API and returns the AI's response.
 
     ⚠️ Requires:
         - Internet connection
@@ -69,22 +646,7 @@ def get_openai_response(prompt):
         str: The response from OpenAI.
     """
     try:
-        import openai
-        from config import OPENAI_API_KEY  # 🔐 Secure API key management
-
-        openai.api_key = OPENAI_API_KEY
-
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=250
-        )
-
-        return response["choices"][0]["message"]["content"]
+        return _get_openai_backend().complete(prompt)
     except Exception as e:
         print(f"[!] OpenAI API error: {e}")
         return "⚠️ An error occurred while contacting the OpenAI API."
@@ -0,0 +1,259 @@
+# retrieval.py
+
+"""
+Retrieves past conversation turns relevant to the current input.
+
+Each Memory entry is embedded into a fixed-size vector and appended to
+a `VectorIndex`; a query is embedded the same way and scored against
+every stored vector with one matrix-vector product. The top-k turns
+that fall outside the recent history window can then be injected into
+the prompt (as {{relevant}}), so old context surfaces without sending
+the whole history.
+
+The default `HashingEmbedder` is a local hashed TF-IDF model: tokens are
+hashed into `dim` buckets with a sublinear term-frequency weight. The
+index keeps per-bucket document frequencies and applies IDF weighting at
+query time, so stored vectors never need re-weighting as the corpus
+grows. Any object with a `dim` attribute and an `embed(texts)` method
+can be plugged in instead.
+
+NumPy is optional. When installed, vectors live in a float32 matrix that
+grows in chunks; otherwise they are stored column-wise (dimension ->
+rows, weights) and scored by accumulating over the query's non-zero
+dimensions.
+"""
+
+import heapq
+import math
+import time
+import zlib
+from array import array
+
+import metrics
+from memory import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback
+    np = None
+
+DEFAULT_DIM = 1024      # Hash buckets per vector (4 KiB per dense float32 row)
+CHUNK_SIZE = 1024       # Rows added to the matrix each time it fills up
+EMBED_BATCH_SIZE = 256  # Entries embedded per batch when catching up with a Memory
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 0.2
+
+
+class HashingEmbedder:
+    """
+    Hashed TF embedder: maps text to sparse {bucket: weight} vectors.
+
+    Buckets come from a stable CRC32 of each token, with a second hash
+    bit choosing the sign so that collisions tend to cancel out. Term
+    weights are 1 + log(tf), and each vector is L2-normalized.
+
+    Args:
+        dim (int): Number of hash buckets.
+    """
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def embed_one(self, text):
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        vector = {}
+        for token, count in counts.items():
+            digest = zlib.crc32(token.encode("utf-8"))
+            bucket = digest % self.dim
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[bucket] = vector.get(bucket, 0.0) + sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        if norm:
+            vector = {bucket: w / norm for bucket, w in vector.items() if w}
+        return vector
+
+    def embed(self, texts):
+        """
+        Embed a batch of texts.
+
+        Returns:
+            list: One {bucket: weight} dict per text.
+        """
+        return [self.embed_one(text) for text in texts]
+
+
+class VectorIndex:
+    """
+    Append-only store of vectors with top-k similarity search.
+
+    Vectors may be dense sequences of length `dim` or sparse
+    {dimension: weight} dicts. A dimension's IDF is derived from how many
+    stored vectors use it.
+
+    Args:
+        dim (int): Vector dimensionality.
+        chunk_size (int): Rows to grow the NumPy matrix by when full.
+    """
+
+    def __init__(self, dim, chunk_size=CHUNK_SIZE):
+        self.dim = dim
+        self.chunk_size = chunk_size
+        self._count = 0
+        if np is not None:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+            self._df = np.zeros(dim, dtype=np.int64)
+        else:
+            # Column-wise sparse storage: dimension -> (rows, weights)
+            self._columns = [(array("I"), array("f")) for _ in range(dim)]
+
+    def __len__(self):
+        return self._count
+
+    def add(self, vectors):
+        """Append vectors; they receive consecutive row numbers."""
+        if np is not None:
+            self._add_numpy(vectors)
+        else:
+            for vector in vectors:
+                items = vector.items() if isinstance(vector, dict) else enumerate(vector)
+                for dimension, weight in items:
+                    if weight:
+                        rows, weights = self._columns[dimension]
+                        rows.append(self._count)
+                        weights.append(weight)
+                self._count += 1
+
+    def _add_numpy(self, vectors):
+        needed = self._count + len(vectors)
+        if needed > len(self._matrix):
+            rows = -(-needed // self.chunk_size) * self.chunk_size
+            grown = np.zeros((rows, self.dim), dtype=np.float32)
+            grown[:self._count] = self._matrix[:self._count]
+            self._matrix = grown
+        for offset, vector in enumerate(vectors):
+            row = self._matrix[self._count + offset]
+            if isinstance(vector, dict):
+                row[list(vector)] = list(vector.values())
+            else:
+                row[:] = vector
+        self._df += np.count_nonzero(self._matrix[self._count:needed], axis=0)
+        self._count = needed
+
+    def search(self, vector, k=DEFAULT_TOP_K, stop=None, min_score=0.0):
+        """
+        Return the rows most similar to `vector`.
+
+        Scores are IDF-weighted dot products, so a shared rare token
+        counts for more than a shared common one, divided by the query's
+        score against itself: a row equal to the query scores 1.0.
+
+        Args:
+            vector: Query vector (dense or sparse).
+            k (int): Maximum number of results.
+            stop (int): Only consider rows before this one.
+            min_score (float): Drop results scoring below this.
+
+        Returns:
+            list: (row, score) pairs, best first.
+        """
+        stop = self._count if stop is None else min(stop, self._count)
+        if stop <= 0 or k <= 0:
+            return []
+        if np is not None:
+            return self._search_numpy(vector, k, stop, min_score)
+
+        items = vector.items() if isinstance(vector, dict) else enumerate(vector)
+        scores = {}
+        self_score = 0.0
+        for dimension, query_weight in items:
+            if not query_weight:
+                continue
+            rows, weights = self._columns[dimension]
+            idf = math.log((1 + self._count) / (1 + len(rows))) + 1
+            self_score += (query_weight * idf) ** 2
+            query_weight *= idf * idf
+            for row, weight in zip(rows, weights):
+                if row >= stop:
+                    break
+                scores[row] = scores.get(row, 0.0) + query_weight * weight
+        if not self_score:
+            return []
+        scored = [(row, score / self_score) for row, score in scores.items()
+                  if score > 0 and score / self_score >= min_score]
+        return heapq.nlargest(k, scored, key=lambda item: (item[1], item[0]))
+
+    def _search_numpy(self, vector, k, stop, min_score):
+        query = np.zeros(self.dim, dtype=np.float32)
+        if isinstance(vector, dict):
+            query[list(vector)] = list(vector.values())
+        else:
+            query[:] = vector
+        idf = (np.log((1 + self._count) / (1 + self._df)) + 1).astype(np.float32)
+        self_score = float(np.dot(query * idf, query * idf))
+        if not self_score:
+            return []
+        scores = (self._matrix[:stop] @ (query * idf * idf)) / self_score
+        k = min(k, stop)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((-top, -scores[top]))]
+        return [(int(row), float(scores[row])) for row in top
+                if scores[row] >= min_score and scores[row] > 0]
+
+
+class MemoryRetriever:
+    """
+    Keeps a VectorIndex in step with a Memory and answers relevance queries.
+
+    New entries are embedded lazily, in batches, the next time the
+    retriever is queried.
+
+    Args:
+        memory (Memory): The conversation to index.
+        embedder: Embedder to use; a HashingEmbedder if None.
+    """
+
+    def __init__(self, memory, embedder=None):
+        self.memory = memory
+        self.embedder = embedder or HashingEmbedder()
+        self.index = VectorIndex(self.embedder.dim)
+
+    def sync(self):
+        """Embed entries added to the memory since the last call."""
+        memory = self.memory
+        total = len(memory)
+        while len(self.index) < total:
+            start = len(self.index)
+            stop = min(start + EMBED_BATCH_SIZE, total)
+            self.index.add(self.embedder.embed([memory.message(i) for i in range(start, stop)]))
+
+    def search(self, query, k=DEFAULT_TOP_K, stop=None, min_score=DEFAULT_MIN_SCORE):
+        """
+        Find the entries most relevant to `query`.
+
+        Args:
+            query (str): Text to match, usually the user's input.
+            k (int): Maximum number of entries.
+            stop (int): Only consider entries before this index, e.g.
+                the start of the history window already in the prompt.
+            min_score (float): Minimum similarity score.
+
+        Returns:
+            list: (entry index, score) pairs, best first.
+        """
+        start = time.perf_counter()
+        self.sync()
+        results = self.index.search(self.embedder.embed([query])[0], k, stop, min_score)
+        metrics.observe("retrieval.search", (time.perf_counter() - start) * 1000)
+        return results
+
+    def relevant(self, query, k=DEFAULT_TOP_K, stop=None, min_score=DEFAULT_MIN_SCORE):
+        """
+        Return the most relevant entries as 'speaker: message' lines.
+
+        Returns:
+            str: The matching lines in chronological order, joined by newlines.
+        """
+        indices = sorted(index for index, _ in self.search(query, k, stop, min_score))
+        return "\n".join(self.memory.line(index) for index in indices)
@@ -0,0 +1,236 @@
+# scheduler.py
+
+"""
+Priority-aware admission control for model calls.
+
+Every call to a remote backend passes through a `Scheduler` before it is
+sent. Callers keep running the call on their own thread; the scheduler
+only decides when each one may start:
+
+- Priorities: waiting calls are admitted strictly in priority order
+  (interactive > summary > batch), first come first served within a
+  class, so queued background summaries or batch jobs never delay the
+  user's next reply.
+- Rate limits: token buckets cap requests per second and estimated
+  tokens per minute. A 429 from the provider pauses admission for the
+  server's Retry-After (see `backoff`).
+- Concurrency: at most `max_in_flight` calls run at once.
+- Deduplication: a call whose key matches one already in flight waits
+  for that call's result instead of sending the same request again.
+
+Metrics: scheduler.wait.<priority> (ms spent queued), scheduler.queued
+and scheduler.in_flight gauges, and the scheduler.dedup and
+scheduler.rate_limited counters.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+INTERACTIVE = "interactive"
+SUMMARY = "summary"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, SUMMARY: 1, BATCH: 2}
+
+DEFAULT_REQUESTS_PER_SECOND = 3.0
+DEFAULT_TOKENS_PER_MINUTE = 90000
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_BACKOFF = 5.0  # seconds to pause after a 429 without Retry-After
+
+
+class TokenBucket:
+    """
+    Classic token bucket; not thread-safe on its own.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum tokens held (the allowed burst).
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Return the seconds until `amount` tokens are available (0 if now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Call:
+    """Result slot shared by deduplicated callers."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Scheduler:
+    """
+    Admits model calls by priority, within rate and concurrency limits.
+
+    Args:
+        requests_per_second (float): Sustained request rate; None for no limit.
+        tokens_per_minute (float): Sustained token rate; None for no limit.
+        max_in_flight (int): Maximum concurrent calls.
+    """
+
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.max_in_flight = max(1, max_in_flight)
+        self._requests = (TokenBucket(requests_per_second, max(1.0, requests_per_second))
+                          if requests_per_second else None)
+        self._tokens = (TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+                        if tokens_per_minute else None)
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority rank, sequence)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._calls = {}  # dedup key -> _Call in flight
+
+    def _delay(self, cost, now):
+        delay = self._paused_until - now
+        if self._requests is not None:
+            delay = max(delay, self._requests.delay(1, now))
+        if self._tokens is not None:
+            delay = max(delay, self._tokens.delay(cost, now))
+        return delay
+
+    def _gauges(self):
+        metrics.gauge("scheduler.queued", len(self._waiting))
+        metrics.gauge("scheduler.in_flight", self._in_flight)
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, cost=1):
+        """
+        Block until a call may start, and hold its slot for the block.
+
+        Args:
+            priority (str): INTERACTIVE, SUMMARY or BATCH.
+            cost (int): Estimated tokens (prompt plus completion).
+
+        Raises:
+            ValueError: If `priority` is unknown.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'.")
+        start = time.perf_counter()
+        entry = (PRIORITIES[priority], next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._gauges()
+            try:
+                while True:
+                    if self._waiting[0] == entry and self._in_flight < self.max_in_flight:
+                        now = time.monotonic()
+                        delay = self._delay(cost, now)
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._gauges()
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(cost)
+            self._in_flight += 1
+            self._gauges()
+            self._cond.notify_all()
+        metrics.observe(f"scheduler.wait.{priority}", (time.perf_counter() - start) * 1000)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._gauges()
+                self._cond.notify_all()
+
+    def run(self, fn, key=None, priority=INTERACTIVE, cost=1):
+        """
+        Run `fn()` once admitted and return its result.
+
+        If `key` is given and a call with the same key is already queued
+        or running, wait for that call and return its result (or raise
+        its exception) instead of running `fn`.
+        """
+        if key is None:
+            with self.slot(priority, cost):
+                return fn()
+
+        with self._cond:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = _Call()
+        if not owner:
+            metrics.incr("scheduler.dedup")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self.slot(priority, cost):
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._cond:
+                del self._calls[key]
+            call.done.set()
+
+    def backoff(self, seconds=None):
+        """
+        Pause admission after the provider rate-limited a call.
+
+        Args:
+            seconds (float): The server's Retry-After; DEFAULT_BACKOFF if None.
+        """
+        metrics.incr("scheduler.rate_limited")
+        with self._cond:
+            until = time.monotonic() + (DEFAULT_BACKOFF if seconds is None else seconds)
+            self._paused_until = max(self._paused_until, until)
+            self._cond.notify_all()
+
+    @property
+    def queued(self):
+        """Number of calls waiting to start."""
+        with self._cond:
+            return len(self._waiting)
+
+    @property
+    def in_flight(self):
+        """Number of calls currently running."""
+        with self._cond:
+            return self._in_flight
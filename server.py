@@ -0,0 +1,302 @@
+# server.py
+
+"""
+Multi-session server mode for Persona Architect.
+
+Hosts many isolated chat sessions in one process behind an asyncio
+line protocol over TCP or a Unix socket. Each request and response is a
+single JSON object on its own line:
+
+    {"id": 1, "session": "abc", "op": "message", "input": "Hello"}
+    {"id": 1, "ok": true, "session": "abc", "persona": "Default", "reply": "..."}
+
+Every session has its own PersonaManager (persona, memories, journals),
+while the persona registry, template cache, response cache and backend
+are shared module-level singletons. Building a turn's prompt context
+(history window, retrieval, summary) and the model call run in worker
+threads, so a slow reply in one session never blocks the others; requests for
+the same session are handled one at a time.
+
+Run with:
+    python server.py --port 8765
+    python server.py --unix /tmp/persona.sock
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from main import PersonaManager, ROLLING_SUMMARY
+from prompt_builder import build_prompt, template_registry
+from response_handler import get_response
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_SESSIONS = 1000
+SESSION_IDLE_TIMEOUT = 3600.0  # seconds
+MAX_LINE_BYTES = 1 << 20
+
+
+class Session:
+    """One client's isolated conversation state."""
+
+    def __init__(self, session_id, persona_name="default"):
+        self.id = session_id
+        self.manager = PersonaManager(persona_name)
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class PersonaServer:
+    """
+    Dispatches line-protocol requests to isolated sessions.
+
+    Args:
+        max_sessions (int): Maximum number of live sessions.
+        idle_timeout (float): Seconds after which idle sessions are closed.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.handlers = {
+            "open": self.op_open,
+            "message": self.op_message,
+            "switch": self.op_switch,
+            "reset": self.op_reset,
+            "history": self.op_history,
+            "search": self.op_search,
+            "summary": self.op_summary,
+            "close": self.op_close,
+            "sessions": self.op_sessions,
+        }
+
+    # ==== Session management ====
+
+    async def _create_session(self, session_id=None, persona_name="default"):
+        if len(self.sessions) >= self.max_sessions:
+            await self.expire_idle()
+            if len(self.sessions) >= self.max_sessions:
+                raise RuntimeError("Too many active sessions.")
+        if session_id in self.sessions:
+            raise ValueError(f"Session '{session_id}' already exists.")
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions[session_id] = Session(session_id, persona_name)
+        return session
+
+    async def _get_session(self, request):
+        session_id = request.get("session")
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session = await self._create_session(session_id, request.get("persona", "default"))
+        session.touch()
+        return session
+
+    async def _close_session(self, session):
+        # Closing saves and fsyncs the journals, so keep it off the event loop
+        self.sessions.pop(session.id, None)
+        await asyncio.to_thread(session.manager.close)
+
+    async def expire_idle(self):
+        """Close sessions that have been idle longer than `idle_timeout`."""
+        now = time.monotonic()
+        expired = [session for session in self.sessions.values()
+                   if now - session.last_used > self.idle_timeout and not session.lock.locked()]
+        await asyncio.gather(*(self._close_session(session) for session in expired))
+
+    # ==== Operations ====
+
+    async def op_open(self, request):
+        session = await self._create_session(request.get("session"), request.get("persona", "default"))
+        return {"session": session.id, "persona": session.manager.current_persona["name"]}
+
+    async def op_message(self, session, request):
+        user_input = request.get("input")
+        if not isinstance(user_input, str) or not user_input.strip():
+            raise ValueError("'input' must be a non-empty string.")
+        manager = session.manager
+        persona = manager.current_persona
+
+        def respond():
+            # Retrieval scoring and summary lookups run here too, off the event loop
+            prompt = build_prompt(persona, user_input, **manager.prompt_context(user_input))
+            return get_response(prompt, persona=manager.current_key)
+
+        reply = await asyncio.to_thread(respond)
+        manager.memory.add("You", user_input)
+        manager.memory.add(persona["name"], reply)
+        if ROLLING_SUMMARY:
+            manager.start_summary()
+        return {"persona": persona["name"], "reply": reply}
+
+    async def op_switch(self, session, request):
+        persona_name = request.get("persona")
+        if not isinstance(persona_name, str) or not persona_name.strip():
+            raise ValueError("'persona' must be a non-empty string.")
+        await asyncio.to_thread(session.manager.switch, persona_name.strip())
+        return {"persona": session.manager.current_persona["name"]}
+
+    async def op_reset(self, session, request):
+        manager = session.manager
+        manager.reset_memory()
+        return {"persona": manager.current_persona["name"]}
+
+    async def op_history(self, session, request):
+        memory = session.manager.memory
+        limit = int(request.get("limit", len(memory)))
+        start = max(len(memory) - limit, 0)
+        return {
+            "count": len(memory),
+            "entries": [memory.entry(i).as_dict() for i in range(start, len(memory))],
+        }
+
+    async def op_search(self, session, request):
+        memory = session.manager.memory
+        results = memory.search(
+            request.get("query", ""),
+            mode=request.get("mode", "and"),
+            speaker=request.get("speaker"),
+            limit=request.get("limit", 10),
+        )
+        return {
+            "results": [
+                {"index": index, "score": score, **memory.entry(index).as_dict()}
+                for index, score in results
+            ]
+        }
+
+    async def op_summary(self, session, request):
+        manager = session.manager
+        if len(manager.memory):
+            await asyncio.to_thread(manager.update_summary, True)
+        return {"summary": manager.memory.summary}
+
+    async def op_close(self, session, request):
+        await self._close_session(session)
+        return {"closed": True}
+
+    async def op_sessions(self, request):
+        return {"sessions": len(self.sessions)}
+
+    # ==== Protocol ====
+
+    async def dispatch(self, request):
+        """
+        Handle one decoded request.
+
+        Returns:
+            dict: The response object (always includes "ok").
+        """
+        response = {"ok": True}
+        if "id" in request:
+            response["id"] = request["id"]
+        try:
+            op = request.get("op", "message")
+            handler = self.handlers.get(op)
+            if handler is None:
+                raise ValueError(f"Unknown op '{op}'.")
+            if op in ("open", "sessions"):
+                response.update(await handler(request))
+            else:
+                session = await self._get_session(request)
+                response["session"] = session.id
+                async with session.lock:
+                    response.update(await handler(session, request))
+        except Exception as e:
+            response["ok"] = False
+            response["error"] = str(e)
+        return response
+
+    async def handle_connection(self, reader, writer):
+        """Serve one client connection; requests are processed concurrently."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(request):
+            response = await self.dispatch(request)
+            data = (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+            async with write_lock:
+                writer.write(data)
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object.")
+                except ValueError as e:
+                    async with write_lock:
+                        writer.write((json.dumps({"ok": False, "error": f"Bad request: {e}"}) + "\n").encode())
+                        await writer.drain()
+                    continue
+                task = asyncio.create_task(respond(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def expire_loop(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 60))
+            await self.expire_idle()
+
+    def close_all(self):
+        """Close every session, flushing their journals (used at shutdown)."""
+        for session in list(self.sessions.values()):
+            self.sessions.pop(session.id, None)
+            session.manager.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, server=None):
+    """Run the server until cancelled."""
+    server = server or PersonaServer()
+    template_registry.preload()
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle_connection, unix_path, limit=MAX_LINE_BYTES)
+        print(f"🛰️ Persona server listening on {unix_path}")
+    else:
+        listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_LINE_BYTES)
+        print(f"🛰️ Persona server listening on {host}:{port}")
+
+    expiry = asyncio.create_task(server.expire_loop())
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        expiry.cancel()
+        server.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Persona Architect sessions over a local socket.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped.")
+
+
+if __name__ == "__main__":
+    main()
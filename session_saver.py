@@ -1,29 +1,180 @@
 # session_saver.py
 
 """
-Handles saving the full conversation history to a timestamped text file.
-Each session is saved using the persona's name and current date/time.
+Handles saving conversation history to disk.
+
+Sessions are written to an append-only journal: one JSONL file per
+session, opened once, with each new turn appended as
+{"speaker": ..., "message": ..., "timestamp": ...}. Saving after a turn
+therefore only writes the entries added since the last save. Rolling
+summaries are journaled too, as {"type": "summary", ...} records.
+
+Saving is split into `collect` (snapshot new entries, no I/O) and
+`write_batch` (file I/O), so the write can be handed to a
+`BackgroundWriter` thread.
 """
 
 import datetime
+import json
+import os
+import time
 
-def save_session(persona_name, memory):
-    """
-    Save the complete conversation history to a timestamped text file.
+import metrics
+
+FSYNC_ALWAYS = "always"  # fsync after every save
+FSYNC_BATCH = "batch"    # fsync every `batch_size` entries or `batch_interval` seconds
+FSYNC_EXIT = "exit"      # fsync only when the journal is closed
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_EXIT)
 
-    Args:
-        persona_name (str): Name of the current persona.
-        memory (Memory): Memory object containing the conversation history.
 
-    Creates:
-        A .txt file with all dialogue from the session.
+def _timestamp():
+    return datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+
+
+class SessionJournal:
     """
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"session_{persona_name}_{timestamp}.txt"
-
-    try:
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(memory.get_context())
-        print(f"\n✅ Session saved to '{filename}'")
-    except Exception as e:
-        print(f"\n❌ Failed to save session: {e}")
+    Append-only JSONL journal for one persona's session.
+
+    The file is created on the first write and kept open; `sync` appends
+    whatever the memory gained since the previous call. Passing a
+    different Memory object (e.g. after /reset) starts a new journal file.
+    """
+
+    def __init__(self, persona_name, fsync_policy=FSYNC_BATCH, batch_size=20,
+                 batch_interval=5.0, directory=""):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}'. Use one of {FSYNC_POLICIES}.")
+        self.persona_name = persona_name
+        self.fsync_policy = fsync_policy
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.directory = directory
+        self.path = None
+        self._file = None
+        self._memory = None
+        self._written = 0
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def _open(self):
+        base = f"session_{self.persona_name}_{_timestamp()}"
+        self.path = os.path.join(self.directory, f"{base}.jsonl")
+        suffix = 1
+        while True:
+            try:
+                # "x" fails if the file exists, so concurrent journals never share one
+                self._file = open(self.path, "x", encoding="utf-8")
+                return
+            except FileExistsError:
+                self.path = os.path.join(self.directory, f"{base}_{suffix}.jsonl")
+                suffix += 1
+
+    def _fsync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def write_record(self, record):
+        """Append a single JSON record to the journal."""
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._unsynced += 1
+
+    def sync(self, memory):
+        """
+        Append entries added to `memory` since the last sync.
+
+        Args:
+            memory (Memory): Memory object containing the conversation history.
+
+        Returns:
+            int: Number of entries written.
+        """
+        return self.write_batch(self.collect(memory))
+
+    def collect(self, memory):
+        """
+        Snapshot the entries added to `memory` since the last call.
+
+        Only reads the memory and does no file I/O, so the returned batch
+        can be written later (e.g. by a background writer) while the
+        conversation carries on.
+
+        Returns:
+            tuple: (new_file, records) for `write_batch`; `new_file` is
+            True when `memory` is a different Memory than last time.
+        """
+        new_file = memory is not self._memory and self._memory is not None
+        if memory is not self._memory:
+            self._memory = memory
+            # Turns resumed from a conversation store were journaled by an earlier run
+            self._written = memory.resumed
+
+        total = len(memory)
+        records = []
+        for index in range(self._written, total):
+            timestamp = datetime.datetime.fromtimestamp(memory.timestamp(index))
+            records.append({
+                "speaker": memory.speaker(index),
+                "message": memory.message(index),
+                "timestamp": timestamp.isoformat(timespec="seconds"),
+            })
+        self._written = total
+        return new_file, records
+
+    def summary_batch(self, memory):
+        """Return a batch with pending entries followed by the memory's rolling summary."""
+        new_file, records = self.collect(memory)
+        records.append({
+            "type": "summary",
+            "summary": memory.summary,
+            "covered": memory.summarized,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        })
+        return new_file, records
+
+    @staticmethod
+    def merge_batches(pending, batch):
+        """Combine two batches into one, or return None if `batch` starts a new file."""
+        if batch[0]:
+            return None
+        return pending[0], pending[1] + batch[1]
+
+    def write_batch(self, batch):
+        """
+        Write a batch from `collect`, applying the fsync policy.
+
+        Returns:
+            int: Number of records written.
+        """
+        with metrics.timer("journal.sync"):
+            new_file, records = batch
+            if new_file:
+                self.close()
+            for record in records:
+                self.write_record(record)
+            written = len(records)
+
+            if self._file is not None:
+                self._file.flush()
+                if self._unsynced and (
+                    self.fsync_policy == FSYNC_ALWAYS
+                    or (self.fsync_policy == FSYNC_BATCH and (
+                        self._unsynced >= self.batch_size
+                        or time.monotonic() - self._last_fsync >= self.batch_interval
+                    ))
+                ):
+                    self._fsync()
+        return written
+
+    def close(self):
+        """Flush, fsync and close the journal file. A later write opens a new file."""
+        if self._file is not None:
+            try:
+                self._fsync()
+            finally:
+                self._file.close()
+                self._file = None
+
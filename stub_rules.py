@@ -0,0 +1,171 @@
+# stub_rules.py
+
+"""
+Keyword rules for the offline stub backend.
+
+Rules map keywords to canned responses and are loaded from a JSON file:
+
+    {
+      "global": {
+        "rules": [{"keywords": ["science"], "response": "🔬 ..."}, ...],
+        "fallback": "🌿 ..."
+      },
+      "personas": {
+        "scientist": {"rules": [...], "fallback": "..."}
+      }
+    }
+
+For each persona, its own rules followed by the global rules are
+compiled once into a single case-insensitive regex with one named group
+per rule. A prompt is scanned in one pass and the earliest-listed rule
+with a matching keyword wins, as in an if/elif chain. If nothing
+matches, the persona's fallback (or the global one) is returned.
+For a rendered Prompt, only its body (history and user input) is
+scanned, not the static persona prefix.
+
+Keywords match as plain substrings. Because the scan reports
+non-overlapping matches, a keyword that only occurs inside an
+overlapping match of another keyword is not seen.
+"""
+
+import hashlib
+import json
+import re
+
+DEFAULT_RULES_PATH = "stub_rules.json"
+
+# Used when no rules file exists; mirrors the original hard-coded stub.
+BUILTIN_RULES = {
+    "global": {
+        "rules": [
+            {"keywords": ["science"],
+             "response": "🔬 Based on scientific reasoning, we would need to test this with controlled variables."},
+            {"keywords": ["story", "once upon a time"],
+             "response": "📖 Once upon a time, a curious mind asked a bold question, and a journey began..."},
+            {"keywords": ["minimal", "short"], "response": "✔️ Yes."},
+            {"keywords": ["friend", "happy"],
+             "response": "😊 I'm here for you! What can I do to brighten your day?"},
+        ],
+        "fallback": "🌿 Let’s take a moment to breathe. What would help you feel more at ease right now?",
+    },
+    "personas": {},
+}
+
+
+def _parse_rules(section, where):
+    """Validate a rules section, returning [(keywords, response)] and its fallback."""
+    if not isinstance(section, dict):
+        raise ValueError(f"{where} must be an object with 'rules' and/or 'fallback'.")
+    rules = []
+    for number, rule in enumerate(section.get("rules", []), start=1):
+        keywords = rule.get("keywords") if isinstance(rule, dict) else None
+        response = rule.get("response") if isinstance(rule, dict) else None
+        if (not isinstance(keywords, list) or not keywords
+                or not all(isinstance(k, str) and k for k in keywords)):
+            raise ValueError(f"{where} rule {number} needs a non-empty 'keywords' list of strings.")
+        if not isinstance(response, str):
+            raise ValueError(f"{where} rule {number} needs a 'response' string.")
+        rules.append((keywords, response))
+    fallback = section.get("fallback")
+    if fallback is not None and not isinstance(fallback, str):
+        raise ValueError(f"{where} 'fallback' must be a string.")
+    return rules, fallback
+
+
+class RuleSet:
+    """
+    An ordered list of keyword rules compiled into one regex.
+
+    Args:
+        rules (list): (keywords, response) pairs, highest priority first.
+        fallback (str): Response when no rule matches.
+    """
+
+    __slots__ = ("responses", "fallback", "_pattern")
+
+    def __init__(self, rules, fallback):
+        self.responses = [response for _, response in rules]
+        self.fallback = fallback
+        alternatives = []
+        for number, (keywords, _) in enumerate(rules):
+            # Longest first, so a keyword is not shadowed by its own prefix
+            words = sorted(set(keywords), key=len, reverse=True)
+            alternatives.append(f"(?P<r{number}>{'|'.join(map(re.escape, words))})")
+        self._pattern = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def respond(self, text):
+        """Return the response of the highest-priority matching rule, or the fallback."""
+        if self._pattern is None:
+            return self.fallback
+        best = None
+        for match in self._pattern.finditer(text):
+            number = int(match.lastgroup[1:])
+            if best is None or number < best:
+                best = number
+                if number == 0:
+                    break
+        return self.fallback if best is None else self.responses[best]
+
+
+class StubRules:
+    """
+    Per-persona rule sets built from a rules config.
+
+    Rule sets are compiled on first use for each persona key.
+
+    Args:
+        config (dict): Parsed rules config (see module docstring).
+
+    Raises:
+        ValueError: If the config is malformed.
+    """
+
+    def __init__(self, config):
+        self.global_rules, self.global_fallback = _parse_rules(config.get("global", {}), "global")
+        personas = config.get("personas", {})
+        if not isinstance(personas, dict):
+            raise ValueError("'personas' must be an object keyed by persona name.")
+        self.persona_rules = {
+            name.lower(): _parse_rules(section, f"persona '{name}'")
+            for name, section in personas.items()
+        }
+        payload = json.dumps(config, sort_keys=True, ensure_ascii=False)
+        self.digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+        self._compiled = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_RULES_PATH):
+        """
+        Load rules from a JSON file, or the built-in rules if it does not exist.
+
+        Raises:
+            ValueError: If the file is not valid JSON or the rules are malformed.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = BUILTIN_RULES
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Stub rules file '{path}' is not valid JSON: {e}") from e
+        return cls(config)
+
+    def for_persona(self, persona=None):
+        """Return the compiled RuleSet for a persona key (global rules only if None)."""
+        key = persona.lower() if persona else None
+        rule_set = self._compiled.get(key)
+        if rule_set is None:
+            rules, fallback = self.persona_rules.get(key, ([], None))
+            rule_set = RuleSet(rules + self.global_rules, fallback or self.global_fallback or "")
+            self._compiled[key] = rule_set
+        return rule_set
+
+    def respond(self, prompt, persona=None):
+        """
+        Return the canned response for a prompt.
+
+        Only the dynamic body of a Prompt is scanned, so keywords in the
+        persona's static prefix (its description or goals) do not decide
+        every reply.
+        """
+        return self.for_persona(persona).respond(getattr(prompt, "body", prompt))
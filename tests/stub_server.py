@@ -0,0 +1,97 @@
+# tests/stub_server.py
+
+"""
+Local stand-in for an OpenAI-compatible Chat Completions endpoint.
+
+Runs `http.server` on a random port in a background thread, records
+every request, and answers from a queue of scripted responses (falling
+back to a fixed completion). Streaming requests get a server-sent
+events reply. Connections are kept alive, so tests can check reuse.
+"""
+
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONTENT = "Hello from the stub."
+STREAM_CHUNKS = ("Hel", "lo", "!")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.loads(raw)
+        with stub.lock:
+            stub.requests.append({
+                "path": self.path,
+                "raw": raw,
+                "payload": payload,
+                "client_port": self.client_address[1],
+            })
+            scripted = stub.responses.popleft() if stub.responses else None
+
+        if scripted is not None:
+            status, headers, body = scripted
+            self._send(status, body.encode("utf-8"), "application/json", headers)
+        elif payload.get("stream"):
+            events = "".join(
+                f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n"
+                for chunk in STREAM_CHUNKS
+            ) + "data: [DONE]\n\n"
+            self._send(200, events.encode("utf-8"), "text/event-stream")
+        else:
+            body = json.dumps({"choices": [{"message": {"content": DEFAULT_CONTENT}}]})
+            self._send(200, body.encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer:
+    """
+    Context manager running the stub endpoint.
+
+    Attributes:
+        requests (list): Recorded requests: path, raw body bytes, decoded
+            payload and the client's port (one per connection).
+        responses (deque): Scripted (status, headers, body) replies, used
+            in order before falling back to the default completion.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.responses = deque()
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def script(self, status, body="", headers=None):
+        """Queue one scripted reply."""
+        self.responses.append((status, headers or {}, body))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
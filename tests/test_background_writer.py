@@ -0,0 +1,111 @@
+# tests/test_background_writer.py
+
+"""Tests for ordering, coalescing, back-pressure and flushing of background writes."""
+
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from background_writer import BackgroundWriter  # noqa: E402
+
+
+class BackgroundWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.writer = BackgroundWriter(max_pending=4)
+        self.addCleanup(self.writer.close)
+        self.written = []
+
+    def block(self):
+        """Occupy the writer thread until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+
+        def wait(_):
+            started.set()
+            release.wait()
+
+        self.writer.submit("blocker", wait, None)
+        started.wait()
+        return release
+
+    def test_runs_jobs_in_order(self):
+        for i in range(10):
+            self.writer.submit(f"file{i % 3}", self.written.append, i)
+        self.assertTrue(self.writer.flush(timeout=5))
+        self.assertEqual(self.written, list(range(10)))
+        self.assertEqual(self.writer.pending, 0)
+
+    def test_coalesces_queued_jobs_for_the_same_key(self):
+        release = self.block()
+        for text in ("a", "b", "c"):
+            self.writer.submit("journal", self.written.append, text, merge=lambda queued, new: queued + new)
+        self.writer.submit("other", self.written.append, "x")
+        self.writer.submit("journal", self.written.append, "d", merge=lambda queued, new: queued + new)
+        release.set()
+        self.writer.flush(timeout=5)
+        # Folded into the still-queued job, even though another key came in between
+        self.assertEqual(self.written, ["abcd", "x"])
+
+    def test_merge_can_refuse(self):
+        release = self.block()
+        for text in ("a", "b"):
+            self.writer.submit("journal", self.written.append, text, merge=lambda queued, new: None)
+        release.set()
+        self.writer.flush(timeout=5)
+        self.assertEqual(self.written, ["a", "b"])
+
+    def test_submit_blocks_when_queue_is_full(self):
+        release = self.block()
+        for i in range(4):
+            self.writer.submit(i, self.written.append, i)
+        submitted = threading.Event()
+
+        def submit_one_more():
+            self.writer.submit("late", self.written.append, "late")
+            submitted.set()
+
+        thread = threading.Thread(target=submit_one_more)
+        thread.start()
+        self.assertFalse(submitted.wait(0.1))
+        release.set()
+        thread.join(timeout=5)
+        self.assertTrue(submitted.is_set())
+        self.writer.flush(timeout=5)
+        self.assertEqual(self.written, [0, 1, 2, 3, "late"])
+
+    def test_failed_job_does_not_stop_the_writer(self):
+        def fail(_):
+            raise OSError("disk full")
+
+        with contextlib.redirect_stdout(io.StringIO()) as out, contextlib.redirect_stderr(io.StringIO()):
+            self.writer.submit("bad", fail, None)
+            self.writer.submit("good", self.written.append, "ok")
+            self.writer.flush(timeout=5)
+        self.assertEqual(self.written, ["ok"])
+        self.assertIn("disk full", out.getvalue())
+
+    def test_flush_times_out_while_a_job_runs(self):
+        release = self.block()
+        start = time.monotonic()
+        self.assertFalse(self.writer.flush(timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        release.set()
+        self.assertTrue(self.writer.flush(timeout=5))
+
+    def test_close_runs_queued_jobs_then_writes_inline(self):
+        release = self.block()
+        self.writer.submit("queued", self.written.append, "queued")
+        release.set()
+        self.writer.close()
+        self.assertEqual(self.written, ["queued"])
+        self.writer.submit("after", self.written.append, "after")
+        self.assertEqual(self.written, ["queued", "after"])
+
+
+if __name__ == "__main__":
+    unittest.main()
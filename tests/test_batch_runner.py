@@ -0,0 +1,112 @@
+# tests/test_batch_runner.py
+
+"""Tests for resumable batch runs of personas over a JSONL of inputs."""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import batch_runner  # noqa: E402
+from response_handler import BackendError, StubBackend  # noqa: E402
+from stub_rules import StubRules  # noqa: E402
+
+CONFIG = {
+    "default": {"name": "Default", "description": "A helpful assistant.", "template": "default.txt", "tone": "neutral"},
+    "scientist": {"name": "Scientist", "description": "Uses science.", "template": "default.txt", "tone": "dry"},
+}
+
+RULES = {"global": {"rules": [{"keywords": ["science"], "response": "🔬 Science!"}], "fallback": "Hello."}}
+
+
+class FlakyBackend(StubBackend):
+    """Fails every prompt containing 'flaky' until `healed` is set."""
+
+    def __init__(self):
+        super().__init__(StubRules(RULES))
+        self.healed = False
+        self.calls = 0
+
+    def complete(self, prompt, persona=None):
+        self.calls += 1
+        if "flaky" in prompt and not self.healed:
+            raise BackendError("unavailable")
+        return super().complete(prompt, persona)
+
+
+class ReadInputsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "inputs.jsonl")
+
+    def read(self, *lines):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return list(batch_runner.read_inputs(self.path))
+
+    def test_strings_objects_and_blank_lines(self):
+        self.assertEqual(self.read('"hi"', "", '{"id": "q", "input": "yo"}', '{"input": "hey"}'),
+                         [("1", "hi"), ("q", "yo"), ("4", "hey")])
+
+    def test_rejects_malformed_lines(self):
+        for line in ("{oops", '{"id": 1}', "42"):
+            with self.subTest(line=line), self.assertRaises(ValueError):
+                self.read(line)
+
+
+class RunBatchTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shutil.copytree(os.path.join(ROOT, "templates"), os.path.join(directory.name, "templates"))
+        with open(os.path.join(directory.name, "persona_config.json"), "w", encoding="utf-8") as f:
+            json.dump(CONFIG, f)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        with open("inputs.jsonl", "w", encoding="utf-8") as f:
+            f.write('"Tell me about science"\n"flaky question"\n"hello"\n')
+
+    @staticmethod
+    def rows():
+        with open("results.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_runs_every_persona_over_every_input(self):
+        seen = []
+        counts = batch_runner.run_batch("inputs.jsonl", "results.jsonl", concurrency=2,
+                                        backend=StubBackend(StubRules(RULES)), on_result=seen.append)
+        self.assertEqual(counts, {"completed": 6, "failed": 0, "skipped": 0})
+        rows = self.rows()
+        self.assertEqual(rows, seen)
+        self.assertEqual({(row["persona"], row["input_id"]) for row in rows},
+                         {(p, i) for p in CONFIG for i in ("1", "2", "3")})
+        science = [row["response"] for row in rows if row["input_id"] == "1"]
+        self.assertEqual(science, ["🔬 Science!"] * 2)
+
+    def test_rerun_retries_only_failed_rows(self):
+        backend = FlakyBackend()
+        counts = batch_runner.run_batch("inputs.jsonl", "results.jsonl", ["scientist"], backend=backend)
+        self.assertEqual(counts, {"completed": 2, "failed": 1, "skipped": 0})
+        failed = [row for row in self.rows() if not row["ok"]]
+        self.assertEqual([(row["input_id"], row["error"]) for row in failed], [("2", "unavailable")])
+
+        backend.healed = True
+        backend.calls = 0
+        counts = batch_runner.run_batch("inputs.jsonl", "results.jsonl", ["scientist"], backend=backend)
+        self.assertEqual(counts, {"completed": 1, "failed": 0, "skipped": 2})
+        self.assertEqual(backend.calls, 1)
+
+    def test_unknown_persona(self):
+        with self.assertRaises(ValueError):
+            batch_runner.run_batch("inputs.jsonl", "results.jsonl", ["nobody"])
+        self.assertEqual(batch_runner.completed_keys("missing.jsonl"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# tests/test_config_loader.py
+
+"""Tests for locked, atomic, conflict-checked persona saves."""
+
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_loader import (ConfigConflictError, PersonaRegistry, PersonaTraits, get_registry,  # noqa: E402
+                           load_config, persona_version, save_persona)
+
+CONFIG = {
+    "default": {"description": "A helpful assistant.", "tone": "neutral", "template": "default.txt"},
+    "scientist": {"description": "Answers using science.", "tone": "analytical", "template": "default.txt"},
+}
+
+
+def _save_many(config_path, name, count):
+    """Worker: save `count` successive edits of one persona."""
+    for i in range(count):
+        while True:
+            traits, version = get_registry(config_path).get_versioned(name)
+            traits["counter"] = i
+            try:
+                save_persona(name, traits, expected_version=version, config_path=config_path)
+                break
+            except ConfigConflictError:
+                continue
+
+
+class SavePersonaTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "persona_config.json")
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(CONFIG, f)
+
+    def test_saves_one_persona_and_keeps_the_others(self):
+        traits = dict(CONFIG["scientist"], tone="dry")
+        version = save_persona("Scientist", traits, expected_version=persona_version(CONFIG["scientist"]),
+                               config_path=self.path)
+        config = load_config(self.path)
+        self.assertEqual(config["scientist"]["tone"], "dry")
+        self.assertEqual(config["default"], CONFIG["default"])
+        self.assertEqual(version, persona_version(traits))
+        self.assertEqual(get_registry(self.path).version("scientist"), version)
+
+    def test_rejects_stale_version(self):
+        stale = persona_version(CONFIG["scientist"])
+        save_persona("scientist", dict(CONFIG["scientist"], tone="dry"), expected_version=stale,
+                     config_path=self.path)
+        with self.assertRaises(ConfigConflictError):
+            save_persona("scientist", dict(CONFIG["scientist"], tone="wry"), expected_version=stale,
+                         config_path=self.path)
+        self.assertEqual(load_config(self.path)["scientist"]["tone"], "dry")
+
+    def test_force_save_skips_the_check(self):
+        save_persona("scientist", dict(CONFIG["scientist"], tone="dry"), config_path=self.path)
+        save_persona("scientist", dict(CONFIG["scientist"], tone="wry"), config_path=self.path)
+        self.assertEqual(load_config(self.path)["scientist"]["tone"], "wry")
+
+    def test_creates_new_persona_with_empty_version(self):
+        save_persona("poet", {"description": "Rhymes."}, expected_version="", config_path=self.path)
+        self.assertIn("poet", load_config(self.path))
+        with self.assertRaises(ConfigConflictError):
+            save_persona("poet", {"description": "Again."}, expected_version="", config_path=self.path)
+
+    def test_write_is_atomic_and_leaves_no_temp_files(self):
+        os.chmod(self.path, 0o640)
+        save_persona("scientist", dict(CONFIG["scientist"], tone="dry"), config_path=self.path)
+        leftovers = [name for name in os.listdir(self.directory) if name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+
+    def test_concurrent_processes_lose_no_updates(self):
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=_save_many, args=(self.path, name, 10))
+                   for name in ("default", "scientist")]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+            self.assertEqual(worker.exitcode, 0)
+        config = load_config(self.path)
+        self.assertEqual(config["default"]["counter"], 9)
+        self.assertEqual(config["scientist"]["counter"], 9)
+
+
+class PersonaRegistryTest(unittest.TestCase):
+    def test_lookups_stay_consistent_while_the_file_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "persona_config.json")
+            configs = [{"Poet": {"tone": "lyrical"}}, {"Poet": {"tone": "lyrical"}, "Extra": {}, "Third": {}}]
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(configs[0], f)
+            registry = PersonaRegistry(path)
+            errors = []
+            done = threading.Event()
+
+            def read():
+                while not done.is_set():
+                    try:
+                        traits, version = registry.get_versioned("poet")
+                        self.assertEqual(traits, {"tone": "lyrical"})
+                        self.assertEqual(version, persona_version(traits))
+                    except Exception as e:  # collected; assertions in threads do not fail the test
+                        errors.append(e)
+
+            readers = [threading.Thread(target=read) for _ in range(4)]
+            for reader in readers:
+                reader.start()
+            for i in range(200):
+                with open(path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(configs[i % 2], f)
+                os.replace(path + ".tmp", path)
+            done.set()
+            for reader in readers:
+                reader.join()
+            self.assertEqual(errors, [])
+
+
+class PersonaTraitsTest(unittest.TestCase):
+    def test_overlay_edits_diff_and_revert(self):
+        traits = PersonaTraits({"tone": "neutral", "goals": "help"}, "v1")
+        traits["tone"] = "dry"
+        traits["quirk"] = "puns"
+        del traits["goals"]
+        self.assertEqual(dict(traits), {"tone": "dry", "quirk": "puns"})
+        self.assertEqual(traits.diff(), ({"quirk": "puns"}, {"goals": "help"}, {"tone": ("neutral", "dry")}))
+        self.assertEqual(traits.base["tone"], "neutral")
+        traits.revert()
+        self.assertFalse(traits.edited)
+        self.assertEqual(dict(traits), {"tone": "neutral", "goals": "help"})
+
+    def test_rebase_drops_matching_edits(self):
+        traits = PersonaTraits({"tone": "neutral"}, "v1")
+        traits["tone"] = "dry"
+        traits["quirk"] = "puns"
+        traits.rebase({"tone": "dry"}, "v2")
+        self.assertEqual(traits.version, "v2")
+        self.assertEqual(traits.overlay, {"quirk": "puns"})
+
+
+if __name__ == "__main__":
+    unittest.main()
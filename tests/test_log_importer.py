@@ -0,0 +1,83 @@
+# tests/test_log_importer.py
+
+"""Tests for the streaming log parser and batched import."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_importer import import_log, iter_log_entries, parse_log_file  # noqa: E402
+from memory import Memory  # noqa: E402
+
+ENTRIES = [
+    {"speaker": "You", "message": "Is it raining? ☔"},
+    {"speaker": "Scientist", "message": "Précipitation: likely — bring an umbrella."},
+    {"speaker": "You", "message": "Thanks!\nSee you."},
+]
+
+
+class LogImporterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+        return path
+
+    def test_json_array_in_tiny_chunks(self):
+        # 3-byte chunks split multi-byte characters and entries mid-way
+        path = self.write("log.json", "﻿" + json.dumps(ENTRIES, indent=2, ensure_ascii=False))
+        self.assertEqual(list(iter_log_entries(path, chunk_size=3)), ENTRIES)
+
+    def test_json_lines_skip_summaries_and_blank_lines(self):
+        lines = [json.dumps(entry, ensure_ascii=False) for entry in ENTRIES]
+        lines.insert(2, json.dumps({"type": "summary", "summary": "...", "covered": 2}))
+        lines.insert(1, "")
+        path = self.write("log.jsonl", "\n".join(lines) + "\n")
+        self.assertEqual(parse_log_file(path), ENTRIES)
+
+    def test_invalid_entry_reports_its_line(self):
+        path = self.write("log.json", '[\n  {"speaker": "You", "message": "hi"},\n  {"speaker": "You"}\n]')
+        with self.assertRaisesRegex(Exception, r"Entry 2 \(line 3\)"):
+            parse_log_file(path)
+
+    def test_invalid_json_reports_its_line(self):
+        path = self.write("log.jsonl", '{"speaker": "You", "message": "hi"}\n{"speaker": \n')
+        with self.assertRaisesRegex(Exception, r"line 2"):
+            parse_log_file(path)
+
+    def test_missing_file(self):
+        with self.assertRaisesRegex(Exception, "not found"):
+            parse_log_file(os.path.join(self.directory, "missing.json"))
+
+    def test_import_log_adds_in_batches_with_progress(self):
+        entries = [{"speaker": "You", "message": f"message {i}"} for i in range(25)]
+        path = self.write("log.json", json.dumps(entries))
+        memory = Memory()
+        progress = []
+        count = import_log(path, memory, batch_size=10,
+                           on_progress=lambda done, read, total: progress.append((done, read, total)))
+        self.assertEqual(count, 25)
+        self.assertEqual([entry.as_dict() for entry in memory.history], entries)
+        self.assertEqual([done for done, _, _ in progress], [10, 20, 25])
+        self.assertEqual(progress[-1][1], progress[-1][2])
+
+    def test_import_log_reports_partial_progress_on_error(self):
+        entries = [{"speaker": "You", "message": str(i)} for i in range(3)] + ["not an entry"]
+        path = self.write("log.json", json.dumps(entries))
+        memory = Memory()
+        with self.assertRaisesRegex(Exception, "2 entries were imported"):
+            import_log(path, memory, batch_size=2)
+        self.assertEqual(len(memory), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
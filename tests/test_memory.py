@@ -0,0 +1,173 @@
+# tests/test_memory.py
+
+"""Tests for compact storage, token windows, search, filtering and store-backed memories."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore, StoreConflictError  # noqa: E402
+from memory import CHARS_PER_TOKEN, Memory  # noqa: E402
+
+TURNS = [
+    ("You", "Élan vital is a phrase"),
+    ("Scientist", "Über alles, hi there"),
+    ("You", "Don said it was late"),
+    ("Scientist", "the blue sky is nice"),
+    ("You", "sky: the limit"),
+    ("Friendly", "don't look at the sky?"),
+    ("You", "what about photons"),
+    ("Scientist", "Photons carry light"),
+]
+
+
+def fill(memory, turns=TURNS):
+    for speaker, message in turns:
+        memory.add(speaker, message)
+    return memory
+
+
+class MemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.memory = fill(Memory())
+
+    def test_entries_round_trip(self):
+        self.assertEqual(len(self.memory), len(TURNS))
+        self.assertEqual([(e.speaker, e.message) for e in self.memory.history], TURNS)
+        self.assertEqual(self.memory.history[-1], {"speaker": "Scientist", "message": "Photons carry light"})
+        self.assertEqual(self.memory.history[0]["message"], "Élan vital is a phrase")
+        self.assertEqual(self.memory.line(1), "Scientist: Über alles, hi there")
+        with self.assertRaises(ValueError):
+            self.memory.add("You", None)
+
+    def test_get_context_grows_with_history(self):
+        self.assertEqual(self.memory.get_context(), "\n".join(f"{s}: {m}" for s, m in TURNS))
+        self.memory.add("You", "one more")
+        self.assertTrue(self.memory.get_context().endswith("\nYou: one more"))
+
+    def test_window_keeps_newest_turns_within_budget(self):
+        memory = Memory()
+        for i in range(10):
+            memory.add("You", "x" * (4 * CHARS_PER_TOKEN - 6) + str(i))  # "You: " + 11 chars = 4 tokens
+        self.assertEqual(memory.get_window(12).splitlines(), memory.lines(7))
+        self.assertEqual(memory.get_window(11).splitlines(), memory.lines(8))
+        self.assertEqual(memory.get_window(0), "")
+
+    def test_search_modes_and_speaker(self):
+        results = self.memory.search("sky the", mode="and")
+        self.assertEqual([index for index, _ in results], [5, 4, 3])
+        self.assertEqual({index for index, _ in self.memory.search("photons late", mode="or")}, {2, 6, 7})
+        self.assertEqual([index for index, _ in self.memory.search("photons", speaker="scientist")], [7])
+        self.assertEqual([index for index, _ in self.memory.search("phot", partial=True)], [7, 6])
+        self.assertEqual(self.memory.search("phot"), [])
+        self.assertEqual(self.memory.search("élan"), [(0, self.memory.search("élan")[0][1])])
+
+    def test_filter_is_a_contiguous_substring_match(self):
+        def messages(keyword):
+            return [entry.message for entry in self.memory.filter(keyword)]
+
+        self.assertEqual(messages("don't"), ["don't look at the sky?"])
+        self.assertEqual(messages("the sky"), ["don't look at the sky?"])
+        self.assertEqual(messages("sky?"), ["don't look at the sky?"])
+        self.assertEqual(messages("?"), ["don't look at the sky?"])
+        self.assertEqual(messages("friend"), ["don't look at the sky?"])
+        self.assertEqual(messages("über"), ["Über alles, hi there"])
+
+    def test_rolling_summary_folds_only_the_tail(self):
+        calls = []
+
+        def summarize(previous, text):
+            calls.append(text)
+            return previous + "|" + str(len(text.splitlines()))
+
+        self.assertFalse(self.memory.update_summary(summarize, threshold=20))
+        self.assertTrue(self.memory.update_summary(summarize, threshold=4))
+        self.assertEqual((self.memory.summarized, self.memory.unsummarized), (8, 0))
+        self.memory.add("You", "new turn")
+        self.assertTrue(self.memory.update_summary(summarize, force=True))
+        self.assertEqual(calls[-1], "You: new turn")
+        self.assertEqual(self.memory.summary, "|8|1")
+
+
+class StoreBackedMemoryTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "conversations.db")
+        self.store = self.open_store()
+
+    def open_store(self):
+        store = ConversationStore(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def reopen(self, resume_entries=2):
+        self.store.close()
+        self.store = self.open_store()
+        return Memory(self.store, "scientist", resume_entries=resume_entries)
+
+    def test_resume_pages_older_turns_from_disk(self):
+        memory = fill(Memory(self.store, "scientist"))
+        memory.set_summary("earlier talk", 3)
+        memory = self.reopen()
+        self.assertEqual(len(memory), len(TURNS))
+        self.assertEqual(memory.resumed, len(TURNS))
+        self.assertEqual([(e.speaker, e.message) for e in memory.history], TURNS)
+        self.assertEqual(memory.history[0].message, "Élan vital is a phrase")
+        self.assertEqual((memory.summary, memory.summarized), ("earlier talk", 3))
+        self.assertEqual(memory.get_window(1000).splitlines(), memory.lines(0))
+
+    def test_eviction_keeps_every_turn_reachable(self):
+        memory = Memory(self.store, "scientist", resume_entries=2)
+        fill(memory)
+        memory.add_many([{"speaker": "You", "message": f"batch {i}"} for i in range(3)])
+        self.assertEqual(len(memory), len(TURNS) + 3)
+        self.assertEqual([e.message for e in memory.history][:len(TURNS)], [m for _, m in TURNS])
+        self.assertEqual(self.store.count("scientist"), len(TURNS) + 3)
+
+    def test_search_and_filter_reach_evicted_turns(self):
+        fill(Memory(self.store, "scientist"))
+        memory = self.reopen()
+        # Non-ASCII case folding must agree with the resident index
+        self.assertEqual([index for index, _ in memory.search("élan")], [0])
+        self.assertEqual([index for index, _ in memory.search("über")], [1])
+        # Terms shorter than a trigram
+        self.assertEqual([index for index, _ in memory.search("hi")], [1])
+        self.assertEqual([index for index, _ in memory.search("sky the")], [5, 4, 3])
+        self.assertEqual([index for index, _ in memory.search("photons", speaker="scientist")], [7])
+        self.assertEqual([e.message for e in memory.filter("über")], ["Über alles, hi there"])
+        self.assertEqual([e.message for e in memory.filter("the sky")], ["don't look at the sky?"])
+        self.assertEqual([e.message for e in memory.filter("?")], ["don't look at the sky?"])
+        self.assertEqual(len(memory.filter("scientist")), 3)
+
+    def test_conflicting_writer_is_rejected_and_leaves_memory_unchanged(self):
+        first = Memory(self.store, "scientist")
+        second = Memory(self.store, "scientist")
+        first.add("You", "hi from A")
+        for message in ("hi from B", "reply B"):
+            with self.assertRaises(StoreConflictError):
+                second.add("Scientist", message)
+        with self.assertRaises(StoreConflictError):
+            second.add_many([{"speaker": "Scientist", "message": "batch B"}])
+        self.assertEqual(len(second), 0)
+        self.assertEqual(self.store.fetch("scientist", 0, 10), [("You", "hi from A", first.timestamp(0))])
+
+    def test_store_is_locked_while_open(self):
+        with self.assertRaises(StoreConflictError):
+            ConversationStore(self.path)
+        self.store.close()
+        self.open_store()
+
+    def test_clear_resets_the_stored_history(self):
+        memory = fill(Memory(self.store, "scientist"))
+        memory.clear()
+        self.assertEqual(len(memory), 0)
+        self.assertEqual(memory.search("photons"), [])
+        self.assertEqual(len(self.reopen()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# tests/test_metrics.py
+
+"""Tests for counters, gauges, histograms and the metric exporters."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+from metrics import Histogram, Metrics, PeriodicDumper  # noqa: E402
+
+
+class HistogramTest(unittest.TestCase):
+    def test_quantiles_use_bucket_bounds_capped_at_max(self):
+        histogram = Histogram()
+        for value in (0.3, 0.4, 2, 3, 7):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual((snapshot["count"], snapshot["min_ms"], snapshot["max_ms"]), (5, 0.3, 7))
+        self.assertAlmostEqual(snapshot["mean_ms"], 12.7 / 5)
+        self.assertEqual(snapshot["p50_ms"], 5)
+        self.assertEqual(snapshot["p99_ms"], 7)
+
+    def test_empty_histogram(self):
+        snapshot = Histogram().snapshot()
+        self.assertEqual((snapshot["min_ms"], snapshot["p50_ms"], snapshot["mean_ms"]), (0.0, 0.0, 0.0))
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_counters_gauges_and_timer(self):
+        self.metrics.incr("cache.hit")
+        self.metrics.incr("cache.hit", 2)
+        self.metrics.gauge("queue", 4)
+        self.metrics.gauge("queue", 1)
+        with self.metrics.timer("turn.total"):
+            pass
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["counters"], {"cache.hit": 3})
+        self.assertEqual(snapshot["gauges"], {"queue": 1})
+        self.assertEqual(snapshot["histograms"]["turn.total"]["count"], 1)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot()["counters"], {})
+
+    def test_disabled_hooks_record_nothing(self):
+        with mock.patch.object(metrics, "ENABLED", False):
+            self.metrics.incr("a")
+            self.metrics.gauge("b", 1)
+            self.metrics.observe("c", 1.0)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual((snapshot["counters"], snapshot["gauges"], snapshot["histograms"]), ({}, {}, {}))
+
+    def test_prometheus_format(self):
+        self.metrics.incr("cache.hit")
+        self.metrics.observe("model.call", 3)
+        lines = self.metrics.to_prometheus(prefix="pa").splitlines()
+        self.assertIn("# TYPE pa_cache_hit_total counter", lines)
+        self.assertIn("pa_cache_hit_total 1", lines)
+        self.assertIn('pa_model_call_ms_bucket{le="1"} 0', lines)
+        self.assertIn('pa_model_call_ms_bucket{le="5"} 1', lines)
+        self.assertIn('pa_model_call_ms_bucket{le="+Inf"} 1', lines)
+        self.assertIn("pa_model_call_ms_count 1", lines)
+
+    def test_periodic_dumper_writes_a_final_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            self.metrics.incr("turns")
+            PeriodicDumper(path, interval=3600, registry=self.metrics).start().stop()
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["counters"], {"turns": 1})
+            self.assertEqual(os.listdir(directory), ["metrics.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# tests/test_prompt_builder.py
+
+"""Tests for template rendering and the static prompt prefix."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_builder import Prompt, TemplateRegistry, build_prompt  # noqa: E402
+from response_handler import OpenAIBackend  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+TEMPLATE = (
+    "You are {{ name }}, who speaks in a {{ tone }} manner.\n"
+    "Your main goals are: {{ goals }}.\n"
+    "\n"
+    "Recent conversation:\n"
+    "{{ history }}\n"
+    "The user says: '{{ user_input }}'"
+)
+
+PERSONA = {"name": "Scientist", "tone": "analytical", "goals": ["explain", "test"], "template": "test.txt"}
+
+
+class PromptPrefixTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, "test.txt"), "w", encoding="utf-8") as f:
+            f.write(TEMPLATE)
+        self.registry = TemplateRegistry(directory.name)
+
+    def build(self, user_input, history=""):
+        return build_prompt(PERSONA, user_input, history=history, registry=self.registry)
+
+    def test_prompt_is_full_rendered_text(self):
+        prompt = self.build("Why is the sky blue?", history="You: hi")
+        self.assertIsInstance(prompt, Prompt)
+        self.assertEqual(prompt, self.registry.get("test.txt").render({
+            "name": "Scientist", "tone": "analytical", "goals": ["explain", "test"],
+            "history": "You: hi", "user_input": "Why is the sky blue?",
+        }))
+        self.assertEqual(prompt, prompt.prefix + prompt.body)
+        self.assertTrue(prompt.prefix.startswith("You are Scientist"))
+        self.assertTrue(prompt.prefix.endswith("Recent conversation:\n"))
+        self.assertTrue(prompt.body.startswith("You: hi"))
+
+    def test_prefix_is_reused_across_turns(self):
+        first = self.build("one")
+        second = self.build("two", history="You: one")
+        self.assertIs(first.prefix, second.prefix)
+
+    def test_system_message_bytes_identical_across_turns(self):
+        with StubServer() as stub:
+            backend = OpenAIBackend(base_url=stub.base_url)
+            self.addCleanup(backend.close)
+            history = []
+            for user_input in ("What is gravity?", "And light?", "Tell me about photons."):
+                backend.complete(self.build(user_input, history="\n".join(history)))
+                history.append(f"You: {user_input}")
+
+        marker = b'{"role": "user"'
+        prefixes = {request["raw"][:request["raw"].index(marker)] for request in stub.requests}
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(len(prefixes), 1)
+        system = stub.requests[0]["payload"]["messages"][0]
+        self.assertEqual(system["role"], "system")
+        self.assertIn("You are Scientist", system["content"])
+        bodies = {request["payload"]["messages"][1]["content"] for request in stub.requests}
+        self.assertEqual(len(bodies), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# tests/test_response_cache.py
+
+"""Tests for the two-tier response cache and its use by get_response."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import response_handler  # noqa: E402
+from response_cache import ResponseCache, make_key  # noqa: E402
+from response_handler import BackendError, ResponseBackend  # noqa: E402
+
+
+class CountingBackend(ResponseBackend):
+    name = "counting"
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    def complete(self, prompt, persona=None):
+        self.calls += 1
+        if self.fail:
+            raise BackendError("down")
+        return f"reply {self.calls}"
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_key_covers_every_parameter(self):
+        base = ("scientist", "prompt", "model", 0.7, 100)
+        keys = {make_key(*base)}
+        for position, value in enumerate(("friendly", "other", "model-2", 0.2, 50)):
+            changed = list(base)
+            changed[position] = value
+            keys.add(make_key(*changed))
+        self.assertEqual(len(keys), 6)
+        self.assertEqual(make_key(*base), make_key(*base))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), ("1", "3"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = ResponseCache(ttl=10)
+        with mock.patch("response_cache.time.time", return_value=1000.0):
+            cache.put("a", "1")
+        with mock.patch("response_cache.time.time", return_value=1009.0):
+            self.assertEqual(cache.get("a"), "1")
+        with mock.patch("response_cache.time.time", return_value=1011.0):
+            self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 1, 0))
+
+    def test_disk_tier_survives_restarts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite3")
+            cache = ResponseCache(db_path=path)
+            cache.put("a", "1")
+            cache.close()
+            cache = ResponseCache(db_path=path)
+            self.assertEqual(cache.get("a"), "1")
+            self.assertEqual(cache.get("a"), "1")
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            cache.clear()
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+
+
+class GetResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(response_handler, "_cache", ResponseCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(response_handler.set_backend, None)
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        backend = CountingBackend()
+        response_handler.set_backend(backend)
+        first = response_handler.get_response("Hi", persona="scientist")
+        self.assertEqual(response_handler.get_response("Hi", persona="scientist"), first)
+        self.assertEqual(backend.calls, 1)
+        # Persona is part of the key, and the cache can be bypassed
+        response_handler.get_response("Hi", persona="friendly")
+        response_handler.get_response("Hi", persona="scientist", use_cache=False)
+        self.assertEqual(backend.calls, 3)
+
+    def test_stream_fills_and_reads_the_cache(self):
+        backend = CountingBackend()
+        response_handler.set_backend(backend)
+        streamed = "".join(response_handler.stream_response("Hi", persona="scientist"))
+        self.assertEqual(list(response_handler.stream_response("Hi", persona="scientist")), [streamed])
+        self.assertEqual(response_handler.get_response("Hi", persona="scientist"), streamed)
+        self.assertEqual(backend.calls, 1)
+
+    def test_errors_are_not_cached(self):
+        backend = CountingBackend(fail=True)
+        response_handler.set_backend(backend)
+        with mock.patch("builtins.print"):
+            self.assertEqual(response_handler.get_response("Hi"), response_handler.ERROR_RESPONSE)
+            self.assertEqual(response_handler.get_response("Hi"), response_handler.ERROR_RESPONSE)
+        self.assertEqual(backend.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests/test_response_handler.py
+
+"""Tests for the HTTP backend against a local stub server."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_builder import Prompt  # noqa: E402
+from response_handler import BackendError, OpenAIBackend, StubBackend  # noqa: E402
+from stub_rules import StubRules  # noqa: E402
+from stub_server import DEFAULT_CONTENT, STREAM_CHUNKS, StubServer  # noqa: E402
+
+
+class OpenAIBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        self.backend = OpenAIBackend(base_url=self.stub.base_url, max_retries=2, backoff_base=0.0)
+        self.addCleanup(self.backend.close)
+
+    def test_complete_posts_chat_completion(self):
+        self.assertEqual(self.backend.complete("Hi there"), DEFAULT_CONTENT)
+        request = self.stub.requests[0]
+        self.assertEqual(request["path"], "/v1/chat/completions")
+        self.assertEqual(request["payload"]["messages"][-1], {"role": "user", "content": "Hi there"})
+
+    def test_retries_transient_errors(self):
+        self.stub.script(503, '{"error": "unavailable"}')
+        self.stub.script(429, '{"error": "slow down"}', {"Retry-After": "0"})
+        self.assertEqual(self.backend.complete("Hi"), DEFAULT_CONTENT)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        for _ in range(3):
+            self.stub.script(500, '{"error": "boom"}')
+        with self.assertRaises(BackendError) as raised:
+            self.backend.complete("Hi")
+        self.assertEqual(raised.exception.status, 500)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_does_not_retry_client_errors(self):
+        self.stub.script(400, '{"error": "bad request"}')
+        with self.assertRaises(BackendError) as raised:
+            self.backend.complete("Hi")
+        self.assertEqual(raised.exception.status, 400)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_malformed_response_raises(self):
+        self.stub.script(200, '{"choices": []}')
+        with self.assertRaises(BackendError):
+            self.backend.complete("Hi")
+
+    def test_reuses_pooled_connection(self):
+        for _ in range(3):
+            self.backend.complete("Hi")
+        ports = {request["client_port"] for request in self.stub.requests}
+        self.assertEqual(len(ports), 1)
+
+    def test_stream_yields_deltas(self):
+        self.assertEqual(list(self.backend.stream("Hi")), list(STREAM_CHUNKS))
+        self.assertTrue(self.stub.requests[0]["payload"]["stream"])
+        # The drained stream leaves its connection reusable
+        self.backend.complete("Hi again")
+        ports = {request["client_port"] for request in self.stub.requests}
+        self.assertEqual(len(ports), 1)
+
+
+class StubBackendTest(unittest.TestCase):
+    def test_matches_the_prompt_body_not_the_persona_prefix(self):
+        backend = StubBackend(StubRules({"global": {
+            "rules": [{"keywords": ["science"], "response": "science"},
+                      {"keywords": ["story"], "response": "story"}],
+            "fallback": "fallback",
+        }}))
+        prefix = "You are Scientist, who explains things with science.\n"
+        self.assertEqual(backend.complete(Prompt(prefix, "The user says: 'Tell me a story'")), "story")
+        self.assertEqual(backend.complete(Prompt(prefix, "The user says: 'Hello'")), "fallback")
+        self.assertEqual(backend.complete("Plain text about science"), "science")
+
+
+if __name__ == "__main__":
+    unittest.main()
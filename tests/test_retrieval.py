@@ -0,0 +1,92 @@
+# tests/test_retrieval.py
+
+"""Tests for the hashing embedder, vector index and memory retriever."""
+
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory import Memory  # noqa: E402
+from retrieval import HashingEmbedder, MemoryRetriever, VectorIndex  # noqa: E402
+
+TURNS = [
+    ("You", "My cat Whiskers loves tuna"),
+    ("Default", "Cats often enjoy fish."),
+    ("You", "The weather is rainy today"),
+    ("Default", "Take an umbrella."),
+    ("You", "What should I cook tonight?"),
+    ("Default", "Maybe pasta."),
+]
+
+
+class HashingEmbedderTest(unittest.TestCase):
+    def test_vectors_are_normalized_and_stable(self):
+        embedder = HashingEmbedder(dim=64)
+        vector = embedder.embed_one("tuna tuna cat")
+        self.assertAlmostEqual(math.sqrt(sum(w * w for w in vector.values())), 1.0, places=6)
+        self.assertTrue(all(0 <= bucket < 64 for bucket in vector))
+        self.assertEqual(embedder.embed(["tuna tuna cat"]), [vector])
+        self.assertEqual(embedder.embed_one(""), {})
+
+
+class VectorIndexTest(unittest.TestCase):
+    def test_identical_row_scores_one(self):
+        embedder = HashingEmbedder(dim=256)
+        index = VectorIndex(256)
+        index.add(embedder.embed(["red apple", "blue sky", "green grass"]))
+        self.assertEqual(len(index), 3)
+        row, score = index.search(embedder.embed_one("blue sky"), k=1)[0]
+        self.assertEqual(row, 1)
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+    def test_dense_and_sparse_vectors_agree(self):
+        sparse, dense = VectorIndex(4), VectorIndex(4)
+        rows = [{0: 1.0}, {1: 0.6, 2: 0.8}, {0: 0.6, 3: 0.8}]
+        sparse.add(rows)
+        dense.add([[row.get(d, 0.0) for d in range(4)] for row in rows])
+        query = {0: 1.0}
+        self.assertEqual([r for r, _ in sparse.search(query)], [r for r, _ in dense.search([1.0, 0, 0, 0])])
+
+    def test_stop_and_empty_queries(self):
+        index = VectorIndex(4)
+        index.add([{0: 1.0}, {0: 1.0}])
+        self.assertEqual([row for row, _ in index.search({0: 1.0}, stop=1)], [0])
+        self.assertEqual(index.search({0: 1.0}, stop=0), [])
+        self.assertEqual(index.search({0: 1.0}, k=0), [])
+        self.assertEqual(index.search({}), [])
+
+
+class MemoryRetrieverTest(unittest.TestCase):
+    def setUp(self):
+        self.memory = Memory()
+        for speaker, message in TURNS:
+            self.memory.add(speaker, message)
+        self.retriever = MemoryRetriever(self.memory)
+
+    def test_relevant_turn_ranks_first(self):
+        results = self.retriever.search("Does Whiskers like tuna?")
+        self.assertEqual(results[0][0], 0)
+        self.assertEqual(len(self.retriever.index), len(TURNS))
+
+    def test_stop_excludes_the_recent_window(self):
+        self.assertEqual(self.retriever.search("umbrella", stop=3), [])
+        self.assertEqual([i for i, _ in self.retriever.search("umbrella")], [3])
+
+    def test_min_score_filters_weak_matches(self):
+        self.assertEqual(self.retriever.search("tuna pasta umbrella weather", min_score=0.9), [])
+
+    def test_new_entries_are_indexed_on_the_next_query(self):
+        self.retriever.search("cat")
+        self.memory.add("You", "I bought a telescope")
+        self.assertEqual(self.retriever.search("telescope")[0][0], len(TURNS))
+
+    def test_relevant_lines_are_chronological(self):
+        lines = self.retriever.relevant("cat tuna fish", k=2, min_score=0.0)
+        self.assertEqual(lines.splitlines(), [self.memory.line(0), self.memory.line(1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
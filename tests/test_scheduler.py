@@ -0,0 +1,168 @@
+# tests/test_scheduler.py
+
+"""Tests for priority admission, rate limits and deduplication."""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import response_handler  # noqa: E402
+from scheduler import BATCH, INTERACTIVE, SUMMARY, Scheduler  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_admits_by_priority(self):
+        scheduler = Scheduler(None, None, max_in_flight=1)
+        release = threading.Event()
+        order = []
+
+        def hold():
+            with scheduler.slot(BATCH):
+                release.wait()
+
+        def call(priority, label):
+            with scheduler.slot(priority):
+                order.append(label)
+
+        threads = [threading.Thread(target=hold)]
+        threads[0].start()
+        while not scheduler.in_flight:
+            time.sleep(0.001)
+        for priority, label in ((BATCH, "b1"), (SUMMARY, "s1"), (INTERACTIVE, "i1"), (SUMMARY, "s2")):
+            thread = threading.Thread(target=call, args=(priority, label))
+            thread.start()
+            threads.append(thread)
+            while scheduler.queued < len(threads) - 1:
+                time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ["i1", "s1", "s2", "b1"])
+
+    def test_limits_requests_per_second(self):
+        scheduler = Scheduler(requests_per_second=20, tokens_per_minute=None)
+        start = time.monotonic()
+        for _ in range(30):
+            with scheduler.slot():
+                pass
+        # A burst of 20, then 10 more at 20/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+    def test_limits_tokens_per_minute(self):
+        scheduler = Scheduler(requests_per_second=None, tokens_per_minute=600)
+        start = time.monotonic()
+        for cost in (300, 300, 3):
+            with scheduler.slot(cost=cost):
+                pass
+        # The first two drain the 600-token bucket; it refills at 10 tokens/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    def test_caps_in_flight(self):
+        scheduler = Scheduler(None, None, max_in_flight=2)
+        peak = 0
+        lock = threading.Lock()
+
+        def call():
+            nonlocal peak
+            with scheduler.slot():
+                with lock:
+                    peak = max(peak, scheduler.in_flight)
+                time.sleep(0.02)
+
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak, 2)
+
+    def test_deduplicates_identical_calls(self):
+        scheduler = Scheduler(None, None)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.1)
+            return "reply"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(scheduler.run(fn, key="same")))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["reply"] * 4)
+
+    def test_deduplicated_callers_share_errors(self):
+        scheduler = Scheduler(None, None)
+        started = threading.Event()
+
+        def fn():
+            started.set()
+            time.sleep(0.05)
+            raise RuntimeError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                scheduler.run(fn, key="same")
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        first = threading.Thread(target=call)
+        first.start()
+        started.wait()
+        second = threading.Thread(target=call)
+        second.start()
+        first.join()
+        second.join()
+        self.assertEqual(errors, ["boom", "boom"])
+
+    def test_backoff_pauses_admission(self):
+        scheduler = Scheduler(None, None)
+        scheduler.backoff(0.2)
+        start = time.monotonic()
+        with scheduler.slot():
+            pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_unknown_priority(self):
+        with self.assertRaises(ValueError):
+            with Scheduler().slot("urgent"):
+                pass
+
+
+class RateLimitResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        response_handler.set_backend(
+            response_handler.OpenAIBackend(base_url=self.stub.base_url, max_retries=1, backoff_base=0.0)
+        )
+        self.addCleanup(response_handler.set_backend, None)
+
+    def test_persistent_429_returns_rate_limit_message(self):
+        for _ in range(2):
+            self.stub.script(429, '{"error": "slow down"}', {"Retry-After": "0"})
+        reply = response_handler.get_response("Hi", persona="test", use_cache=False)
+        self.assertEqual(reply, response_handler.RATE_LIMIT_RESPONSE)
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_rate_limit_error_carries_retry_after(self):
+        for _ in range(2):
+            self.stub.script(429, '{"error": "slow down"}', {"Retry-After": "0"})
+        with self.assertRaises(response_handler.RateLimitError) as raised:
+            response_handler.get_backend().complete("Hi")
+        self.assertEqual(raised.exception.retry_after, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
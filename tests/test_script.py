@@ -0,0 +1,106 @@
+# tests/test_script.py
+
+"""Tests for --script replays: line parsing, result rows and reproducible runs."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+import response_handler  # noqa: E402
+from response_handler import StubBackend  # noqa: E402
+from session_saver import SessionJournal  # noqa: E402
+from stub_rules import StubRules  # noqa: E402
+
+CONFIG = {
+    "default": {"name": "Default", "description": "A helpful assistant.", "template": "default.txt", "tone": "neutral"},
+}
+
+RULES = {"global": {"rules": [{"keywords": ["science"], "response": "🔬 Science!"}], "fallback": "Hello."}}
+
+
+class ParseScriptLineTest(unittest.TestCase):
+    def test_line_formats(self):
+        self.assertEqual(main.parse_script_line("  hello  \n"), ("hello", None))
+        self.assertEqual(main.parse_script_line('"/history"'), ("/history", None))
+        self.assertEqual(main.parse_script_line('{"input": "/reset", "confirm": true}'), ("/reset", True))
+        self.assertEqual(main.parse_script_line('{"speaker": "You", "message": "hi"}'), ("hi", None))
+        self.assertIsNone(main.parse_script_line('{"speaker": "Default", "message": "reply"}'))
+        self.assertIsNone(main.parse_script_line('{"type": "summary", "summary": "..."}'))
+        self.assertIsNone(main.parse_script_line("   "))
+        self.assertEqual(main.parse_script_line("{not json"), ("{not json", None))
+
+
+class RunScriptTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shutil.copytree(os.path.join(ROOT, "templates"), os.path.join(directory.name, "templates"))
+        with open(os.path.join(directory.name, "persona_config.json"), "w", encoding="utf-8") as f:
+            json.dump(CONFIG, f)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        self.directory = directory.name
+        response_handler.set_backend(StubBackend(StubRules(RULES)))
+        self.addCleanup(response_handler.set_backend, None)
+
+    def replay(self, lines, **kwargs):
+        with open("script.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        with contextlib.redirect_stderr(io.StringIO()):
+            status = main.main("script.txt", "results.jsonl", **kwargs)
+        with open("results.jsonl", encoding="utf-8") as f:
+            return status, [json.loads(line) for line in f]
+
+    def test_rows_report_output_and_failures(self):
+        status, rows = self.replay([
+            "Tell me about science",
+            "/importlog missing.json",
+            '{"input": "/importlog missing.json", "confirm": false}',
+            "/exit",
+            "never replayed",
+        ], assume_yes=True)
+        self.assertEqual(status, 2)
+        self.assertEqual([row["line"] for row in rows], [1, 2, 3, 4])
+        self.assertTrue(rows[0]["ok"])
+        self.assertIn("🔬 Science!", rows[0]["output"])
+        self.assertFalse(rows[1]["ok"])
+        self.assertIn("Failed to import log", rows[1]["error"])
+        self.assertTrue(rows[2]["ok"])
+        self.assertIn("Import canceled", rows[2]["output"])
+
+    def test_replays_do_not_resume_each_other(self):
+        script = ["hello", "/history count"]
+        _, first = self.replay(script)
+        _, second = self.replay(script)
+        self.assertEqual(first[1]["output"], second[1]["output"])
+        self.assertIn("2", second[1]["output"])
+        self.assertFalse(os.path.exists(main.CONVERSATION_STORE_PATH))
+
+    def test_persist_resumes_the_store(self):
+        script = ["hello", "/history count"]
+        self.replay(script, persist=True)
+        _, second = self.replay(script, persist=True)
+        self.assertIn("4", second[1]["output"])
+
+    def test_autosave_is_reported_only_once_written(self):
+        with mock.patch.object(main, "AUTOSAVE", True):
+            _, rows = self.replay(["hello"])
+            self.assertIn("💾 Autosaved.", rows[0]["output"])
+            with mock.patch.object(SessionJournal, "write_batch", side_effect=OSError("disk full")):
+                _, rows = self.replay(["hello"])
+        self.assertNotIn("Autosaved", rows[0]["output"])
+        self.assertIn("disk full", rows[0]["output"])
+
+
+if __name__ == "__main__":
+    unittest.main()
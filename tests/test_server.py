@@ -0,0 +1,124 @@
+# tests/test_server.py
+
+"""Tests for session isolation and request handling in the multi-session server."""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import response_handler  # noqa: E402
+from response_handler import StubBackend  # noqa: E402
+from server import PersonaServer  # noqa: E402
+from stub_rules import StubRules  # noqa: E402
+
+CONFIG = {
+    "default": {"name": "Default", "description": "A helpful assistant.", "template": "default.txt", "tone": "neutral"},
+    "scientist": {"name": "Scientist", "description": "Uses science.", "template": "default.txt", "tone": "dry"},
+}
+
+RULES = {"global": {"rules": [{"keywords": ["science"], "response": "🔬 Science!"}], "fallback": "Hello."}}
+
+
+class SlowBackend(StubBackend):
+    def complete(self, prompt, persona=None):
+        time.sleep(0.2)
+        return super().complete(prompt, persona)
+
+
+class PersonaServerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shutil.copytree(os.path.join(ROOT, "templates"), os.path.join(directory.name, "templates"))
+        with open(os.path.join(directory.name, "persona_config.json"), "w", encoding="utf-8") as f:
+            json.dump(CONFIG, f)
+        # Sessions resolve config, templates and journals relative to the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        self.directory = directory.name
+        response_handler.set_backend(StubBackend(StubRules(RULES)))
+        self.addCleanup(response_handler.set_backend, None)
+        self.server = PersonaServer()
+        self.addCleanup(self.quietly, self.server.close_all)
+
+    @staticmethod
+    def quietly(fn, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn(*args)
+
+    def call(self, **request):
+        return self.quietly(asyncio.run, self.server.dispatch(request))
+
+    def test_message_creates_a_session_and_remembers_turns(self):
+        first = self.call(session="a", input="Tell me about science")
+        self.assertEqual((first["ok"], first["session"], first["reply"]), (True, "a", "🔬 Science!"))
+        self.call(session="a", input="thanks")
+        history = self.call(session="a", op="history")
+        self.assertEqual(history["count"], 4)
+        self.assertEqual(history["entries"][0], {"speaker": "You", "message": "Tell me about science"})
+
+    def test_sessions_are_isolated(self):
+        self.call(session="a", input="one")
+        self.call(session="b", op="switch", persona="scientist")
+        self.assertEqual(self.call(session="b", op="history")["count"], 0)
+        self.assertEqual(self.call(session="b", input="two")["persona"], "Scientist")
+        self.assertEqual(self.call(op="sessions")["sessions"], 2)
+
+    def test_rejects_duplicate_session_and_unknown_op(self):
+        self.assertTrue(self.call(op="open", session="a")["ok"])
+        duplicate = self.call(op="open", session="a")
+        self.assertFalse(duplicate["ok"])
+        self.assertIn("already exists", duplicate["error"])
+        self.assertIn("Unknown op", self.call(session="a", op="dance")["error"])
+        self.assertIn("non-empty", self.call(session="a", input="  ")["error"])
+
+    def test_close_saves_the_journal(self):
+        self.call(session="a", input="hello")
+        self.assertTrue(self.call(session="a", op="close")["closed"])
+        self.assertEqual(self.call(op="sessions")["sessions"], 0)
+        journals = [name for name in os.listdir(self.directory) if name.endswith(".jsonl")]
+        self.assertEqual(len(journals), 1)
+
+    def test_prompt_context_is_built_off_the_event_loop(self):
+        self.call(op="open", session="a")
+        manager = self.server.sessions["a"].manager
+        threads = []
+        prompt_context = manager.prompt_context
+
+        def record(user_input):
+            threads.append(threading.current_thread())
+            return prompt_context(user_input)
+
+        manager.prompt_context = record
+        self.call(session="a", input="hello")
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_slow_replies_do_not_block_other_sessions(self):
+        response_handler.set_backend(SlowBackend(StubRules(RULES)))
+
+        async def both():
+            return await asyncio.gather(
+                self.server.dispatch({"session": "a", "input": "one"}),
+                self.server.dispatch({"session": "b", "input": "two"}),
+            )
+
+        start = time.monotonic()
+        responses = self.quietly(asyncio.run, both())
+        self.assertTrue(all(response["ok"] for response in responses))
+        self.assertLess(time.monotonic() - start, 0.38)
+
+
+if __name__ == "__main__":
+    unittest.main()
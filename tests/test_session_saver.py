@@ -0,0 +1,115 @@
+# tests/test_session_saver.py
+
+"""Tests for the append-only session journal."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore  # noqa: E402
+from memory import Memory  # noqa: E402
+from session_saver import FSYNC_ALWAYS, FSYNC_BATCH, FSYNC_EXIT, SessionJournal  # noqa: E402
+
+
+class SessionJournalTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def journal(self, **kwargs):
+        journal = SessionJournal("Tester", directory=self.directory, **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    @staticmethod
+    def read(path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_sync_appends_only_new_turns(self):
+        journal = self.journal()
+        memory = Memory()
+        memory.add("You", "hi")
+        memory.add("Tester", "héllo")
+        self.assertEqual(journal.sync(memory), 2)
+        self.assertEqual(journal.sync(memory), 0)
+        memory.add("You", "bye")
+        self.assertEqual(journal.sync(memory), 1)
+        records = self.read(journal.path)
+        self.assertEqual([(r["speaker"], r["message"]) for r in records],
+                         [("You", "hi"), ("Tester", "héllo"), ("You", "bye")])
+        self.assertTrue(all("timestamp" in r for r in records))
+
+    def test_new_memory_starts_a_new_file(self):
+        journal = self.journal()
+        first = Memory()
+        first.add("You", "one")
+        journal.sync(first)
+        first_path = journal.path
+        second = Memory()
+        second.add("You", "two")
+        journal.write_batch(journal.collect(second))
+        self.assertNotEqual(journal.path, first_path)
+        self.assertEqual([r["message"] for r in self.read(journal.path)], ["two"])
+        self.assertEqual([r["message"] for r in self.read(first_path)], ["one"])
+
+    def test_summary_batch_and_merging(self):
+        journal = self.journal()
+        memory = Memory()
+        memory.add("You", "hi")
+        memory.set_summary("greeting", 1)
+        pending = journal.summary_batch(memory)
+        memory.add("You", "more")
+        merged = journal.merge_batches(pending, journal.collect(memory))
+        journal.write_batch(merged)
+        records = self.read(journal.path)
+        self.assertEqual([r.get("type") for r in records], [None, "summary", None])
+        self.assertEqual((records[1]["summary"], records[1]["covered"]), ("greeting", 1))
+        self.assertIsNone(journal.merge_batches(pending, (True, [])))
+
+    def test_resumed_turns_are_not_journaled_again(self):
+        store = ConversationStore(":memory:")
+        self.addCleanup(store.close)
+        Memory(store, "tester").add("You", "from an earlier run")
+        memory = Memory(store, "tester")
+        memory.add("You", "new")
+        journal = self.journal()
+        journal.sync(memory)
+        self.assertEqual([r["message"] for r in self.read(journal.path)], ["new"])
+
+    def test_fsync_policies(self):
+        # Every sync, every second turn, or never; plus one at close
+        for policy, expected in ((FSYNC_ALWAYS, 5), (FSYNC_BATCH, 3), (FSYNC_EXIT, 1)):
+            with self.subTest(policy=policy), mock.patch("session_saver.os.fsync") as fsync:
+                journal = self.journal(fsync_policy=policy, batch_size=2, batch_interval=3600)
+                memory = Memory()
+                for i in range(4):
+                    memory.add("You", str(i))
+                    journal.sync(memory)
+                journal.close()
+                self.assertEqual(fsync.call_count, expected)
+
+    def test_concurrent_journals_never_share_a_file(self):
+        memory = Memory()
+        memory.add("You", "hi")
+        paths = set()
+        with mock.patch("session_saver._timestamp", return_value="2026-01-01_00-00-00"):
+            for _ in range(3):
+                journal = self.journal()
+                journal.sync(memory)
+                paths.add(journal.path)
+        self.assertEqual(len(paths), 3)
+
+    def test_rejects_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            SessionJournal("Tester", fsync_policy="sometimes")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# tests/test_stub_rules.py
+
+"""Tests for the keyword rules behind the offline stub backend."""
+
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_rules import BUILTIN_RULES, StubRules  # noqa: E402
+
+RULES = {
+    "global": {
+        "rules": [
+            {"keywords": ["science"], "response": "global science"},
+            {"keywords": ["story", "once upon a time"], "response": "global story"},
+        ],
+        "fallback": "global fallback",
+    },
+    "personas": {
+        "Scientist": {"rules": [{"keywords": ["why"], "response": "scientist why"}], "fallback": "scientist fallback"},
+        "friendly": {"rules": [{"keywords": ["sad"], "response": "friendly sad"}]},
+    },
+}
+
+
+class StubRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = StubRules(RULES)
+
+    def test_earliest_listed_rule_wins(self):
+        # Order in the text does not matter, only order in the rules
+        self.assertEqual(self.rules.respond("a story about SCIENCE"), "global science")
+        self.assertEqual(self.rules.respond("Once Upon A Time"), "global story")
+        self.assertEqual(self.rules.respond("why science?", "scientist"), "scientist why")
+
+    def test_fallbacks(self):
+        self.assertEqual(self.rules.respond("nothing here"), "global fallback")
+        self.assertEqual(self.rules.respond("nothing here", "SCIENTIST"), "scientist fallback")
+        self.assertEqual(self.rules.respond("nothing here", "friendly"), "global fallback")
+        self.assertEqual(self.rules.respond("so sad", "friendly"), "friendly sad")
+        self.assertEqual(self.rules.respond("so sad", "unknown"), "global fallback")
+
+    def test_only_the_prompt_body_is_scanned(self):
+        prompt = SimpleNamespace(prefix="You love science.", body="User: hello")
+        self.assertEqual(self.rules.respond(prompt), "global fallback")
+
+    def test_rule_sets_are_compiled_once_per_persona(self):
+        self.assertIs(self.rules.for_persona("Scientist"), self.rules.for_persona("scientist"))
+
+    def test_digest_tracks_the_config(self):
+        self.assertEqual(StubRules(RULES).digest, self.rules.digest)
+        self.assertNotEqual(StubRules(BUILTIN_RULES).digest, self.rules.digest)
+
+    def test_rejects_malformed_rules(self):
+        for config in (
+            {"global": []},
+            {"global": {"rules": [{"keywords": [], "response": "x"}]}},
+            {"global": {"rules": [{"keywords": ["a"]}]}},
+            {"global": {"fallback": 3}},
+            {"personas": ["scientist"]},
+        ):
+            with self.subTest(config=config), self.assertRaises(ValueError):
+                StubRules(config)
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "stub_rules.json")
+
+    def test_missing_file_uses_builtin_rules(self):
+        self.assertEqual(StubRules.load(self.path).digest, StubRules(BUILTIN_RULES).digest)
+
+    def test_invalid_json(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        with self.assertRaises(ValueError):
+            StubRules.load(self.path)
+
+    def test_shipped_rules_file_is_valid(self):
+        rules = StubRules.load(os.path.join(ROOT, "stub_rules.json"))
+        self.assertTrue(rules.respond("Tell me about science").startswith("🔬"))
+
+
+if __name__ == "__main__":
+    unittest.main()